@@ -0,0 +1,198 @@
+"""
+On-disk cache of server responses for ttclient.
+
+Responses are stored in SQLite, keyed by the full request URL, along with the
+ETag and max-age the server sent. Fresh responses are served without a request.
+Stale responses are served straight away and revalidated in the background
+with If-None-Match, so the next lookup sees the new data. In offline mode
+every lookup is answered from the cache.
+"""
+import configparser
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+
+DEFAULT_PATH = '~/.cache/ttclient.sqlite3'
+DEFAULT_STALE_WHILE_REVALIDATE = 86400
+CACHEABLE_STATUS_CODES = [200, 404]
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+
+class NotCached(requests.exceptions.RequestException):
+    """
+    Raised in offline mode when a request has no cached response.
+    """
+
+
+class ClientCache():
+    """
+    A thread safe cache of GET responses, backed by a SQLite file.
+    """
+    def __init__(self, session: requests.Session, path: str = DEFAULT_PATH,
+                 stale_while_revalidate: int = DEFAULT_STALE_WHILE_REVALIDATE,
+                 enabled: bool = True, offline: bool = False):
+        self.session = session
+        self.stale_while_revalidate = stale_while_revalidate
+        self.enabled = enabled or offline
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._revalidating = {}
+        self._connection = None
+        if self.enabled:
+            path = os.path.expanduser(path)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'url TEXT PRIMARY KEY, status INTEGER, etag TEXT, max_age INTEGER, stored_at REAL, body BLOB)'
+            )
+            self._connection.commit()
+
+    @classmethod
+    def from_config(cls, session: requests.Session, config_file: str, offline: bool = False):
+        """
+        Create a cache from the [cache] section of the client config file.
+        """
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        section = config['cache'] if config.has_section('cache') else {}
+        return cls(
+            session,
+            path=section.get('path', DEFAULT_PATH),
+            stale_while_revalidate=int(section.get('stale_while_revalidate', DEFAULT_STALE_WHILE_REVALIDATE)),
+            enabled=section.get('enabled', 'true').lower() == 'true',
+            offline=offline,
+        )
+
+    def get(self, url: str, params: dict | None = None) -> requests.Response:
+        """
+        GET the URL, answering from the cache where possible.
+        """
+        if not self.enabled:
+            return self.session.get(url, params=params)
+
+        url = requests.Request('GET', url, params=params).prepare().url
+        row = self._load(url)
+        if self.offline:
+            if row is None:
+                raise NotCached(f'No cached response for {url}')
+            return self._response(url, row)
+        if row is None:
+            return self._fetch(url, None)
+
+        status, etag, max_age, stored_at, body = row
+        age = time.time() - stored_at
+        if age <= max_age:
+            return self._response(url, row)
+        if age <= max_age + self.stale_while_revalidate:
+            self._revalidate_later(url, etag)
+            return self._response(url, row)
+        return self._fetch(url, etag)
+
+    def close(self) -> None:
+        """
+        Wait for background revalidations to finish and close the database.
+        """
+        with self._lock:
+            threads = list(self._revalidating.values())
+        for thread in threads:
+            thread.join()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _fetch(self, url: str, etag: str | None) -> requests.Response:
+        """
+        Request the URL, conditionally if an ETag is known, and store the result.
+        """
+        headers = {'If-None-Match': etag} if etag else {}
+        response = self.session.get(url, headers=headers)
+        if response.status_code == 304:
+            self._touch(url, response)
+            return self._response(url, self._load(url))
+        if response.status_code in CACHEABLE_STATUS_CODES and 'no-store' not in response.headers.get('Cache-Control', ''):
+            self._store(url, response)
+        return response
+
+    def _revalidate_later(self, url: str, etag: str | None) -> None:
+        """
+        Revalidate the URL in a background thread, unless that is already happening.
+        """
+        with self._lock:
+            if url in self._revalidating:
+                return
+            thread = threading.Thread(target=self._revalidate, args=(url, etag))
+            self._revalidating[url] = thread
+        thread.start()
+
+    def _revalidate(self, url: str, etag: str | None) -> None:
+        """
+        Refresh a stale entry. Failures are ignored and the stale copy is kept.
+        Once done, later stale reads of the URL revalidate it again.
+        """
+        try:
+            self._fetch(url, etag)
+        except requests.exceptions.RequestException:
+            pass
+        finally:
+            with self._lock:
+                self._revalidating.pop(url, None)
+
+    def _load(self, url: str) -> tuple | None:
+        """
+        Return the stored (status, etag, max_age, stored_at, body) for the URL.
+        """
+        with self._lock:
+            return self._connection.execute(
+                'SELECT status, etag, max_age, stored_at, body FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+
+    def _store(self, url: str, response: requests.Response) -> None:
+        """
+        Save a response from the server.
+        """
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (url, response.status_code, response.headers.get('ETag'), max_age(response), time.time(), response.content),
+            )
+            self._connection.commit()
+
+    def _touch(self, url: str, response: requests.Response) -> None:
+        """
+        Mark a stored response as fresh again after the server answered 304.
+        """
+        with self._lock:
+            self._connection.execute(
+                'UPDATE responses SET max_age = ?, stored_at = ? WHERE url = ?',
+                (max_age(response), time.time(), url),
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def _response(url: str, row: tuple) -> requests.Response:
+        """
+        Build a response object from a stored row.
+        """
+        status, etag, _, _, body = row
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response.reason = 'OK' if status == 200 else 'Not Found'
+        response.headers['Content-Type'] = 'application/json'
+        if etag:
+            response.headers['ETag'] = etag
+        response._content = body
+        return response
+
+
+def max_age(response: requests.Response) -> int:
+    """
+    Return the max-age the server allowed for the response, or 0 if it gave none.
+    """
+    match = MAX_AGE_PATTERN.search(response.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else 0
@@ -5,21 +5,47 @@ Program: ttclient
 Description: Retrieve and manage table tennis equipment data.
 
 Usage:
-    ttclient get -e <equipment_type> [-n <name>]
+    ttclient get -e <equipment_type> [-n <name>] [--all] [--json] [-w <workers>] [--offline]
+    ttclient get -e <equipment_type> -i <id> [-i <id> ...] [--json] [-w <workers>] [--offline]
+    ttclient update -e <equipment_type|all> [--no-wait]
+    ttclient export -e <equipment_type> [-f <format>] [-o <file>]
+    ttclient lookup -e <equipment_type> [-n <name> ...] [-i <id> ...] [-f <file>] [--json]
 """
 import argparse
 import requests
 import configparser
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from ttcache import ClientCache
+
+CONFIG_FILE = 'clientconfig.ini'
 
 RED_CODE = '\033[0;31m'
 RESET_CODE = '\033[0m'
 
 RUBBER_TYPE = 'rubber'
 BLADE_TYPE = 'blade'
+ALL_TYPE = 'all'
 ROUTE_MAP = {
     RUBBER_TYPE: 'rubbers',
-    BLADE_TYPE: 'blades'
+    BLADE_TYPE: 'blades',
+    ALL_TYPE: 'all'
 }
+JOB_POLL_INTERVAL = 2
+JOB_DONE_STATES = ['finished', 'failed']
+EXPORT_FORMATS = ['ndjson', 'csv']
+EXPORT_CHUNK_SIZE = 64 * 1024
+DEFAULT_WORKERS = 8
+BATCH_PAGE_LIMIT = 100
+# Most names and IDs sent in one lookup request, the server's limit
+LOOKUP_BATCH_SIZE = 500
+
+# Shared by every request so connections to the server are kept alive and reused
+session = requests.Session()
+# Answers repeated lookups from disk, set up from the config file in main
+cache = ClientCache(session, enabled=False)
 
 def main():
     """
@@ -40,20 +66,83 @@ def main():
 
     # Each command
     get_parser = subparsers.add_parser('get', help='Get equipment data', parents=[parent_parser])
-    update_parser = subparsers.add_parser('update', help='Update equipment data by re-scraping the given equipment type', parents=[parent_parser])
+    update_parser = subparsers.add_parser('update', help='Update equipment data by re-scraping the given equipment type')
+    export_parser = subparsers.add_parser('export', help='Export all equipment data of the given type to a file', parents=[parent_parser])
+    lookup_parser = subparsers.add_parser('lookup', help='Look up many equipment items by name or ID at once', parents=[parent_parser])
 
     # Arguments for each command
     # get
     get_parser.add_argument('-n', '--name',
                             required=False,
                             help='Name of the equipment to retrieve')
+    get_parser.add_argument('-i', '--id',
+                            action='append',
+                            dest='ids',
+                            help='ID of an item to retrieve, can be given multiple times')
+    get_parser.add_argument('--all',
+                            action='store_true',
+                            help='Retrieve every page of results without prompting')
+    get_parser.add_argument('--json',
+                            action='store_true',
+                            help='Print each item as a line of JSON, implies --all')
+    get_parser.add_argument('-w', '--workers',
+                            type=positive_int,
+                            default=DEFAULT_WORKERS,
+                            help='Number of requests to run concurrently')
+    get_parser.add_argument('--offline',
+                            action='store_true',
+                            help='Answer entirely from the local cache without contacting the server')
     get_parser.set_defaults(func=get)
 
     # update
+    update_parser.add_argument('-e', '--equipment-type',
+                               required=True,
+                               choices=[RUBBER_TYPE, BLADE_TYPE, ALL_TYPE],
+                               help='Type of equipment, or all to re-scrape every type at once')
+    update_parser.add_argument('--no-wait',
+                               action='store_true',
+                               help='Return once the update is queued instead of waiting for it to finish')
     update_parser.set_defaults(func=update)
 
+    # export
+    export_parser.add_argument('-f', '--format',
+                               default=EXPORT_FORMATS[0],
+                               choices=EXPORT_FORMATS,
+                               help='Format of the exported file')
+    export_parser.add_argument('-o', '--output',
+                               required=False,
+                               help='File to write to, defaults to <equipment_type>.<format>')
+    export_parser.set_defaults(func=export)
+
+    # lookup
+    lookup_parser.add_argument('-n', '--name',
+                               action='append',
+                               dest='names',
+                               default=[],
+                               help='Name of an item to look up, can be given multiple times')
+    lookup_parser.add_argument('-i', '--id',
+                               action='append',
+                               dest='ids',
+                               default=[],
+                               help='ID of an item to look up, can be given multiple times')
+    lookup_parser.add_argument('-f', '--file',
+                               required=False,
+                               help='File with one name to look up per line, such as a shopping list')
+    lookup_parser.add_argument('--json',
+                               action='store_true',
+                               help='Print each item found as a line of JSON')
+    lookup_parser.set_defaults(func=lookup)
+
     args = parser.parse_args()
-    args.func(args, server)
+    mount_pool(getattr(args, 'workers', DEFAULT_WORKERS))
+
+    global cache
+    cache = ClientCache.from_config(session, CONFIG_FILE, offline=getattr(args, 'offline', False))
+    try:
+        args.func(args, server)
+    finally:
+        # Let background revalidations finish so the cache is up to date next time
+        cache.close()
 
 
 def get(args: argparse.Namespace, server: str) -> None:
@@ -62,7 +151,11 @@ def get(args: argparse.Namespace, server: str) -> None:
     If no name is provided, return all items of the given type.
     """
 
-    if args.name:
+    if args.ids:
+        get_by_ids(args, server)
+    elif args.all or args.json:
+        get_batch(args, server)
+    elif args.name:
         get_with_name(args, server)
     else:
         get_all(args, server)
@@ -71,31 +164,138 @@ def get(args: argparse.Namespace, server: str) -> None:
 def update(args: argparse.Namespace, server: str) -> None:
     """
     Update the specified equipment item by re-scraping the given equipment type.
+    The server runs the scrape as a background job, which is followed until
+    it finishes unless --no-wait is given.
     """
     equipment_type = ROUTE_MAP[args.equipment_type]
     try:
-        response = requests.put(f'{server}/{equipment_type}')
+        response = session.put(f'{server}/{equipment_type}')
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         raise SystemExit(f'{response.json()["error"]}')
     except requests.exceptions.RequestException as err:
         raise SystemExit(err)
 
+    job = response.json()
+    print(f'{args.equipment_type.capitalize()} update queued as job {job["job_id"]}')
+    if args.no_wait:
+        return
+
+    status = wait_for_job(f'{server}{job["status_url"]}')
+    if status['state'] == 'failed':
+        raise SystemExit(f'{args.equipment_type.capitalize()} update failed: {status["error"]}')
     print(f'{args.equipment_type.capitalize()} data updated successfully')
 
 
+def export(args: argparse.Namespace, server: str) -> None:
+    """
+    Export every item of the given equipment type to a file.
+    The response is streamed to disk as it arrives.
+    """
+    equipment_type = ROUTE_MAP[args.equipment_type]
+    output = args.output or f'{equipment_type}.{args.format}'
+    size = 0
+    try:
+        with session.get(f'{server}/{equipment_type}/export', params={'format': args.format}, stream=True) as response:
+            response.raise_for_status()
+            with open(output, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=EXPORT_CHUNK_SIZE):
+                    file.write(chunk)
+                    size += len(chunk)
+    except requests.exceptions.HTTPError as err:
+        raise SystemExit(f'{response.json()["error"]}')
+    except requests.exceptions.RequestException as err:
+        raise SystemExit(err)
+
+    print(f'Exported {equipment_type} to {output} ({size} bytes)')
+
+
+def lookup(args: argparse.Namespace, server: str) -> None:
+    """
+    Look up every given name and ID, LOOKUP_BATCH_SIZE at a time, and print
+    the item each one resolves to.
+    """
+    equipment_type = ROUTE_MAP[args.equipment_type]
+    names = list(args.names)
+    if args.file:
+        try:
+            with open(args.file) as file:
+                names.extend(line.strip() for line in file if line.strip())
+        except OSError as err:
+            raise SystemExit(err)
+    if not names and not args.ids:
+        raise SystemExit('Give at least one name or ID to look up')
+
+    inputs = [('ids', item_id) for item_id in args.ids] + [('names', name) for name in names]
+    for start in range(0, len(inputs), LOOKUP_BATCH_SIZE):
+        batch = inputs[start:start + LOOKUP_BATCH_SIZE]
+        body = {field: [value for kind, value in batch if kind == field] for field in ['ids', 'names']}
+        try:
+            response = session.post(f'{server}/{equipment_type}/lookup', json=body)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            raise SystemExit(error_message(response, err))
+        except requests.exceptions.RequestException as err:
+            raise SystemExit(err)
+
+        result = response.json()
+        for kind, value in batch:
+            item = result[kind][value]
+            if item is None:
+                if not args.json:
+                    print(f'No {args.equipment_type} found for "{value}"')
+                continue
+            if not args.json:
+                print(f'{value}:')
+            print_items([item], args.json)
+
+
+def error_message(response: requests.Response, err: requests.exceptions.HTTPError) -> str:
+    """
+    Return the error the server gave for a failed request, or the response
+    text or HTTP error if the body is not a JSON error, as from a proxy.
+    """
+    try:
+        return response.json()['error']
+    except (ValueError, KeyError, TypeError):
+        return response.text.strip() or str(err)
+
+
+def wait_for_job(status_url: str) -> dict:
+    """
+    Poll a crawl job until it is done, printing its progress. Returns the final status.
+    """
+    while True:
+        try:
+            response = session.get(status_url)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            raise SystemExit(f'{response.json()["error"]}')
+        except requests.exceptions.RequestException as err:
+            raise SystemExit(err)
+
+        status = response.json()
+        print(f'\r{status["state"].capitalize():<10} {status["items_scraped"]} items from '
+              f'{status["pages_fetched"]} pages in {status["elapsed_seconds"]}s', end='', flush=True)
+        if status['state'] in JOB_DONE_STATES:
+            print()
+            return status
+        time.sleep(JOB_POLL_INTERVAL)
+
+
 def get_with_name(args: argparse.Namespace, server: str) -> None:
     """
     Return all matching equipment items given the name.
     """
     page = 1
+    after = None
     equipment_type = ROUTE_MAP[args.equipment_type]
     result = []
     quit = False
 
     while not quit:
         try:
-            response = requests.get(f'{server}/{equipment_type}?name={args.name}&page={page}')
+            response = cache.get(f'{server}/{equipment_type}', params={'name': args.name, 'after': after})
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             if response.status_code == 404:
@@ -119,6 +319,11 @@ def get_with_name(args: argparse.Namespace, server: str) -> None:
                 lowestPrice = min(entry['price'] for entry in item['entries'])
                 print(f'{item['name']:<50} {lowestPrice}')
 
+            # Follow the cursor to the next page, if there is one
+            after = json['next']
+            if after == 'null':
+                print(f'No more {equipment_type} found with name "{args.name}"')
+                return
             quit = handle_page()
             page += 1
         else:
@@ -141,10 +346,11 @@ def get_all(args: argparse.Namespace, server: str) -> None:
     equipment_type = ROUTE_MAP[args.equipment_type]
     quit = False
     page = 1
+    after = None
 
     while not quit:
         try:
-            response = requests.get(f'{server}/{equipment_type}?page={page}')
+            response = cache.get(f'{server}/{equipment_type}', params={'after': after})
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             if response.status_code == 404:
@@ -166,10 +372,130 @@ def get_all(args: argparse.Namespace, server: str) -> None:
             for item in json['items']:
                 print(item['name'])
 
+        # Follow the cursor to the next page, if there is one
+        after = json['next']
+        if after == 'null':
+            print(f'No more {equipment_type} found')
+            return
         quit = handle_page()
         page += 1
 
 
+def get_batch(args: argparse.Namespace, server: str) -> None:
+    """
+    Return every matching equipment item without prompting between pages.
+    The next page is fetched in the background while the current one is printed.
+    """
+    equipment_type = ROUTE_MAP[args.equipment_type]
+    params = {'name': args.name, 'limit': BATCH_PAGE_LIMIT}
+    found = 0
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch_page, server, equipment_type, params)
+        while future:
+            page = future.result()
+            if page is None:
+                break
+
+            # Start on the next page before printing this one
+            future = None
+            if page['next'] != 'null':
+                future = executor.submit(fetch_page, server, equipment_type, {**params, 'after': page['next']})
+
+            print_items(page['items'], args.json)
+            found += len(page['items'])
+
+    if not found and not args.json:
+        if args.name:
+            print(f'No {equipment_type} found with name "{args.name}"')
+        else:
+            print(f'No {equipment_type} found')
+
+
+def get_by_ids(args: argparse.Namespace, server: str) -> None:
+    """
+    Return the equipment items with the given IDs, fetching them concurrently.
+    """
+    equipment_type = ROUTE_MAP[args.equipment_type]
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        items = executor.map(lambda item_id: fetch_item(server, equipment_type, item_id), args.ids)
+        for item_id, item in zip(args.ids, items):
+            if item is None:
+                if not args.json:
+                    print(f'No {args.equipment_type} found with ID {item_id}')
+                continue
+            print_items([item], args.json)
+
+
+def fetch_page(server: str, equipment_type: str, params: dict) -> dict | None:
+    """
+    Fetch one page of equipment items. Returns None if nothing was found.
+    """
+    try:
+        response = cache.get(f'{server}/{equipment_type}', params=params)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        if response.status_code == 404:
+            return None
+        raise SystemExit(f'{response.json()["error"]}')
+    except requests.exceptions.RequestException as err:
+        raise SystemExit(err)
+
+    return response.json()
+
+
+def fetch_item(server: str, equipment_type: str, item_id: str) -> dict | None:
+    """
+    Fetch a single equipment item by ID. Returns None if it does not exist.
+    """
+    try:
+        response = cache.get(f'{server}/{equipment_type}/{item_id}')
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        if response.status_code == 404:
+            return None
+        raise SystemExit(f'{response.json()["error"]}')
+    except requests.exceptions.RequestException as err:
+        raise SystemExit(err)
+
+    return response.json()
+
+
+def print_items(items: list, as_json: bool) -> None:
+    """
+    Print equipment items, either as one line of JSON each or as their names and lowest current prices.
+    """
+    for item in items:
+        if as_json:
+            print(json.dumps(item))
+        else:
+            cheapest = min(item['entries'], key=lambda entry: entry.get('price_usd') or float('inf'))
+            print(f'{item['name']:<50} {cheapest['price']}')
+
+
+def positive_int(value: str) -> int:
+    """
+    Parse a command line argument that must be a whole number of at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid int value: {value!r}')
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, not {number}')
+    return number
+
+
+def mount_pool(workers: int) -> None:
+    """
+    Size the session's connection pool so each worker can keep its own connection open.
+    """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+
 def get_hostname(url: str) -> str:
     """
     Extract the hostname from the given URL.
@@ -208,7 +534,7 @@ class Server():
     """
     def __init__(self):
         config = configparser.ConfigParser()
-        config.read('clientconfig.ini')
+        config.read(CONFIG_FILE)
         self.server = config['server']['hostname']
 
     def get(self) -> str:
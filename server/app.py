@@ -14,9 +14,13 @@ import os
 app = Flask(__name__)
 cors = CORS(app, resources={r'/*': {'origins': os.getenv('ALLOWED_ORIGINS')}})
 
-from routes import equipment
+import metrics
+from routes import equipment, jobs, watchlist
 
 app.register_blueprint(equipment.dp)
+app.register_blueprint(jobs.dp)
+app.register_blueprint(watchlist.dp)
+metrics.init_app(app, equipment.db, equipment.response_cache)
 
 @app.route('/health')
 def health_check():
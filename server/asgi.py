@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Program: ttserver
+
+Description: An ASGI server for the read endpoints of the API, using Quart
+             and PyMongo's asyncio client, so each worker keeps serving
+             requests while others wait on MongoDB. Serves GET
+             /<equipment type>, /<equipment type>/<id>,
+             /<equipment type>/<id>/history and /health, and POST
+             /<equipment type>/lookup, with the same JSON as the Flask app,
+             built by the same query builders in queries.py. Crawl jobs,
+             the watchlist, autocomplete and export are served by the Flask
+             app.
+
+Usage: hypercorn --bind 0.0.0.0:5001 asgi:app
+"""
+import asyncio
+import functools
+import hashlib
+import os
+
+from pymongo import AsyncMongoClient
+from quart import Blueprint, Quart, current_app, jsonify, make_response, request
+from quart_cors import cors
+
+import queries
+from cache import ResponseCache
+from equipment_scraper.generations import GENERATION_COLLECTION_NAME
+from equipment_scraper.history import HISTORY_COLLECTION_NAME, daily_history_pipeline, group_daily_history
+from queries import CACHE_MAX_AGE, CACHEABLE_STATUS_CODES, VALID_EQUIPMENT_TYPES
+
+app = Quart(__name__)
+app = cors(app, allow_origin=os.getenv('ALLOWED_ORIGINS') or '*')
+
+dp = Blueprint('equipment', __name__)
+# Generations and collection names are read with the async client in refresh_cache()
+response_cache = ResponseCache(None)
+refresh_lock = asyncio.Lock()
+client = None
+db = None
+
+
+@app.before_serving
+async def connect():
+    global client, db
+    client = AsyncMongoClient(os.getenv('MONGODB_URI'))
+    db = client[os.getenv('MONGODB_DB_NAME')]
+
+
+@app.after_serving
+async def disconnect():
+    await client.close()
+
+
+async def refresh_cache() -> None:
+    """
+    Re-read the collection generations and names for the response cache,
+    if they are out of date.
+    """
+    if not response_cache.needs_refresh():
+        return
+    async with refresh_lock:
+        # Another request may have refreshed it while this one waited
+        if not response_cache.needs_refresh():
+            return
+        generations = {doc['_id']: doc['generation'] async for doc in db[GENERATION_COLLECTION_NAME].find()}
+        response_cache.update(generations, await db.list_collection_names())
+
+
+def cached_response(view):
+    """
+    Serve a GET view from the response cache, with an ETag and Cache-Control
+    header, as the Flask app's cached_response does.
+    """
+    @functools.wraps(view)
+    async def wrapper(equipment_type, **kwargs):
+        await refresh_cache()
+        key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+        cached = response_cache.get(equipment_type, key)
+        if cached is None:
+            response = await make_response(await view(equipment_type, **kwargs))
+            body = await response.get_data()
+            cached = (body, response.status_code, response.mimetype, hashlib.sha1(body).hexdigest())
+            if response.status_code in CACHEABLE_STATUS_CODES:
+                response_cache.set(equipment_type, key, cached)
+
+        body, status, mimetype, etag = cached
+        response = current_app.response_class(body, status=status, mimetype=mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}'
+        return await response.make_conditional(request)
+    return wrapper
+
+
+def is_valid_equipment_type(equipment_type: str) -> bool:
+    """
+    Check the equipment type is supported and its collection exists.
+    """
+    return equipment_type in VALID_EQUIPMENT_TYPES and response_cache.collection_exists(equipment_type)
+
+
+@dp.route('/<equipment_type>/lookup', methods=['POST'])
+async def lookup_equipment(equipment_type):
+    """
+    Look up many equipment items at once by ID and name, as POST
+    /<equipment type>/lookup does in the Flask app.
+    """
+    await refresh_cache()
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+    try:
+        ids, names = queries.parse_lookup(await request.get_json(silent=True))
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    collection = db[equipment_type]
+    items = await collection.find(queries.lookup_ids_filter(ids)).to_list() if ids else []
+    if names:
+        items.extend(await collection.find(queries.lookup_names_filter(names)).to_list())
+        unmatched = queries.unmatched_names(names, items)
+        if unmatched:
+            cursor = await collection.aggregate(queries.lookup_text_pipeline(unmatched))
+            items.extend(await cursor.to_list())
+    return jsonify(queries.lookup_result(ids, names, items))
+
+
+@dp.route('/<equipment_type>/<id>/history', methods=['GET'])
+@cached_response
+async def get_equipment_history(equipment_type, id):
+    """
+    Return the price history of each site entry of an equipment item.
+    """
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+    try:
+        days = queries.parse_history_days(request.args)
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    cursor = await db[HISTORY_COLLECTION_NAME].aggregate(daily_history_pipeline(equipment_type, id, days))
+    entries = group_daily_history(await cursor.to_list())
+    if not entries:
+        return jsonify({'error': f'No price history found for {equipment_type[:-1]} with ID {id}'}), 404
+    return jsonify({'_id': id, 'days': days, 'entries': entries})
+
+
+@dp.route('/<equipment_type>/<id>', methods=['GET'])
+@cached_response
+async def get_equipment_item(equipment_type, id):
+    """
+    Return a specific equipment item by ID.
+    """
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+
+    item = await db[equipment_type].find_one({'_id': id})
+    if not item:
+        return jsonify({'error': f'No {equipment_type[:-1]} found with ID {id}'}), 404
+    return jsonify(item)
+
+
+@dp.route('/<equipment_type>', methods=['GET'])
+@cached_response
+async def get_equipment(equipment_type):
+    """
+    Return all matching equipment items given the name, as GET /<equipment type>
+    does in the Flask app.
+    """
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+
+    try:
+        pipeline, equipment_name, limit = queries.build_search(request.args)
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    cursor = await db[equipment_type].aggregate(pipeline)
+    result = queries.search_result(await cursor.to_list(), equipment_name, limit)
+    if result is None:
+        return jsonify({'error': f'No {equipment_type} found'}), 404
+    return jsonify(result)
+
+
+app.register_blueprint(dp)
+
+
+@app.route('/health')
+async def health_check():
+    return {'status': 'healthy'}, 200
+
+
+# Add security headers
+@app.after_request
+async def add_security_headers(response):
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['X-Frame-Options'] = 'DENY'
+    response.headers['X-XSS-Protection'] = '1; mode=block'
+    return response
@@ -0,0 +1,194 @@
+"""
+In-memory fuzzy autocomplete over equipment names.
+
+Names are indexed by their word trigrams, padded so the start of each word
+has its own trigrams. A query matches names sharing trigrams with it, so
+prefixes such as "tenergy 0" and typos such as "butterfy" still match.
+Matches are ranked by trigram similarity, with a bonus for names that
+start with the query or have a word starting with each query word.
+"""
+from collections import Counter, defaultdict
+import re
+import threading
+import time
+
+from equipment_scraper.generations import get_generations
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+DEFAULT_LIMIT = 10
+# Fraction of the query's trigrams a name must share to be considered
+MIN_SHARED_FRACTION = 0.3
+# The index is rebuilt from scratch this often, to drop removed or renamed items
+REBUILD_INTERVAL = 3600
+DEFAULT_REFRESH_INTERVAL = 5
+
+
+def normalize(name: str) -> list[str]:
+    """
+    Split a name into lowercase words, ignoring punctuation.
+    """
+    return WORD_PATTERN.findall(name.casefold())
+
+
+def trigrams(words: list[str]) -> set[str]:
+    """
+    Return the trigrams of each word, padded so that word starts are distinct.
+    """
+    grams = set()
+    for word in words:
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex():
+    """
+    A trigram index of item names.
+    """
+    def __init__(self):
+        self.names = {}
+        self.words = {}
+        self.grams = {}
+        self.postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, item_id: str, name: str) -> None:
+        """
+        Add or replace an item's name.
+        """
+        if item_id in self.names:
+            self.remove(item_id)
+        words = normalize(name)
+        grams = trigrams(words)
+        self.names[item_id] = name
+        self.words[item_id] = words
+        self.grams[item_id] = grams
+        for gram in grams:
+            self.postings[gram].add(item_id)
+
+    def copy(self) -> 'NameIndex':
+        """
+        Return a copy of the index that can be changed without affecting this one.
+        """
+        index = NameIndex()
+        index.names = dict(self.names)
+        index.words = dict(self.words)
+        index.grams = dict(self.grams)
+        index.postings = defaultdict(set, {gram: set(item_ids) for gram, item_ids in self.postings.items()})
+        return index
+
+    def remove(self, item_id: str) -> None:
+        """
+        Remove an item, if it is in the index.
+        """
+        if item_id not in self.names:
+            return
+        for gram in self.grams[item_id]:
+            self.postings[gram].discard(item_id)
+            if not self.postings[gram]:
+                del self.postings[gram]
+        del self.names[item_id]
+        del self.words[item_id]
+        del self.grams[item_id]
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        """
+        Return up to limit items matching the query, best match first.
+        """
+        query_words = normalize(query)
+        query_grams = trigrams(query_words)
+        if not query_grams:
+            return []
+
+        # Count the trigrams each candidate shares with the query, and only
+        # score candidates sharing enough of them to be a plausible match
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+        min_shared = max(1, int(len(query_grams) * MIN_SHARED_FRACTION))
+
+        matches = []
+        for item_id, count in shared.items():
+            if count < min_shared:
+                continue
+            score = 2 * count / (len(query_grams) + len(self.grams[item_id]))
+            words = self.words[item_id]
+            if ' '.join(words).startswith(' '.join(query_words)):
+                score += 1
+            elif all(any(word.startswith(query_word) for word in words) for query_word in query_words):
+                score += 0.5
+            matches.append((score, item_id))
+
+        matches.sort(key=lambda match: (-match[0], len(self.names[match[1]]), match[1]))
+        return [{'_id': item_id, 'name': self.names[item_id], 'score': round(score, 3)}
+                for score, item_id in matches[:limit]]
+
+
+class Autocomplete():
+    """
+    Keeps a NameIndex per collection up to date with MongoDB.
+    When the crawler bumps a collection's generation, the IDs in the
+    collection are compared with the indexed ones, and only the items added
+    or removed since, such as by merging products, are read or dropped. The
+    whole index is rebuilt every REBUILD_INTERVAL seconds. Indexes are never changed once searchable:
+    updates are made to a copy, which then replaces the index, so searches
+    do not need the lock.
+    """
+    def __init__(self, db, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def search(self, collection_name: str, query: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+        """
+        Return up to limit items from the collection matching the query.
+        """
+        return self._index(collection_name).search(query, limit)
+
+    def _index(self, collection_name: str) -> NameIndex:
+        """
+        Return the collection's index, refreshing it if it may be out of date.
+        """
+        now = time.monotonic()
+        state = self._indexes.get(collection_name)
+        if state and now - state['checked_at'] < self.refresh_interval:
+            return state['index']
+
+        with self._lock:
+            state = self._indexes.get(collection_name)
+            generation = get_generations(self.db).get(collection_name, 0)
+            if not state or now - state['built_at'] > REBUILD_INTERVAL:
+                state = self._build(collection_name, generation, now)
+            elif state['generation'] != generation:
+                state = self._update(collection_name, state, generation)
+            state = {**state, 'checked_at': now}
+            self._indexes[collection_name] = state
+            return state['index']
+
+    def _build(self, collection_name: str, generation: int, now: float) -> dict:
+        """
+        Build a new index of every item in the collection.
+        """
+        index = NameIndex()
+        for item in self.db[collection_name].find({}, {'name': 1}):
+            index.add(item['_id'], item['name'])
+        return {'index': index, 'generation': generation, 'built_at': now, 'checked_at': now}
+
+    def _update(self, collection_name: str, state: dict, generation: int) -> dict:
+        """
+        Return a new state whose index is a copy of the current one, with the
+        items added to the collection since it was indexed added, and the
+        items removed from it removed.
+        """
+        index = state['index'].copy()
+        item_ids = {item['_id'] for item in self.db[collection_name].find({}, {'_id': 1})}
+        for item_id in index.names.keys() - item_ids:
+            index.remove(item_id)
+        added = list(item_ids - index.names.keys())
+        if added:
+            for item in self.db[collection_name].find({'_id': {'$in': added}}, {'name': 1}):
+                index.add(item['_id'], item['name'])
+        return {**state, 'index': index, 'generation': generation}
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Program: cold_start
+
+Description: Measures how long a fresh API process takes to import the Flask
+             app, and its peak RSS afterwards. Each run is a new interpreter,
+             so nothing is cached between runs. Pass --with-scrapy to also
+             import the Scrapy modules the API used to load, for comparison.
+
+Usage: python -m benchmarks.cold_start [-r <runs>] [--with-scrapy]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RUNS = 10
+
+# Run in the child interpreter, printing the import time and peak RSS as JSON
+CHILD_SCRIPT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+if {with_scrapy}:
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    import equipment_scraper.spiders.store_spider
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'scrapy_loaded': 'scrapy' in sys.modules,
+    'twisted_loaded': 'twisted' in sys.modules,
+}}))
+'''
+
+
+def main():
+    """
+    Parse arguments, run the benchmark and print a summary.
+    """
+    parser = argparse.ArgumentParser(description='Measure API cold start time and memory.')
+    parser.add_argument('-r', '--runs',
+                        type=int,
+                        default=DEFAULT_RUNS,
+                        help='Number of fresh processes to start')
+    parser.add_argument('--with-scrapy',
+                        action='store_true',
+                        help='Also import the Scrapy modules the API used to load')
+    args = parser.parse_args()
+
+    results = [run_once(args.with_scrapy) for _ in range(args.runs)]
+    seconds = [result['seconds'] for result in results]
+    rss = [result['max_rss_kb'] for result in results]
+
+    print(f'Runs:            {args.runs}')
+    print(f'Import time:     median {statistics.median(seconds) * 1000:.1f} ms, '
+          f'min {min(seconds) * 1000:.1f} ms, max {max(seconds) * 1000:.1f} ms')
+    print(f'Peak RSS:        median {statistics.median(rss) / 1024:.1f} MiB')
+    print(f'Scrapy loaded:   {results[0]["scrapy_loaded"]}')
+    print(f'Twisted loaded:  {results[0]["twisted_loaded"]}')
+
+
+def run_once(with_scrapy: bool) -> dict:
+    """
+    Import the app in a new interpreter and return its measurements.
+    """
+    env = dict(os.environ)
+    # The app only needs these to be set; it does not connect on import
+    env.setdefault('MONGODB_URI', 'mongodb://localhost:27017')
+    env.setdefault('MONGODB_DB_NAME', 'ttequipment_db')
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT.format(with_scrapy=with_scrapy)],
+        cwd=SERVER_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    main()
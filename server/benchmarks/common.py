@@ -0,0 +1,71 @@
+"""
+Helpers shared by the MongoDB benchmarks: synthetic equipment data, a
+command listener counting round trips, and latency percentiles.
+"""
+from collections import Counter
+import math
+import random
+import statistics
+
+from pymongo import monitoring
+
+from equipment_scraper.matching import BRANDS
+
+DEFAULT_BENCHMARK_DB_NAME = 'ttequipment_benchmark'
+MODEL_WORDS = ['Tenergy', 'Dignics', 'Rakza', 'Vega', 'Hurricane', 'Evolution', 'Rasanter', 'Fastarc',
+               'Bluestorm', 'Omega', 'Hexer', 'Mantra', 'Nexxus', 'Target', 'Victas', 'Kinetic']
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts the commands sent to MongoDB, by command name. Each command is one round trip.
+    """
+    def __init__(self):
+        self.commands = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.commands.values())
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def synthetic_items(count: int, sites: int, seed: int = 0):
+    """
+    Yield count scraped items, for count / sites products each sold on every
+    site, one site at a time like a crawl. Sites name products differently,
+    so the pipeline has to match them.
+    """
+    rng = random.Random(seed)
+    brands = sorted(set(BRANDS.values()))
+    products = math.ceil(count / sites)
+    produced = 0
+    for site in range(sites):
+        for product in range(products):
+            if produced == count:
+                return
+            brand = brands[product % len(brands)]
+            model = f'{MODEL_WORDS[product % len(MODEL_WORDS)]} {product}'
+            name = f'{brand.title()} {model}' if site % 2 == 0 else f'{model} ({brand.title()})'
+            yield {
+                'url': f'https://www.site{site}.com/products/{product}',
+                'name': name,
+                'price': f'${rng.uniform(20, 120):.2f}',
+            }
+            produced += 1
+
+
+def percentile(values: list[float], percent: int) -> float:
+    """
+    Return the given percentile of the values.
+    """
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Program: ingest
+
+Description: Measures how MongoPipeline scales as a collection grows. Synthetic
+             items for products sold on several sites are driven through the
+             pipeline into a scratch database, and every report interval the
+             writes per second, MongoDB round trips per item, and p50/p99
+             latency of process_item are printed. Needs a running MongoDB,
+             such as the one in compose.yaml; the database is dropped first.
+
+Usage: python -m benchmarks.ingest [-n <items>] [-s <sites>] [-b <batch size>] [--uri <uri>] [--db <name>] [--keep]
+"""
+import argparse
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+import pymongo
+from pymongo import monitoring
+
+from benchmarks.common import DEFAULT_BENCHMARK_DB_NAME, CommandCounter, percentile, synthetic_items
+from equipment_scraper.items import EquipmentItem
+from equipment_scraper.pipelines import DEFAULT_BATCH_SIZE, MongoPipeline
+
+DEFAULT_ITEMS = 10000
+DEFAULT_SITES = 4
+DEFAULT_URI = 'mongodb://localhost:27017'
+REPORTS = 10
+
+
+def main():
+    """
+    Parse arguments, run the benchmark and print a summary.
+    """
+    parser = argparse.ArgumentParser(description='Measure MongoPipeline ingestion throughput.')
+    parser.add_argument('-n', '--items',
+                        type=int,
+                        default=DEFAULT_ITEMS,
+                        help='Number of scraped items to ingest')
+    parser.add_argument('-s', '--sites',
+                        type=int,
+                        default=DEFAULT_SITES,
+                        help='Number of sites each product is sold on')
+    parser.add_argument('-b', '--batch-size',
+                        type=int,
+                        default=DEFAULT_BATCH_SIZE,
+                        help='MONGO_BATCH_SIZE for the pipeline')
+    parser.add_argument('--uri',
+                        default=os.getenv('MONGODB_URI', DEFAULT_URI),
+                        help='MongoDB to run against')
+    parser.add_argument('--db',
+                        default=DEFAULT_BENCHMARK_DB_NAME,
+                        help='Scratch database, dropped before the run')
+    parser.add_argument('--keep',
+                        action='store_true',
+                        help='Keep the database afterwards, for benchmarks.read')
+    args = parser.parse_args()
+
+    # The pipeline logs every item
+    logging.basicConfig(level=logging.WARNING)
+
+    counter = CommandCounter()
+    monitoring.register(counter)
+    client = pymongo.MongoClient(args.uri)
+    client.drop_database(args.db)
+    prepare(client[args.db])
+
+    try:
+        run(args, counter)
+    finally:
+        if not args.keep:
+            client.drop_database(args.db)
+        client.close()
+
+
+def prepare(db) -> None:
+    """
+    Create the indexes migrate.py would, so writes pay for index maintenance.
+    """
+    # Imported here, since migrate.py needs MONGODB_DB_NAME set
+    os.environ.setdefault('MONGODB_DB_NAME', db.name)
+    from migrate import ensure_indexes
+    ensure_indexes(db)
+
+
+def run(args: argparse.Namespace, counter: CommandCounter) -> None:
+    """
+    Drive the synthetic items through the pipeline, printing a row every report interval.
+    """
+    # Never flush on a timer, so batches are the same size on any machine
+    pipeline = MongoPipeline(args.uri, args.db, batch_size=args.batch_size, flush_interval=float('inf'))
+    spider = SimpleNamespace(name='rubber_benchmark')
+    pipeline.open_spider(spider)
+    report_every = max(args.items // REPORTS, 1)
+    # Only count the pipeline's own commands
+    counter.commands.clear()
+
+    print(f'{"Items":>9} {"Writes/s":>10} {"Trips/item":>11} {"p50 ms":>8} {"p99 ms":>8}')
+    start = time.perf_counter()
+    interval_start = start
+    interval_trips = counter.total
+    timings = []
+    for count, fields in enumerate(synthetic_items(args.items, args.sites), 1):
+        item = EquipmentItem(**fields)
+        item_start = time.perf_counter()
+        pipeline.process_item(item, spider)
+        timings.append(time.perf_counter() - item_start)
+
+        if count % report_every == 0 or count == args.items:
+            if count == args.items:
+                # Include the final flush in the last interval
+                item_start = time.perf_counter()
+                pipeline.close_spider(spider)
+                timings[-1] += time.perf_counter() - item_start
+            now = time.perf_counter()
+            trips = counter.total - interval_trips
+            print(f'{count:>9} {len(timings) / (now - interval_start):>10.0f} {trips / len(timings):>11.3f} '
+                  f'{percentile(timings, 50) * 1000:>8.3f} {percentile(timings, 99) * 1000:>8.3f}')
+            interval_start = now
+            interval_trips = counter.total
+            timings = []
+
+    elapsed = time.perf_counter() - start
+    print(f'Total:           {args.items} items in {elapsed:.2f} s, {args.items / elapsed:.0f} writes/s')
+    print('Round trips:     ' + ', '.join(f'{name} {count}' for name, count in counter.commands.most_common()))
+
+
+if __name__ == '__main__':
+    main()
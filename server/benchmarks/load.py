@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Program: load
+
+Description: Load tests running API servers with many concurrent clients,
+             to compare the Flask app under gunicorn with the async app in
+             asgi.py. Each target is given the same mix of item lookups,
+             name searches and cursor pages for the items it returns, one
+             target after another. Every request has a unique query
+             parameter, so it misses the response cache and waits on
+             MongoDB, unless --cached is given. Prints the requests per
+             second, p50/p99 latency and errors of each target. Run it on
+             other cores or another machine than the servers.
+
+Usage: python -m benchmarks.load [-t <name>=<url> ...] [-c <clients>] [-d <seconds>] [-e <equipment type>] [--cached]
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from urllib.parse import quote
+
+import aiohttp
+
+from benchmarks.common import percentile
+
+DEFAULT_TARGETS = ['sync=http://localhost:5000', 'async=http://localhost:5001']
+DEFAULT_CLIENTS = 128
+DEFAULT_DURATION = 30
+DEFAULT_WARMUP = 3
+DEFAULT_EQUIPMENT_TYPE = 'rubbers'
+SAMPLE_PAGES = 5
+SAMPLE_LIMIT = 100
+PAGE_LIMIT = 20
+# Share of each kind of request in the mix
+REQUEST_MIX = {'item': 5, 'search': 3, 'page': 2}
+
+
+def main():
+    """
+    Parse arguments, run the load test against each target and print a summary.
+    """
+    parser = argparse.ArgumentParser(description='Compare API servers under concurrent load.')
+    parser.add_argument('-t', '--target',
+                        action='append',
+                        dest='targets',
+                        metavar='NAME=URL',
+                        help=f'Server to load, may be given more than once (default: {" ".join(DEFAULT_TARGETS)})')
+    parser.add_argument('-c', '--clients',
+                        type=int,
+                        default=DEFAULT_CLIENTS,
+                        help='Number of concurrent clients')
+    parser.add_argument('-d', '--duration',
+                        type=float,
+                        default=DEFAULT_DURATION,
+                        help='Seconds to load each target for')
+    parser.add_argument('-w', '--warmup',
+                        type=float,
+                        default=DEFAULT_WARMUP,
+                        help='Seconds of load before measuring')
+    parser.add_argument('-e', '--equipment-type',
+                        default=DEFAULT_EQUIPMENT_TYPE,
+                        help='Equipment type to request')
+    parser.add_argument('--cached',
+                        action='store_true',
+                        help='Let requests be served from the response cache')
+    args = parser.parse_args()
+
+    targets = [target.split('=', 1) for target in args.targets or DEFAULT_TARGETS]
+    asyncio.run(run(targets, args))
+
+
+async def run(targets: list[list[str]], args) -> None:
+    """
+    Sample items from the first target, then load each target in turn.
+    """
+    connector = aiohttp.TCPConnector(limit=args.clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        items = await sample_items(session, targets[0][1], args.equipment_type)
+        if not items:
+            raise SystemExit(f'No {args.equipment_type} returned by {targets[0][1]}')
+
+        print(f'{"Target":<10} {"Clients":>8} {"Requests":>9} {"Errors":>7} {"Req/s":>9} {"p50 ms":>8} {"p99 ms":>8}')
+        for name, url in targets:
+            await load(session, url, items, args, measure=False, duration=args.warmup)
+            result = await load(session, url, items, args, measure=True, duration=args.duration)
+            timings = result['timings']
+            print(f'{name:<10} {args.clients:>8} {len(timings):>9} {result["errors"]:>7} '
+                  f'{len(timings) / args.duration:>9.1f} {percentile(timings, 50) * 1000:>8.2f} '
+                  f'{percentile(timings, 99) * 1000:>8.2f}')
+
+
+async def sample_items(session, url: str, equipment_type: str) -> list[dict]:
+    """
+    Return the ID and name of the first items, by following the next cursor.
+    """
+    items = []
+    params = {'limit': SAMPLE_LIMIT}
+    for _ in range(SAMPLE_PAGES):
+        async with session.get(f'{url}/{equipment_type}', params=params) as response:
+            if response.status != 200:
+                break
+            body = await response.json()
+        items.extend({'_id': item['_id'], 'name': item['name']} for item in body['items'])
+        if body['next'] == 'null':
+            break
+        params['after'] = body['next']
+    return items
+
+
+async def load(session, url: str, items: list[dict], args, measure: bool, duration: float) -> dict:
+    """
+    Run the clients against the target for the duration, and return the
+    latency of each request and the number of errors.
+    """
+    deadline = time.monotonic() + duration
+    result = {'timings': [], 'errors': 0}
+    # Unique per request, so no two requests share a response cache key
+    counter = itertools.count()
+
+    async def client(seed: int):
+        rng = random.Random(seed)
+        kinds = list(REQUEST_MIX)
+        weights = list(REQUEST_MIX.values())
+        while time.monotonic() < deadline:
+            path, params = build_request(rng.choices(kinds, weights)[0], rng.choice(items), args.equipment_type)
+            if not args.cached:
+                params['_'] = next(counter)
+            start = time.perf_counter()
+            try:
+                async with session.get(f'{url}{path}', params=params) as response:
+                    await response.read()
+                    failed = response.status >= 500
+            except aiohttp.ClientError:
+                failed = True
+            if measure:
+                result['timings'].append(time.perf_counter() - start)
+                result['errors'] += failed
+
+    await asyncio.gather(*(client(seed) for seed in range(args.clients)))
+    return result
+
+
+def build_request(kind: str, item: dict, equipment_type: str) -> tuple[str, dict]:
+    """
+    Build the path and parameters of a request of the given kind for an item.
+    """
+    if kind == 'item':
+        return f'/{equipment_type}/{quote(item["_id"], safe="")}', {}
+    if kind == 'search':
+        return f'/{equipment_type}', {'name': item['name']}
+    return f'/{equipment_type}', {'after': item['_id'], 'limit': PAGE_LIMIT}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Program: read
+
+Description: Measures get_equipment against a database filled by
+             benchmarks.ingest --keep. Text searches for names sampled from
+             the collection, cursor paging and page number paging are run
+             through the Flask test client with the response cache cleared
+             before every request, and the p50/p99 latency and MongoDB round
+             trips per request are printed for each.
+
+Usage: python -m benchmarks.read [-q <queries>] [-p <pages>] [-l <limit>] [--uri <uri>] [--db <name>]
+"""
+import argparse
+import os
+import time
+
+from pymongo import monitoring
+
+from benchmarks.common import DEFAULT_BENCHMARK_DB_NAME, CommandCounter, percentile
+
+DEFAULT_QUERIES = 200
+DEFAULT_PAGES = 50
+DEFAULT_LIMIT = 100
+DEFAULT_URI = 'mongodb://localhost:27017'
+COLLECTION_NAME = 'rubbers'
+
+
+def main():
+    """
+    Parse arguments, run the benchmark and print a summary.
+    """
+    parser = argparse.ArgumentParser(description='Measure equipment search and paging latency.')
+    parser.add_argument('-q', '--queries',
+                        type=int,
+                        default=DEFAULT_QUERIES,
+                        help='Number of text searches to run')
+    parser.add_argument('-p', '--pages',
+                        type=int,
+                        default=DEFAULT_PAGES,
+                        help='Number of pages to read when paging')
+    parser.add_argument('-l', '--limit',
+                        type=int,
+                        default=DEFAULT_LIMIT,
+                        help='Items per page when paging')
+    parser.add_argument('--uri',
+                        default=os.getenv('MONGODB_URI', DEFAULT_URI),
+                        help='MongoDB to run against')
+    parser.add_argument('--db',
+                        default=DEFAULT_BENCHMARK_DB_NAME,
+                        help='Database filled by benchmarks.ingest --keep')
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    monitoring.register(counter)
+    # The app reads these on import
+    os.environ['MONGODB_URI'] = args.uri
+    os.environ['MONGODB_DB_NAME'] = args.db
+    from app import app
+    from db import db
+    from routes.equipment import response_cache
+
+    names = [item['name'] for item in db[COLLECTION_NAME].aggregate([
+        {'$sample': {'size': args.queries}}, {'$project': {'name': 1}}
+    ])]
+    if not names:
+        raise SystemExit(f'No {COLLECTION_NAME} in {args.db}, run benchmarks.ingest --keep first')
+
+    client = app.test_client()
+
+    def request(params: dict) -> dict:
+        response_cache.clear()
+        response = client.get(f'/{COLLECTION_NAME}', query_string=params)
+        return response.get_json()
+
+    print(f'{"Scenario":<16} {"Requests":>9} {"Trips/req":>10} {"p50 ms":>8} {"p99 ms":>8}')
+    report('Text search', measure(counter, [lambda name=name: request({'name': name}) for name in names]))
+    report('Cursor paging', measure(counter, cursor_pages(request, args.pages, args.limit)))
+    report('Page paging', measure(counter, [lambda page=page: request({'page': page, 'limit': args.limit})
+                                            for page in range(1, args.pages + 1)]))
+
+
+def cursor_pages(request, pages: int, limit: int) -> list:
+    """
+    Build the requests that read the first pages by following the next cursor.
+    """
+    state = {'after': None}
+
+    def next_page():
+        params = {'limit': limit}
+        if state['after']:
+            params['after'] = state['after']
+        body = request(params)
+        state['after'] = body.get('next') if body.get('next') != 'null' else None
+
+    return [next_page] * pages
+
+
+def measure(counter: CommandCounter, calls: list) -> dict:
+    """
+    Run each call, timing it and counting its round trips.
+    """
+    timings = []
+    trips = counter.total
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return {'timings': timings, 'trips': counter.total - trips}
+
+
+def report(name: str, result: dict) -> None:
+    """
+    Print a row of the summary.
+    """
+    timings = result['timings']
+    print(f'{name:<16} {len(timings):>9} {result["trips"] / len(timings):>10.2f} '
+          f'{percentile(timings, 50) * 1000:>8.3f} {percentile(timings, 99) * 1000:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
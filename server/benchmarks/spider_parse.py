@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Program: spider_parse
+
+Description: Measures how fast each store's fixture listing pages from
+             tests/fixtures are parsed, without network access. Every run
+             parses a new response, so nothing is cached between runs.
+             Compares extracting the product cards with a Selector for
+             every card and field against the precompiled extraction the
+             spiders use, and times the spider's whole parse callback.
+             Reports the time per page and the items parsed per second.
+
+Usage: python -m benchmarks.spider_parse [-r <runs>]
+"""
+import argparse
+import statistics
+import time
+
+from equipment_scraper.extraction import extractor
+from equipment_scraper.items import EquipmentItem
+from equipment_scraper.sites import SITES
+from equipment_scraper.spiders.store_spider import SPIDERS
+from tests.fixtures import MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL, TT11_RUBBERS, TT11_RUBBERS_URL, fixture_response
+
+DEFAULT_RUNS = 2000
+
+# The spider and fixture page to benchmark, by store
+BENCHMARKS = {
+    'megaspin': ('rubber_megaspin', MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL),
+    'tt11': ('rubber_tt11', TT11_RUBBERS, TT11_RUBBERS_URL),
+}
+
+
+def selector_extract(site_name: str, response) -> int:
+    """
+    Extract the product cards with a Selector for every card and field.
+    Returns the number of items.
+    """
+    site = SITES[site_name]
+    items = 0
+    for card in response.css(site.card):
+        card.get()
+        card.css(site.product_url).get()
+        card.css(site.product_name).get().strip()
+        ''.join(card.css(css).get().strip() for css in site.product_price)
+        items += 1
+    return items
+
+
+def compiled_extract(site_name: str, response) -> int:
+    """
+    Extract the product cards with the site's precompiled XPaths.
+    Returns the number of items.
+    """
+    site_extractor = extractor(site_name)
+    items = 0
+    for card in site_extractor.cards(response.selector.root):
+        site_extractor.card_html(card)
+        if site_extractor.extract(card, response.url) is not None:
+            items += 1
+    return items
+
+
+def main():
+    """
+    Parse arguments, run the benchmarks and print a summary.
+    """
+    parser = argparse.ArgumentParser(description='Measure listing page parse throughput on fixture pages.')
+    parser.add_argument('-r', '--runs',
+                        type=int,
+                        default=DEFAULT_RUNS,
+                        help='Number of times each page is parsed')
+    args = parser.parse_args()
+
+    print(f'{"Store":<10} {"Method":<10} {"Pages":>6} {"Items":>7} {"p50 ms":>8} {"p99 ms":>8} {"Items/s":>10}')
+    for name, (spider_name, fixture, url) in BENCHMARKS.items():
+        spider = SPIDERS[spider_name](max_pages=1)
+        methods = {
+            'selector': lambda response: selector_extract(name, response),
+            'compiled': lambda response: compiled_extract(name, response),
+            'spider': lambda response: sum(isinstance(result, EquipmentItem) for result in spider.parse(response)),
+        }
+        for method, parse in methods.items():
+            result = run(parse, fixture, url, args.runs)
+            print(f'{name:<10} {method:<10} {args.runs:>6} {result["items"]:>7} {result["p50"] * 1000:>8.3f} '
+                  f'{result["p99"] * 1000:>8.3f} {result["items_per_second"]:>10.0f}')
+
+
+def run(parse, fixture: str, url: str, runs: int) -> dict:
+    """
+    Parse the fixture page runs times and return the timings.
+    """
+    # Build the responses first, so only parsing is timed. The lxml tree
+    # is built lazily, so it is built in the timed part for every method
+    responses = [fixture_response(fixture, url) for _ in range(runs)]
+
+    timings = []
+    items = 0
+    for response in responses:
+        start = time.perf_counter()
+        items += parse(response)
+        timings.append(time.perf_counter() - start)
+
+    quantiles = statistics.quantiles(timings, n=100)
+    return {
+        'items': items,
+        'p50': statistics.median(timings),
+        'p99': quantiles[98],
+        'items_per_second': items / sum(timings),
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+In-process LRU cache for API responses.
+
+Cached responses expire after a TTL, and are dropped as soon as the crawler
+bumps the generation of their collection. Generations and collection names
+are only re-read from MongoDB every few seconds, so a cache hit does not
+query the database at all. A cache created without a database is refreshed
+by calling update() instead, which lets the async app read the generations
+with its own driver.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+from equipment_scraper.generations import get_generations
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300
+DEFAULT_REFRESH_INTERVAL = 5
+
+
+class ResponseCache():
+    """
+    A thread safe LRU cache of response bodies, keyed by collection and request.
+    """
+    def __init__(self, db, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._collection_names = set()
+        self._refreshed_at = None
+
+    def get(self, collection_name: str, key: tuple):
+        """
+        Return the cached value for the key, or None if it is missing or stale.
+        """
+        generation = self.generation(collection_name)
+        with self._lock:
+            entry = self._entries.get((collection_name, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            entry_generation, expires_at, value = entry
+            if entry_generation != generation or expires_at < time.monotonic():
+                del self._entries[(collection_name, key)]
+                self.misses += 1
+                return None
+            self._entries.move_to_end((collection_name, key))
+            self.hits += 1
+            return value
+
+    def set(self, collection_name: str, key: tuple, value) -> None:
+        """
+        Cache a value, evicting the least recently used entries if the cache is full.
+        """
+        generation = self.generation(collection_name)
+        with self._lock:
+            self._entries[(collection_name, key)] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((collection_name, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove every cached value.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def generation(self, collection_name: str) -> int:
+        """
+        Return the collection's generation as of the last refresh.
+        """
+        self._refresh()
+        return self._generations.get(collection_name, 0)
+
+    def collection_exists(self, collection_name: str) -> bool:
+        """
+        Check if the collection exists, as of the last refresh.
+        """
+        self._refresh()
+        return collection_name in self._collection_names
+
+    def needs_refresh(self) -> bool:
+        """
+        Check if the generations and collection names are out of date.
+        """
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_interval
+
+    def update(self, generations: dict[str, int], collection_names: list[str]) -> None:
+        """
+        Set the generations and collection names, for a cache without a
+        database that is refreshed by its owner, as in the async app.
+        """
+        with self._lock:
+            self._generations = generations
+            self._collection_names = set(collection_names)
+            self._refreshed_at = time.monotonic()
+
+    def _refresh(self) -> None:
+        """
+        Re-read the generations and collection names if they are out of date.
+        """
+        if self.db is None or not self.needs_refresh():
+            return
+        with self._lock:
+            if not self.needs_refresh():
+                return
+            self._generations = get_generations(self.db)
+            self._collection_names = set(self.db.list_collection_names())
+            self._refreshed_at = time.monotonic()
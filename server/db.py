@@ -0,0 +1,8 @@
+"""
+Shared MongoDB connection used by the API routes and the crawl worker.
+"""
+from pymongo import MongoClient
+import os
+
+client = MongoClient(os.getenv('MONGODB_URI'))
+db = client[os.getenv('MONGODB_DB_NAME')]
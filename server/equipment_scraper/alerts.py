@@ -0,0 +1,314 @@
+"""
+Watchlist and price drop alerts.
+
+A watch is kept for an equipment item, with a target USD price, a percentage
+drop from the price when the watch was added, or both. After a crawl, the
+MongoPipeline evaluates the watches of the items whose price changed in that
+crawl, and of the items it saw whose watches have not seen a price yet,
+found through the index on item_id. A watch remembers the last price it saw,
+so it is skipped when that price has not changed, and it alerts once when
+the price falls to its threshold, and again only if the price falls further
+or rises above the threshold and drops back. Alerts are sent to the sinks
+named in the ALERT_SINKS setting.
+"""
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
+import json
+import logging
+import urllib.request
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+import pymongo
+
+WATCHLIST_COLLECTION_NAME = 'watchlist'
+EVALUATE_BATCH_SIZE = 1000
+DEFAULT_ALERT_FILE = 'alerts.ndjson'
+DEFAULT_WEBHOOK_TIMEOUT = 5
+
+
+def lowest_entry(item: dict) -> dict | None:
+    """
+    Return the site entry with the lowest USD price, or None if no price could be parsed.
+    """
+    priced = [entry for entry in item.get('entries', []) if entry.get('price_usd') is not None]
+    return min(priced, key=lambda entry: entry['price_usd']) if priced else None
+
+
+def threshold(watch: dict) -> float | None:
+    """
+    Return the USD price at or below which the watch alerts. When a watch has
+    both a target price and a percentage drop, whichever is reached first counts.
+    """
+    thresholds = []
+    if watch.get('target_price_usd') is not None:
+        thresholds.append(watch['target_price_usd'])
+    if watch.get('percent_drop') is not None and watch.get('baseline_price_usd') is not None:
+        thresholds.append(watch['baseline_price_usd'] * (1 - watch['percent_drop'] / 100))
+    return max(thresholds) if thresholds else None
+
+
+def add_watch(db, equipment_type: str, item_id: str, target_price_usd: float | None = None,
+              percent_drop: float | None = None) -> dict | None:
+    """
+    Add a watch for the item and return it. Returns None if there is no such item.
+    A percentage drop is from the item's current lowest price, or from the
+    first price a crawl sees if it has none yet. The watch has not seen a
+    price until a crawl evaluates it, so a target that is already met
+    alerts after the next crawl of the item.
+    """
+    item = db[equipment_type].find_one({'_id': item_id}, {'entries': 1})
+    if not item:
+        return None
+    entry = lowest_entry(item)
+    price_usd = entry['price_usd'] if entry else None
+
+    watch = {
+        'equipment_type': equipment_type,
+        'item_id': item_id,
+        'target_price_usd': target_price_usd,
+        'percent_drop': percent_drop,
+        'baseline_price_usd': price_usd,
+        'last_price_usd': None,
+        'last_alert_price_usd': None,
+        'last_alerted_at': None,
+        'created_at': datetime.now(),
+    }
+    watch['_id'] = db[WATCHLIST_COLLECTION_NAME].insert_one(watch).inserted_id
+    return watch
+
+
+def unseen_watch_items(db, equipment_type: str, item_ids) -> set:
+    """
+    Return the IDs of the given items that have a watch which has not seen a
+    price yet, so they are evaluated even if their price did not change.
+    """
+    watches = db[WATCHLIST_COLLECTION_NAME].find(
+        {'item_id': {'$in': list(item_ids)}, 'equipment_type': equipment_type, 'last_price_usd': None},
+        {'item_id': 1}
+    )
+    return {watch['item_id'] for watch in watches}
+
+
+def get_watches(db, equipment_type: str | None = None) -> list[dict]:
+    """
+    Return every watch, optionally only those for one equipment type, oldest first.
+    """
+    query = {'equipment_type': equipment_type} if equipment_type else {}
+    return list(db[WATCHLIST_COLLECTION_NAME].find(query).sort('_id', 1))
+
+
+def delete_watch(db, watch_id: str) -> bool:
+    """
+    Remove a watch. Returns False if the ID is invalid or no watch has it.
+    """
+    try:
+        watch_id = ObjectId(watch_id)
+    except (InvalidId, TypeError):
+        return False
+    return db[WATCHLIST_COLLECTION_NAME].delete_one({'_id': watch_id}).deleted_count == 1
+
+
+def watch_status(watch: dict) -> dict:
+    """
+    Summarize a watch for the API.
+    """
+    return {
+        'id': str(watch['_id']),
+        'equipment_type': watch['equipment_type'],
+        'item_id': watch['item_id'],
+        'target_price_usd': watch.get('target_price_usd'),
+        'percent_drop': watch.get('percent_drop'),
+        'baseline_price_usd': watch.get('baseline_price_usd'),
+        'last_price_usd': watch.get('last_price_usd'),
+        'last_alerted_at': watch.get('last_alerted_at'),
+    }
+
+
+class AlertEvaluator():
+    """
+    Evaluates the watches of changed items and sends any alerts to the sinks.
+    """
+    def __init__(self, db, sinks: list, batch_size: int = EVALUATE_BATCH_SIZE):
+        self.db = db
+        self.sinks = sinks
+        self.batch_size = batch_size
+
+    def evaluate(self, collection_name: str, item_ids) -> list[dict]:
+        """
+        Evaluate the watches on the given items of a collection, a batch of
+        items at a time, and return the alerts that were sent.
+        """
+        item_ids = list(item_ids)
+        alerts = []
+        for start in range(0, len(item_ids), self.batch_size):
+            alerts.extend(self._evaluate_batch(collection_name, item_ids[start:start + self.batch_size]))
+
+        if alerts:
+            for sink in self.sinks:
+                sink.send(alerts)
+        logging.info('Evaluated watches for %d changed items in %s: %d alerts',
+                     len(item_ids), collection_name, len(alerts))
+        return alerts
+
+    def _evaluate_batch(self, collection_name: str, item_ids: list) -> list[dict]:
+        """
+        Evaluate the watches on one batch of items.
+        """
+        watchlist = self.db[WATCHLIST_COLLECTION_NAME]
+        watches = defaultdict(list)
+        for watch in watchlist.find({'item_id': {'$in': item_ids}, 'equipment_type': collection_name}):
+            watches[watch['item_id']].append(watch)
+        if not watches:
+            return []
+
+        projection = {'name': 1, 'entries': 1, 'all_time_low_price_usd': 1}
+        items = self.db[collection_name].find({'_id': {'$in': list(watches)}}, projection)
+
+        alerts = []
+        operations = []
+        now = datetime.now()
+        for item in items:
+            entry = lowest_entry(item)
+            if entry is None:
+                continue
+            price_usd = entry['price_usd']
+            for watch in watches[item['_id']]:
+                if price_usd == watch.get('last_price_usd'):
+                    continue
+
+                # Only update the watch if no other crawl has since, so an alert is never sent twice
+                watch_filter = {'_id': watch['_id'], 'last_price_usd': watch.get('last_price_usd')}
+                update = {'last_price_usd': price_usd}
+                if watch.get('percent_drop') is not None and watch.get('baseline_price_usd') is None:
+                    # The item had no price when the watch was added, so the drop is from this one
+                    update['baseline_price_usd'] = price_usd
+                    watch = {**watch, 'baseline_price_usd': price_usd}
+                limit = threshold(watch)
+                last_alert_price_usd = watch.get('last_alert_price_usd')
+                if limit is None or price_usd > limit:
+                    # Re-arm the watch for the next drop
+                    update['last_alert_price_usd'] = None
+                elif last_alert_price_usd is None or price_usd < last_alert_price_usd:
+                    update.update({'last_alert_price_usd': price_usd, 'last_alerted_at': now})
+                    if watchlist.update_one(watch_filter, {'$set': update}).modified_count:
+                        alerts.append(self._alert(collection_name, item, entry, watch, now))
+                    continue
+                operations.append(pymongo.UpdateOne(watch_filter, {'$set': update}))
+
+        if operations:
+            watchlist.bulk_write(operations, ordered=False)
+        return alerts
+
+    @staticmethod
+    def _alert(collection_name: str, item: dict, entry: dict, watch: dict, now: datetime) -> dict:
+        """
+        Describe an alert for the sinks.
+        """
+        all_time_low_price_usd = item.get('all_time_low_price_usd')
+        return {
+            'watch_id': str(watch['_id']),
+            'equipment_type': collection_name,
+            'item_id': item['_id'],
+            'name': item['name'],
+            'price': entry['price'],
+            'price_usd': entry['price_usd'],
+            'previous_price_usd': watch.get('last_price_usd'),
+            'url': entry['url'],
+            'target_price_usd': watch.get('target_price_usd'),
+            'percent_drop': watch.get('percent_drop'),
+            'all_time_low': all_time_low_price_usd is None or entry['price_usd'] <= all_time_low_price_usd,
+            'triggered_at': now,
+        }
+
+
+class AlertSink(ABC):
+    """
+    Receives the alerts raised after a crawl. Subclass this and add the
+    class's import path to ALERT_SINKS to send alerts somewhere new.
+    """
+    @classmethod
+    def from_settings(cls, settings):
+        return cls()
+
+    @abstractmethod
+    def send(self, alerts: list[dict]) -> None:
+        """
+        Send the alerts raised by one crawl.
+        """
+
+
+class LogSink(AlertSink):
+    """
+    Writes each alert to the crawl log.
+    """
+    def send(self, alerts: list[dict]) -> None:
+        for alert in alerts:
+            logging.warning('Price alert: %s is %s at %s', alert['name'], alert['price'], alert['url'])
+
+
+class FileSink(AlertSink):
+    """
+    Appends each alert to a file as a line of JSON.
+    """
+    def __init__(self, path: str = DEFAULT_ALERT_FILE):
+        self.path = path
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('ALERT_FILE', DEFAULT_ALERT_FILE))
+
+    def send(self, alerts: list[dict]) -> None:
+        with open(self.path, 'a', encoding='utf-8') as file:
+            for alert in alerts:
+                file.write(json.dumps(alert, default=str) + '\n')
+
+
+class WebhookSink(AlertSink):
+    """
+    POSTs the alerts from a crawl to a URL as one JSON array. Failures are
+    logged rather than raised, so a webhook being down does not fail the crawl.
+    """
+    def __init__(self, url: str, timeout: float = DEFAULT_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('ALERT_WEBHOOK_URL'),
+                   settings.getfloat('ALERT_WEBHOOK_TIMEOUT', DEFAULT_WEBHOOK_TIMEOUT))
+
+    def send(self, alerts: list[dict]) -> None:
+        if not self.url:
+            logging.warning('Not sending %d alerts, ALERT_WEBHOOK_URL is not set', len(alerts))
+            return
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(alerts, default=str).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except OSError as err:
+            logging.error('Sending %d alerts to %s failed: %s', len(alerts), self.url, err)
+
+
+SINKS = {
+    'log': LogSink,
+    'file': FileSink,
+    'webhook': WebhookSink,
+}
+
+
+def load_sinks(settings) -> list[AlertSink]:
+    """
+    Create the sinks named in ALERT_SINKS, either built in names or import paths.
+    """
+    # Imported here, since the API uses this module without loading Scrapy
+    from scrapy.utils.misc import load_object
+
+    return [(SINKS.get(name) or load_object(name)).from_settings(settings)
+            for name in settings.getlist('ALERT_SINKS')]
@@ -0,0 +1,89 @@
+# Define here the extensions for your project
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+from datetime import datetime
+import os
+from urllib.parse import urlparse
+
+import pymongo
+from bson.objectid import ObjectId
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+
+class JobStatsExtension:
+    """
+    Periodically writes the crawl progress of each spider to its crawl job
+    document, so the API can report the status of a running job and export
+    crawl metrics. HTTP error responses are counted per domain.
+    Only enabled when the CRAWL_JOB_ID setting is set by the worker.
+    """
+
+    def __init__(self, crawler, job_id, collection_name, interval):
+        self.crawler = crawler
+        self.job_id = ObjectId(job_id)
+        self.collection_name = collection_name
+        self.interval = interval
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        job_id = crawler.settings.get('CRAWL_JOB_ID')
+        if not job_id:
+            raise NotConfigured
+        ext = cls(
+            crawler,
+            job_id=job_id,
+            collection_name=crawler.settings.get('CRAWL_JOB_COLLECTION', 'jobs'),
+            interval=crawler.settings.getfloat('CRAWL_JOB_STATS_INTERVAL', 5.0),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def spider_opened(self, spider):
+        self.client = pymongo.MongoClient(os.getenv('MONGODB_URI'))
+        self.collection = self.client[os.getenv('MONGODB_DB_NAME')][self.collection_name]
+        self.task = task.LoopingCall(self.report, spider)
+        self.task.start(self.interval)
+
+    def spider_closed(self, spider, reason):
+        if self.task.running:
+            self.task.stop()
+        self.report(spider, reason)
+        self.client.close()
+
+    def response_received(self, response, request, spider):
+        if response.status >= 400:
+            self.crawler.stats.inc_value(f'http_errors/{urlparse(response.url).netloc}/{response.status}')
+
+    def report(self, spider, reason=None):
+        """
+        Write this spider's current stats to the job document.
+        """
+        stats = self.crawler.stats.get_stats()
+        start_time = stats.get('start_time')
+        elapsed = (datetime.now(start_time.tzinfo) - start_time).total_seconds() if start_time else 0.0
+        # Domains contain dots, so errors are kept in a list rather than keyed by domain
+        http_errors = [
+            {'domain': key.split('/')[1], 'status': int(key.split('/')[2]), 'count': count}
+            for key, count in stats.items() if key.startswith('http_errors/')
+        ]
+        self.collection.update_one(
+            filter={'_id': self.job_id},
+            update={'$set': {
+                f'stats.{spider.name}': {
+                    'items_scraped': stats.get('item_scraped_count', 0),
+                    'pages_fetched': stats.get('response_received_count', 0),
+                    'elapsed_seconds': round(elapsed, 1),
+                    'pipeline_seconds': stats.get('mongo_pipeline/process_item_seconds', 0.0),
+                    'flush_seconds': stats.get('mongo_pipeline/flush_seconds', 0.0),
+                    'http_errors': http_errors,
+                    'finish_reason': reason,
+                },
+                'heartbeat': datetime.now(),
+            }}
+        )
@@ -0,0 +1,134 @@
+"""
+Extraction of product cards from listing pages, and of specifications from
+product pages, using site definitions.
+
+The CSS selectors of a site are translated to XPath and compiled by lxml once,
+when its extractor is first used. Pages are then read straight from the lxml
+tree the response has already parsed, without creating a Selector for every
+card and every field.
+"""
+import functools
+import re
+from urllib.parse import urljoin
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+from equipment_scraper.prices import CURRENCY_PATTERNS
+from equipment_scraper.sites import SITES, SiteDefinition
+from equipment_scraper.specs import parse_specs
+
+# The same translation Scrapy uses for response.css(), including ::text and ::attr()
+TRANSLATOR = HTMLTranslator()
+
+
+def compile_css(css: str) -> etree.XPath:
+    """
+    Compile a CSS selector to an XPath that can be evaluated on any element.
+    """
+    return etree.XPath(TRANSLATOR.css_to_xpath(css, prefix='descendant-or-self::'))
+
+
+def first(xpath: etree.XPath, node) -> str | None:
+    """
+    Return the first string the XPath selects from the node, or None if it selects nothing.
+    """
+    for result in xpath(node):
+        return str(result)
+    return None
+
+
+class SiteExtractor():
+    """
+    Extracts the product cards of a site's listing pages with precompiled XPaths.
+    """
+    def __init__(self, site: SiteDefinition):
+        self.site = site
+        self.card = compile_css(site.card)
+        self.product_name = compile_css(site.product_name)
+        self.product_url = compile_css(site.product_url)
+        self.product_price = [compile_css(css) for css in site.product_price]
+        self.page_links = compile_css(site.page_links) if site.page_links else None
+        self.item_total = compile_css(site.item_total) if site.item_total else None
+        self.next_page = compile_css(site.next_page) if site.next_page else None
+        self.spec_rows = compile_css(site.spec_rows) if site.spec_rows else None
+        self.spec_label = compile_css(site.spec_label) if site.spec_label else None
+        self.spec_value = compile_css(site.spec_value) if site.spec_value else None
+        self.page_pattern = re.compile(rf'[?&]{re.escape(site.page_param)}=(\d+)') if site.page_param else None
+        self.item_total_pattern = re.compile(site.item_total_pattern, re.IGNORECASE) if site.item_total_pattern else None
+
+    def cards(self, root) -> list:
+        """
+        Return the product card elements of a page.
+        """
+        return self.card(root)
+
+    def extract(self, card, base_url: str) -> dict | None:
+        """
+        Return the url, name and price of a product card, or None if any of them is missing.
+        """
+        name = first(self.product_name, card)
+        url = first(self.product_url, card)
+        parts = [first(xpath, card) for xpath in self.product_price]
+        if not name or not url or None in parts:
+            return None
+
+        price = ''.join(part.strip() for part in parts)
+        if not any(pattern.search(price) for _, pattern in CURRENCY_PATTERNS):
+            price = f'{price} {self.site.currency}'
+        return {
+            'url': urljoin(base_url, url.strip()),
+            'name': name.strip(),
+            'price': price,
+        }
+
+    def page_numbers(self, root) -> list[int]:
+        """
+        Return the page numbers the pager links to.
+        """
+        if self.page_links is None:
+            return []
+        links = ' '.join(str(link) for link in self.page_links(root))
+        return [int(page) for page in self.page_pattern.findall(links)]
+
+    def total_items(self, root) -> int | None:
+        """
+        Return the number of items the page says the listing has, if it says.
+        """
+        if self.item_total is None:
+            return None
+        total = self.item_total_pattern.search(' '.join(str(text) for text in self.item_total(root)))
+        return int(total.group(1)) if total else None
+
+    def next_page_url(self, root, base_url: str) -> str | None:
+        """
+        Return the URL of the following listing page, if the page links to one.
+        """
+        if self.next_page is None:
+            return None
+        href = first(self.next_page, root)
+        return urljoin(base_url, href.strip()) if href else None
+
+    def specs(self, root) -> dict:
+        """
+        Return the specifications listed on a product page.
+        """
+        if self.spec_rows is None:
+            return {}
+        rows = [(''.join(self.spec_label(row)), ''.join(self.spec_value(row))) for row in self.spec_rows(root)]
+        return parse_specs(rows)
+
+    @staticmethod
+    def card_html(card) -> str:
+        """
+        Return the HTML of a card, the same as Selector.get() would.
+        """
+        return etree.tostring(card, method='html', encoding='unicode', with_tail=False)
+
+
+@functools.cache
+def extractor(site_name: str) -> SiteExtractor:
+    """
+    Return the extractor for a site, compiling it the first time.
+    """
+    return SiteExtractor(SITES[site_name])
@@ -0,0 +1,254 @@
+"""
+A request frontier shared by crawler processes through MongoDB.
+
+With FRONTIER_ENABLED set, the FrontierAddon replaces Scrapy's scheduler with
+the MongoFrontierScheduler. Every request a spider schedules is stored in the
+frontier collection under the ID of its crawl and its fingerprint, so a
+request is only ever stored once per crawl, whichever process scheduled it.
+Processes crawling with the same FRONTIER_CRAWL_ID take requests from the
+frontier by leasing them. The FrontierMiddleware marks a request done once
+the spider callback has run and its output was scheduled or passed to the
+item pipelines, or once its download has failed for good. If a process dies,
+its leases expire and the requests are handed to another process, up to
+FRONTIER_MAX_ATTEMPTS times.
+
+Start requests and retries do not go through the duplicate filter in Scrapy.
+Here, a retry is accepted by resetting the process's own request to pending,
+while start requests already scheduled by another process are dropped. A
+redirect is stored as a new request, and the request it replaces is done.
+
+MongoDB is queried on the reactor thread, but at most once per
+FRONTIER_POLL_INTERVAL while the frontier is empty or has requests pending,
+which is why the frontier is only used when requests must be shared.
+"""
+from datetime import datetime, timedelta
+import os
+import pickle
+import socket
+import time
+import uuid
+
+import pymongo
+from scrapy.utils.request import request_from_dict
+
+FRONTIER_COLLECTION_NAME = 'frontier'
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 1.0
+SCHEDULER_PATH = 'equipment_scraper.frontier.MongoFrontierScheduler'
+# Outermost, so the middleware sees the final output of the callback and the
+# download errors no other middleware retried
+MIDDLEWARE_ORDER = 10
+
+# Sent by the FrontierMiddleware when a leased request has been processed
+request_finished = object()
+
+
+class FrontierAddon():
+    """
+    Crawls with the MongoFrontierScheduler and FrontierMiddleware if
+    FRONTIER_ENABLED is set, so it can be turned on with -s FRONTIER_ENABLED=1.
+    """
+    def update_settings(self, settings):
+        if not settings.getbool('FRONTIER_ENABLED'):
+            return
+        settings.set('SCHEDULER', SCHEDULER_PATH, priority='addon')
+        for setting in ['SPIDER_MIDDLEWARES', 'DOWNLOADER_MIDDLEWARES']:
+            settings.set_in_component_priority_dict(setting, FrontierMiddleware, MIDDLEWARE_ORDER)
+
+
+class FrontierMiddleware():
+    """
+    A spider and downloader middleware that tells the scheduler when a leased
+    request is finished: after its callback's output, when its callback
+    fails, or when its download fails without being retried.
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_spider_output(self, response, result, spider=None):
+        yield from result
+        self.finish(response.request)
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        async for output in result:
+            yield output
+        self.finish(response.request)
+
+    def process_spider_exception(self, response, exception, spider=None):
+        self.finish(response.request)
+
+    def process_exception(self, request, exception, spider=None):
+        self.finish(request)
+
+    def finish(self, request) -> None:
+        """
+        Send request_finished for a request leased from the frontier.
+        """
+        if request is not None and request.meta.get('frontier_id'):
+            self.crawler.signals.send_catch_log(signal=request_finished, request=request)
+
+
+class MongoFrontierScheduler():
+    """
+    A Scrapy scheduler that stores, deduplicates and leases requests in MongoDB.
+    """
+    def __init__(self, crawler, crawl_id=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.crawler = crawler
+        self.crawl_id = crawl_id
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        # When the frontier was last found empty, so it is not polled on every engine tick
+        self.empty_at = None
+        self.has_pending_at = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        scheduler = cls(
+            crawler,
+            crawl_id=settings.get('FRONTIER_CRAWL_ID') or settings.get('CRAWL_JOB_ID'),
+            lease_seconds=settings.getint('FRONTIER_LEASE_SECONDS', DEFAULT_LEASE_SECONDS),
+            max_attempts=settings.getint('FRONTIER_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+            poll_interval=settings.getfloat('FRONTIER_POLL_INTERVAL', DEFAULT_POLL_INTERVAL),
+        )
+        crawler.signals.connect(scheduler.request_finished, signal=request_finished)
+        return scheduler
+
+    def open(self, spider):
+        self.spider = spider
+        if not self.crawl_id:
+            # Not shared with any other process
+            self.crawl_id = f'{spider.name}:{uuid.uuid4().hex}'
+        self.client = pymongo.MongoClient(os.getenv('MONGODB_URI'))
+        self.collection = self.client[os.getenv('MONGODB_DB_NAME')][FRONTIER_COLLECTION_NAME]
+
+    def close(self, reason):
+        self.client.close()
+
+    def has_pending_requests(self) -> bool:
+        """
+        Check if any request of the crawl is waiting, or leased by a process
+        that may still fetch it or whose lease will expire and be retried.
+        """
+        if self.has_pending_at and time.monotonic() - self.has_pending_at < self.poll_interval:
+            return True
+        now = datetime.now()
+        pending = self.collection.find_one(self._query({'$or': [
+            {'state': PENDING},
+            {'state': LEASED, 'lease_expires': {'$gte': now}},
+            {'state': LEASED, 'attempts': {'$lt': self.max_attempts}},
+        ]}), {'_id': 1}) is not None
+        self.has_pending_at = time.monotonic() if pending else None
+        return pending
+
+    def enqueue_request(self, request) -> bool:
+        """
+        Add the request to the frontier. Returns False if the crawl already has it.
+        """
+        fingerprint = self.crawler.request_fingerprinter.fingerprint(request).hex()
+        document = {
+            '_id': f'{self.crawl_id}:{fingerprint}',
+            'crawl': self.crawl_id,
+            'spider': self.spider.name,
+            'url': request.url,
+            # Pickled like Scrapy's disk queues do, since headers have bytes keys
+            'request': pickle.dumps(request.to_dict(spider=self.spider), protocol=4),
+            'priority': request.priority,
+            'state': PENDING,
+            'attempts': 0,
+            'lease_owner': None,
+            'lease_expires': None,
+            'created_at': datetime.now(),
+        }
+        try:
+            self.collection.insert_one(document)
+        except pymongo.errors.DuplicateKeyError:
+            if not request.dont_filter:
+                self._finish_replaced(request, document['_id'])
+                return False
+            # A retry of a request this process fetched
+            result = self.collection.update_one(
+                filter={'_id': document['_id'], 'lease_owner': self.owner},
+                update={'$set': {'request': document['request'], 'priority': request.priority,
+                                 'state': PENDING, 'lease_owner': None, 'lease_expires': None}}
+            )
+            if not result.modified_count:
+                return False
+        else:
+            self._finish_replaced(request, document['_id'])
+        self.empty_at = None
+        self.has_pending_at = time.monotonic()
+        return True
+
+    def next_request(self):
+        """
+        Lease the highest priority waiting request, or an expired lease of a
+        process that died. Returns None if there is none.
+        """
+        if self.empty_at and time.monotonic() - self.empty_at < self.poll_interval:
+            return None
+        now = datetime.now()
+        document = self.collection.find_one_and_update(
+            filter=self._query({'$or': [
+                {'state': PENDING},
+                {'state': LEASED, 'lease_expires': {'$lt': now}, 'attempts': {'$lt': self.max_attempts}},
+            ]}),
+            update={
+                '$set': {'state': LEASED, 'lease_owner': self.owner, 'lease_expires': now + self.lease},
+                '$inc': {'attempts': 1},
+            },
+            sort=[('priority', -1), ('created_at', 1)],
+        )
+        if document is None:
+            self.empty_at = time.monotonic()
+            return None
+
+        request = request_from_dict(pickle.loads(document['request']), spider=self.spider)
+        request.meta['frontier_id'] = document['_id']
+        return request
+
+    def request_finished(self, request):
+        """
+        Mark a request done once the FrontierMiddleware has seen it processed.
+        """
+        self.mark_done(request.meta['frontier_id'])
+
+    def mark_done(self, frontier_id: str) -> None:
+        """
+        Mark a request done, if this process still holds its lease.
+        """
+        self.collection.update_one(
+            filter={'_id': frontier_id, 'lease_owner': self.owner},
+            update={'$set': {'state': DONE}}
+        )
+
+    def _finish_replaced(self, request, frontier_id: str) -> None:
+        """
+        Mark the leased request a redirect replaces done. The redirect keeps
+        the meta, and so the frontier ID, of the request it replaces.
+        """
+        replaced = request.meta.get('frontier_id')
+        if replaced and replaced != frontier_id:
+            self.mark_done(replaced)
+
+    def __len__(self) -> int:
+        return self.collection.count_documents(self._query({'state': PENDING}))
+
+    def _query(self, query: dict) -> dict:
+        """
+        Limit a query to this spider's requests in the crawl.
+        """
+        return {'crawl': self.crawl_id, 'spider': self.spider.name, **query}
@@ -0,0 +1,26 @@
+"""
+Generation counters for the equipment collections.
+
+The crawler increments a collection's generation whenever it writes to it,
+and the API uses the generations to tell when its cached responses are stale.
+"""
+GENERATION_COLLECTION_NAME = 'collection_generations'
+
+
+def bump_generations(db, collection_names) -> None:
+    """
+    Increment the generation of each of the given collections.
+    """
+    for collection_name in collection_names:
+        db[GENERATION_COLLECTION_NAME].update_one(
+            filter={'_id': collection_name},
+            update={'$inc': {'generation': 1}},
+            upsert=True
+        )
+
+
+def get_generations(db) -> dict[str, int]:
+    """
+    Return the current generation of every collection that has one.
+    """
+    return {doc['_id']: doc['generation'] for doc in db[GENERATION_COLLECTION_NAME].find()}
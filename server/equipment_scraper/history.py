@@ -0,0 +1,108 @@
+"""
+Price history of site entries.
+
+Every observed price is kept in the price_history collection, bucketed into
+one document per site entry per month. A price is only appended to a bucket
+when it differs from the last price in that bucket, so unchanged prices cost
+no storage, and each bucket still starts with the price at the beginning of
+the month. Buckets also keep the lowest and highest USD price seen.
+"""
+from datetime import datetime, timedelta
+
+import pymongo
+
+HISTORY_COLLECTION_NAME = 'price_history'
+DEFAULT_HISTORY_DAYS = 365
+
+
+def month_start(timestamp: datetime) -> datetime:
+    """
+    Return the start of the month containing the timestamp.
+    """
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_id(entry_id: str, timestamp: datetime) -> str:
+    """
+    Return the ID of the bucket holding the entry's prices for the timestamp's month.
+    """
+    return f'{entry_id}:{timestamp:%Y-%m}'
+
+
+def history_update(collection_name: str, item_id: str, entry: dict) -> pymongo.UpdateOne:
+    """
+    Build an upsert that appends the site entry's price to its current bucket,
+    unless it is the same as the last price recorded there.
+    """
+    timestamp = entry['last_updated']
+    point = {'t': timestamp, 'price': entry['price'], 'price_usd': entry['price_usd']}
+    last_price = {'$arrayElemAt': [{'$ifNull': ['$points.price', []]}, -1]}
+
+    # Literals are wrapped with $literal so prices such as "$45.99" are not read as field paths
+    return pymongo.UpdateOne(
+        filter={'_id': bucket_id(entry['_id'], timestamp)},
+        update=[{'$set': {
+            'collection': collection_name,
+            'item_id': item_id,
+            'entry_id': entry['_id'],
+            'url': {'$literal': entry['url']},
+            'month': month_start(timestamp),
+            'points': {'$cond': [
+                {'$eq': [last_price, {'$literal': entry['price']}]},
+                '$points',
+                {'$concatArrays': [{'$ifNull': ['$points', []]}, [{'$literal': point}]]}
+            ]},
+            'min_usd': {'$min': ['$min_usd', entry['price_usd']]},
+            'max_usd': {'$max': ['$max_usd', entry['price_usd']]},
+        }}],
+        upsert=True
+    )
+
+
+def daily_history(db, collection_name: str, item_id: str, days: int = DEFAULT_HISTORY_DAYS) -> list[dict]:
+    """
+    Return the price history of each site entry of an item over the last
+    number of days, downsampled to the lowest and highest price of each day.
+    Days with no recorded price change are omitted.
+    """
+    pipeline = daily_history_pipeline(collection_name, item_id, days)
+    return group_daily_history(db[HISTORY_COLLECTION_NAME].aggregate(pipeline))
+
+
+def daily_history_pipeline(collection_name: str, item_id: str, days: int = DEFAULT_HISTORY_DAYS) -> list[dict]:
+    """
+    Build the aggregation pipeline for the lowest and highest price of each
+    site entry of an item on each of the last number of days.
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    return [
+        {'$match': {'item_id': item_id, 'collection': collection_name, 'month': {'$gte': month_start(cutoff)}}},
+        {'$unwind': '$points'},
+        {'$match': {'points.t': {'$gte': cutoff}}},
+        {'$sort': {'points.t': 1}},
+        {'$group': {
+            '_id': {'entry_id': '$entry_id', 'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$points.t'}}},
+            'url': {'$first': '$url'},
+            'min_usd': {'$min': '$points.price_usd'},
+            'max_usd': {'$max': '$points.price_usd'},
+            'last_price': {'$last': '$points.price'},
+        }},
+        {'$sort': {'_id.entry_id': 1, '_id.date': 1}},
+    ]
+
+
+def group_daily_history(days) -> list[dict]:
+    """
+    Group the days returned by the daily history pipeline by site entry.
+    """
+    entries = {}
+    for day in days:
+        entry_id = day['_id']['entry_id']
+        entry = entries.setdefault(entry_id, {'_id': entry_id, 'url': day['url'], 'points': []})
+        entry['points'].append({
+            'date': day['_id']['date'],
+            'min_usd': day['min_usd'],
+            'max_usd': day['max_usd'],
+            'price': day['last_price'],
+        })
+    return list(entries.values())
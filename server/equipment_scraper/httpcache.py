@@ -0,0 +1,174 @@
+"""
+A compressed, content-addressed storage for Scrapy's HTTP cache.
+
+Set HTTPCACHE_STORAGE to equipment_scraper.httpcache.ContentAddressedCacheStorage
+to use it. Each response body is gzip compressed and stored once, under the
+SHA-256 of the body, in HTTPCACHE_DIR/objects. A small JSON index entry per
+request, keyed by the request fingerprint, holds the status, headers and the
+address of the body. Identical pages, such as the same product under two
+URLs, share one object.
+
+Entries older than HTTPCACHE_EXPIRATION_SECS are treated as missing, and are
+deleted along with the objects no entry refers to when a spider closes.
+Files are written to a temporary name and renamed, so several crawler
+processes can share the cache directory.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+DEFAULT_COMPRESSION_LEVEL = 6
+
+logger = logging.getLogger(__name__)
+
+
+class ContentAddressedCacheStorage():
+    """
+    Stores responses as gzip compressed objects addressed by their content.
+    """
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'])
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.compression_level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', DEFAULT_COMPRESSION_LEVEL)
+        self.index_dir = os.path.join(self.cachedir, 'index')
+        self.object_dir = os.path.join(self.cachedir, 'objects')
+
+    def open_spider(self, spider):
+        self.fingerprinter = spider.crawler.request_fingerprinter
+        logger.debug('Using content addressed cache storage in %s', self.cachedir)
+
+    def close_spider(self, spider):
+        entries, objects = self.prune()
+        if entries or objects:
+            logger.info('Pruned %d expired cache entries and %d unused objects', entries, objects)
+
+    def retrieve_response(self, spider, request):
+        """
+        Return the cached response for the request, or None if it is not
+        cached or has expired.
+        """
+        entry = self._read_entry(self._entry_path(request))
+        if entry is None or self._is_expired(entry['stored_at']):
+            return None
+        try:
+            with open(self._object_path(entry['body']), 'rb') as file:
+                body = gzip.decompress(file.read())
+        except FileNotFoundError:
+            return None
+
+        headers = Headers(entry['headers'], encoding='latin-1')
+        response_class = responsetypes.from_args(headers=headers, url=entry['response_url'], body=body)
+        request.meta['cache_timestamp'] = entry['stored_at']
+        return response_class(url=entry['response_url'], status=entry['status'], headers=headers, body=body)
+
+    def store_response(self, spider, request, response):
+        """
+        Store the response body, unless an identical body is already stored,
+        and point the request's index entry at it.
+        """
+        address = hashlib.sha256(response.body).hexdigest()
+        object_path = self._object_path(address)
+        try:
+            # Keep shared objects from looking unused when they are pruned
+            os.utime(object_path)
+        except FileNotFoundError:
+            self._write(object_path, gzip.compress(response.body, compresslevel=self.compression_level, mtime=0))
+
+        entry = {
+            'url': request.url,
+            'response_url': response.url,
+            'status': response.status,
+            'headers': {name.decode('latin-1'): [value.decode('latin-1') for value in values]
+                        for name, values in response.headers.items()},
+            'body': address,
+            'stored_at': time.time(),
+        }
+        self._write(self._entry_path(request), json.dumps(entry).encode('utf-8'))
+
+    def prune(self) -> tuple[int, int]:
+        """
+        Delete expired index entries, then objects no entry refers to.
+        Objects written within the expiry time are kept, since another
+        process may be about to write the entry that refers to them.
+        Returns the number of entries and objects deleted.
+        """
+        if self.expiration_secs <= 0:
+            return 0, 0
+
+        deleted_entries = 0
+        referenced = set()
+        for path in self._files(self.index_dir):
+            entry = self._read_entry(path)
+            if entry is None or self._is_expired(entry['stored_at']):
+                self._remove(path)
+                deleted_entries += 1
+            else:
+                referenced.add(entry['body'])
+
+        deleted_objects = 0
+        for path in self._files(self.object_dir):
+            if os.path.basename(path) in referenced:
+                continue
+            try:
+                if self._is_expired(os.stat(path).st_mtime):
+                    self._remove(path)
+                    deleted_objects += 1
+            except FileNotFoundError:
+                pass
+        return deleted_entries, deleted_objects
+
+    def _is_expired(self, timestamp: float) -> bool:
+        return 0 < self.expiration_secs < time.time() - timestamp
+
+    def _entry_path(self, request) -> str:
+        key = self.fingerprinter.fingerprint(request).hex()
+        return os.path.join(self.index_dir, key[:2], key)
+
+    def _object_path(self, address: str) -> str:
+        return os.path.join(self.object_dir, address[:2], address)
+
+    @staticmethod
+    def _read_entry(path: str) -> dict | None:
+        try:
+            with open(path, 'rb') as file:
+                return json.loads(file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        """
+        Write a file atomically, so readers never see it half written.
+        """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            ContentAddressedCacheStorage._remove(temp_path)
+            raise
+
+    @staticmethod
+    def _files(directory: str):
+        for parent, _, names in os.walk(directory):
+            for name in names:
+                if not name.startswith('.tmp-'):
+                    yield os.path.join(parent, name)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
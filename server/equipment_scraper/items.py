@@ -11,3 +11,27 @@ class EquipmentItem(scrapy.Item):
     url = scrapy.Field()
     name = scrapy.Field()
     price = scrapy.Field()
+
+
+class ListingPageItem(scrapy.Item):
+    """
+    Describes a scraped listing page, so it can be requested conditionally
+    and skipped on the next crawl if it has not changed.
+    """
+    url = scrapy.Field()
+    etag = scrapy.Field()
+    last_modified = scrapy.Field()
+    fingerprint = scrapy.Field()
+    item_urls = scrapy.Field()
+    entry_ids = scrapy.Field()
+    page_total = scrapy.Field()
+    unchanged = scrapy.Field()
+
+
+class DetailItem(scrapy.Item):
+    """
+    Specifications scraped from the product page of an equipment item's site entry.
+    """
+    item_id = scrapy.Field()
+    url = scrapy.Field()
+    specs = scrapy.Field()
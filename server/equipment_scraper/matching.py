@@ -0,0 +1,172 @@
+"""
+Matching of equipment names across stores.
+
+Stores name the same product differently, for example "Butterfly Tenergy 05"
+and "Tenergy 05 (Butterfly)". Names are canonicalized into a brand and a set
+of tokens, and products are identified by their canonical key. Names whose
+key is not known yet are compared with the known products sharing a token
+with them (the blocking index), so matching never compares every pair.
+"""
+from collections import defaultdict
+import hashlib
+import re
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+# Words that say nothing about which product a name refers to
+FILLER_WORDS = {'rubber', 'blade', 'table', 'tennis', 'tt', 'the', 'by', 'new', 'and'}
+# Brand aliases, mapped to the canonical brand name.
+# Aliases with several words are matched before single words
+BRANDS = {
+    '729': '729',
+    'friendship': '729',
+    'andro': 'andro',
+    'avalox': 'avalox',
+    'butterfly': 'butterfly',
+    'cornilleau': 'cornilleau',
+    'dhs': 'dhs',
+    'donic': 'donic',
+    'double fish': 'double fish',
+    'dr neubauer': 'dr neubauer',
+    'gewo': 'gewo',
+    'galaxy': 'yinhe',
+    'hallmark': 'hallmark',
+    'joola': 'joola',
+    'killerspin': 'killerspin',
+    'milky way': 'yinhe',
+    'mizuno': 'mizuno',
+    'nexy': 'nexy',
+    'nittaku': 'nittaku',
+    'palio': 'palio',
+    'sanwei': 'sanwei',
+    'sauer troger': 'sauer troger',
+    'stiga': 'stiga',
+    'tibhar': 'tibhar',
+    'tsp': 'victas',
+    'victas': 'victas',
+    'xiom': 'xiom',
+    'yasaka': 'yasaka',
+    'yinhe': 'yinhe',
+}
+ROMAN_NUMERALS = {'ii': '2', 'iii': '3', 'iv': '4', 'v': '5'}
+BRAND_ALIASES = sorted(BRANDS, key=lambda alias: -len(alias.split()))
+# Minimum token similarity for a name to match a known product
+MATCH_THRESHOLD = 0.8
+# Tokens shorter than this are too common to be used for blocking
+MIN_BLOCKING_TOKEN_LENGTH = 3
+
+
+def canonicalize(name: str) -> tuple[str, frozenset[str]]:
+    """
+    Split a name into its canonical brand, or '' if it has no known brand,
+    and the set of remaining tokens. Numbers lose leading zeros, and roman
+    numerals become numbers.
+    """
+    tokens = [token.lstrip('0') or '0' if token.isdigit() else token
+              for token in TOKEN_PATTERN.findall(name.casefold().replace('&', ' '))]
+    text = f' {" ".join(tokens)} '
+
+    # The first brand found wins, and all of its aliases are removed
+    brand = ''
+    for alias in BRAND_ALIASES:
+        if f' {alias} ' in text and BRANDS[alias] == (brand or BRANDS[alias]):
+            brand = BRANDS[alias]
+            text = text.replace(f' {alias} ', ' ')
+
+    return brand, frozenset(ROMAN_NUMERALS.get(token, token) for token in text.split() if token not in FILLER_WORDS)
+
+
+def canonical_key(name: str) -> str:
+    """
+    Return the canonical key of a name. Names of the same product from
+    different stores usually have the same key.
+    """
+    brand, tokens = canonicalize(name)
+    return f'{brand}|{" ".join(sorted(tokens))}'
+
+
+def product_id(key: str) -> str:
+    """
+    Return the ID of a new product with the given canonical key.
+    """
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def similarity(tokens: frozenset[str], other_tokens: frozenset[str]) -> float:
+    """
+    Jaccard similarity of two token sets. Names whose numbers differ, such
+    as "Tenergy 05" and "Tenergy 64", never match.
+    """
+    if {token for token in tokens if token.isdigit()} != {token for token in other_tokens if token.isdigit()}:
+        return 0.0
+    union = tokens | other_tokens
+    return len(tokens & other_tokens) / len(union) if union else 0.0
+
+
+class ProductMatcher():
+    """
+    Assigns product IDs to names, reusing the ID of a known product when the
+    name has the same canonical key or is similar enough to it.
+    """
+    def __init__(self, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.by_key = {}
+        self.products = {}
+        self.blocks = defaultdict(set)
+
+    def add(self, product: str, name: str, keys: list[str] = ()) -> None:
+        """
+        Add a known product, one of its names, and any other canonical keys
+        it is known by.
+        """
+        brand, tokens = canonicalize(name)
+        for key in [canonical_key(name), *keys]:
+            self.by_key.setdefault(key, product)
+        if product in self.products:
+            return
+        self.products[product] = (brand, tokens)
+        for token in self._blocking_tokens(tokens):
+            self.blocks[token].add(product)
+
+    def match(self, name: str) -> str:
+        """
+        Return the ID of the product the name refers to, adding it as a new
+        product if no known product matches.
+        """
+        key = canonical_key(name)
+        if key in self.by_key:
+            return self.by_key[key]
+
+        product = self.find(name) or product_id(key)
+        self.add(product, name)
+        self.by_key[key] = product
+        return product
+
+    def find(self, name: str) -> str | None:
+        """
+        Return the ID of the known product the name refers to, or None if no
+        known product matches. Unlike match, the name is not added.
+        """
+        key = canonical_key(name)
+        if key in self.by_key:
+            return self.by_key[key]
+
+        brand, tokens = canonicalize(name)
+        best, best_score = None, self.threshold
+        candidates = set()
+        for token in self._blocking_tokens(tokens):
+            candidates |= self.blocks.get(token, set())
+        for candidate in candidates:
+            candidate_brand, candidate_tokens = self.products[candidate]
+            # Only compare products of the same brand, or with an unknown brand
+            if brand and candidate_brand and brand != candidate_brand:
+                continue
+            score = similarity(tokens, candidate_tokens)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _blocking_tokens(self, tokens: frozenset[str]) -> list[str]:
+        """
+        Return the tokens used to find candidate products for a name.
+        """
+        return [token for token in tokens if len(token) >= MIN_BLOCKING_TOKEN_LENGTH and not token.isdigit()]
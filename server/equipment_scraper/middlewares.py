@@ -3,11 +3,17 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+
+import pymongo
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+VALIDATOR_COLLECTION_NAME = 'page_validators'
+
 
 class EquipmentSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -100,3 +106,48 @@ class EquipmentDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class ConditionalRequestMiddleware:
+    """
+    Adds If-None-Match and If-Modified-Since headers to requests for pages
+    that were scraped before, using the validators the MongoPipeline saved
+    for them. The previous validators are passed to the spider in
+    request.meta['validators'] so it can skip unchanged pages.
+    Disabled when CONDITIONAL_RECRAWL_ENABLED is False.
+    """
+
+    def __init__(self, mongo_uri, mongo_db):
+        self.mongo_uri = mongo_uri
+        self.mongo_db = mongo_db
+        self.validators = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CONDITIONAL_RECRAWL_ENABLED'):
+            raise NotConfigured
+        m = cls(
+            mongo_uri=os.getenv('MONGODB_URI'),
+            mongo_db=os.getenv('MONGODB_DB_NAME'),
+        )
+        crawler.signals.connect(m.spider_opened, signal=signals.spider_opened)
+        return m
+
+    def spider_opened(self, spider):
+        # Load every validator for this spider up front, rather than one query per request
+        with pymongo.MongoClient(self.mongo_uri) as client:
+            collection = client[self.mongo_db][VALIDATOR_COLLECTION_NAME]
+            self.validators = {doc['_id']: doc for doc in collection.find({'spider': spider.name})}
+        spider.logger.info("Loaded %d page validators" % len(self.validators))
+
+    def process_request(self, request, spider):
+        validators = self.validators.get(request.url)
+        if not validators:
+            return None
+
+        request.meta['validators'] = validators
+        if validators.get('etag'):
+            request.headers.setdefault('If-None-Match', validators['etag'])
+        if validators.get('last_modified'):
+            request.headers.setdefault('If-Modified-Since', validators['last_modified'])
+        return None
@@ -3,160 +3,338 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+from collections import defaultdict
 import hashlib
 import pymongo
 from datetime import datetime
 import logging
 import os
+import time
+
+from equipment_scraper.alerts import AlertEvaluator, load_sinks, unseen_watch_items
+from equipment_scraper.generations import bump_generations
+from equipment_scraper.history import HISTORY_COLLECTION_NAME, history_update
+from equipment_scraper.items import DetailItem, ListingPageItem
+from equipment_scraper.matching import ProductMatcher, canonical_key
+from equipment_scraper.prices import price_fields
+from equipment_scraper.sites import site_name
+from equipment_scraper.middlewares import VALIDATOR_COLLECTION_NAME
 
 RUBBER_COLLECTION_NAME = 'rubbers'
 BLADE_COLLECTION_NAME = 'blades'
+EQUIPMENT_COLLECTION_NAMES = [RUBBER_COLLECTION_NAME, BLADE_COLLECTION_NAME]
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0
+DUPLICATE_KEY_ERROR = 11000
 
 class MongoPipeline:
+    """
+    Buffers scraped items and writes them to MongoDB with unordered bulk upserts.
+    The buffer is flushed when it reaches MONGO_BATCH_SIZE items, when
+    MONGO_FLUSH_INTERVAL seconds have passed since the last flush, and when
+    the spider closes. Once the last flush is written, the watches on the
+    items whose price changed in the crawl, and the watches on items it saw
+    that have not seen a price yet, are evaluated, if ALERTS_ENABLED is set. Products that other crawlers added under a different name are
+    merged by the worker once the whole crawl job is done.
+    Time spent processing items and flushing, and failed writes, are added
+    to the crawl stats.
+    """
     COLLECTION_NAME = None
 
-    def __init__(self, mongo_uri, mongo_db):
+    def __init__(self, mongo_uri, mongo_db, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 alert_sinks=None, stats=None, usd_rates=None):
         self.mongo_uri = mongo_uri
         self.mongo_db = mongo_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.alert_sinks = alert_sinks
+        self.stats = stats
+        self.usd_rates = usd_rates
 
     @classmethod
     def from_crawler(cls, crawler):
         return cls(
             mongo_uri=os.getenv('MONGODB_URI'),
             mongo_db=os.getenv('MONGODB_DB_NAME'),
+            batch_size=crawler.settings.getint('MONGO_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            flush_interval=crawler.settings.getfloat('MONGO_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+            alert_sinks=load_sinks(crawler.settings) if crawler.settings.getbool('ALERTS_ENABLED') else None,
+            stats=crawler.stats,
+            usd_rates=crawler.settings.getdict('USD_RATES'),
         )
 
     def open_spider(self, spider):
         self.client = pymongo.MongoClient(self.mongo_uri)
         self.db = self.client[self.mongo_db]
+        # Pending operations keyed by (collection, item ID, site entry ID), so
+        # an entry seen twice before a flush is only written once
+        self.buffer = {}
+        # Product matchers for each collection, loaded when first needed
+        self.matchers = {}
+        # IDs of the items written by this crawl, for each collection
+        self.written = defaultdict(set)
+        self.opened_at = datetime.now()
+        self.last_flush = time.monotonic()
+        # Failed bulk writes, raised once the spider closes
+        self.write_errors = []
 
     def close_spider(self, spider):
-        self.client.close()
+        try:
+            self.flush()
+            if self.alert_sinks is not None:
+                evaluator = AlertEvaluator(self.db, self.alert_sinks)
+                for collection_name, item_ids in self.written.items():
+                    evaluate_ids = self.price_changed(collection_name, item_ids)
+                    evaluate_ids += unseen_watch_items(self.db, collection_name, item_ids) - set(evaluate_ids)
+                    evaluator.evaluate(collection_name, evaluate_ids)
+            if self.write_errors:
+                raise self.write_errors[0]
+        finally:
+            self.client.close()
 
     def process_item(self, item, spider):
-        item_id = self.compute_id(item)
-        site_entry = SiteEntry(url = item['url'], price = item['price'])
-
+        start = time.perf_counter()
         if RUBBER_COLLECTION_NAME[:-1] in spider.name:
             self.COLLECTION_NAME = RUBBER_COLLECTION_NAME
         else:
             self.COLLECTION_NAME = BLADE_COLLECTION_NAME
 
-        logging.info('Process item: %s', item['name'])
+        if isinstance(item, ListingPageItem):
+            self._buffer_listing_page(item, spider)
+        elif isinstance(item, DetailItem):
+            self._buffer_details(item)
+        else:
+            item_id = self.compute_id(item)
+            site_entry = SiteEntry(url = item['url'], price = item['price'], usd_rates = self.usd_rates)
 
-        # Try to update an existing site entry within an existing equipment item
-        result = self.db[self.COLLECTION_NAME].update_one(
-            filter={'_id': item_id, 'entries._id': site_entry._id},
-            update={'$set': {'entries.$.price': site_entry.price, 'entries.$.last_updated': site_entry.timestamp}}
-        )
-        logging.info('Update existing site entry result: %s', result.raw_result)
+            logging.info('Process item: %s', item['name'])
 
-        # If no existing site entry was updated, try to add a new site entry to existing equipment item
-        if result.matched_count == 0:
-            logging.info('Attempting to add new site entry for existing item: %s with ID %s', item['name'], item_id)
-            result = self.db[self.COLLECTION_NAME].update_one(
+            self.buffer[(self.COLLECTION_NAME, item_id, site_entry._id)] = pymongo.UpdateOne(
                 filter={'_id': item_id},
-                update={'$push': {'entries': site_entry.asdict()}}
+                update=self._build_update(item['name'], site_entry),
+                upsert=True
             )
-            logging.info('Add new site entry result: %s', result.raw_result)
-
-        # If even adding to existing item failed, create a new equipment item
-        if result.matched_count == 0:
-            logging.info('Creating new equipment item: %s with ID %s', item['name'], item_id)
-            self.db[self.COLLECTION_NAME].insert_one({
-                '_id': item_id,
-                'name': item['name'],
-                'all_time_low_price': site_entry.price,
-                'entries': [site_entry.asdict()]
-            })
-        else:
-            # An existing item was updated, update the cheapest price if necessary
-            db_item = self.db[self.COLLECTION_NAME].find_one({'_id': item_id})
-            if db_item and self._is_price_lower(site_entry.price, db_item['all_time_low_price']):
-                logging.info('Updating lowest price for item: %s with ID %s', item['name'], item_id)
-                self.db[self.COLLECTION_NAME].update_one(
-                    filter={'_id': item_id},
-                    update={'$set': {'all_time_low_price': site_entry.price}}
-                )
+            # Record the price in the history, in the same flush
+            self.buffer[(HISTORY_COLLECTION_NAME, item_id, site_entry._id)] = history_update(
+                self.COLLECTION_NAME, item_id, site_entry.asdict()
+            )
+            self.written[self.COLLECTION_NAME].add(item_id)
+
+        if (len(self.buffer) >= self.batch_size or
+                time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+        self._record_time('mongo_pipeline/process_item_seconds', start)
         return item
 
-    def compute_id(self, item):
+    def flush(self):
         """
-        Compute a unique ID for the item based on its name.
+        Write all buffered operations, issuing one bulk_write per collection.
+        Page validators are written last, and skipped if any other write failed,
+        so a page is never marked as unchanged without its items being saved.
+        Failed writes are logged, counted and kept, and the first is raised
+        when the spider closes, rather than against whichever item filled the
+        buffer.
         """
-        name = item['name'].casefold().strip()
-        return hashlib.sha256((name).encode('utf-8')).hexdigest()
+        start = time.perf_counter()
+        operations = {}
+        for (collection_name, _, _), operation in self.buffer.items():
+            operations.setdefault(collection_name, []).append(operation)
+        self.buffer = {}
+        self.last_flush = time.monotonic()
+
+        errors = []
+        written = []
+        for collection_name in sorted(operations, key=lambda name: name == VALIDATOR_COLLECTION_NAME):
+            collection_operations = operations[collection_name]
+            if errors and collection_name == VALIDATOR_COLLECTION_NAME:
+                logging.warning('Skipping %d page validators after a failed write', len(collection_operations))
+                continue
+            try:
+                result = self._bulk_write(collection_name, collection_operations)
+                logging.info('Flushed %d items to %s: %s', len(collection_operations), collection_name, result.bulk_api_result)
+            except pymongo.errors.BulkWriteError as err:
+                logging.error('Bulk write to %s failed: %s', collection_name, err.details)
+                if self.stats is not None:
+                    self.stats.inc_value('mongo_pipeline/write_errors', len(err.details['writeErrors']) or 1)
+                errors.append(err)
+                self.write_errors.append(err)
+            if collection_name in EQUIPMENT_COLLECTION_NAMES:
+                written.append(collection_name)
+
+        # Let the API know its cached responses for these collections are stale
+        bump_generations(self.db, written)
+        self._record_time('mongo_pipeline/flush_seconds', start)
 
-    def _is_price_lower(self, new_price: str, current_low_price: str) -> bool:
+    def _bulk_write(self, collection_name: str, operations: list):
         """
-        Compare two price strings to determine if the new price is lower.
-        Handles different currencies and formats, converting EUR to USD for comparison.
+        Write operations in one unordered bulk write. Upserts that raced
+        another crawler inserting the same item fail with a duplicate key
+        error, and are retried once, when they update the inserted item.
+        Any other write error is raised.
         """
         try:
-            # Extract numeric values from price strings
-            import re
-
-            def extract_price_value(price_str: str) -> float:
-                numeric_part = re.sub(r'[^\d.,]', '', str(price_str))
-                if ',' in numeric_part and '.' in numeric_part:
-                    numeric_part = numeric_part.replace(',', '')
-                elif ',' in numeric_part:
-                    if numeric_part.count(',') == 1:
-                        numeric_part = numeric_part.replace(',', '.')
-                    else:
-                        numeric_part = numeric_part.replace(',', '')
-
-                return float(numeric_part)
-
-            def detect_currency(price_str: str) -> str:
-                """Detect currency from price string."""
-                price_str = str(price_str).upper()
-                if '€' in price_str or 'EUR' in price_str:
-                    return 'EUR'
-                elif '$' in price_str or 'USD' in price_str:
-                    return 'USD'
-                else:
-                    # Default to USD if no currency symbol found
-                    return 'USD'
-
-            def convert_to_usd(price_value: float, currency: str) -> float:
-                """Convert price to USD for comparison."""
-                if currency == 'EUR':
-                    # Using approximate EUR to USD conversion rate
-                    # TODO: Pull real-time exchange rate
-                    return price_value * 1.08
-                else:
-                    return price_value
-
-            new_value = extract_price_value(new_price)
-            current_value = extract_price_value(current_low_price)
-
-            # Detect currencies and convert to USD
-            new_currency = detect_currency(new_price)
-            current_currency = detect_currency(current_low_price)
-
-            new_value_usd = convert_to_usd(new_value, new_currency)
-            current_value_usd = convert_to_usd(current_value, current_currency)
-
-            return new_value_usd < current_value_usd
-        except (ValueError, TypeError):
-            return False
+            return self.db[collection_name].bulk_write(operations, ordered=False)
+        except pymongo.errors.BulkWriteError as err:
+            write_errors = err.details['writeErrors']
+            if err.details.get('writeConcernErrors') or any(error['code'] != DUPLICATE_KEY_ERROR for error in write_errors):
+                raise
+            logging.warning('Retrying %d upserts to %s after duplicate key errors', len(write_errors), collection_name)
+            return self.db[collection_name].bulk_write([operations[error['index']] for error in write_errors], ordered=False)
+
+    def price_changed(self, collection_name: str, item_ids: set) -> list:
+        """
+        Return the IDs of the given items whose price changed since the
+        spider opened, found through the index on price_changed_at.
+        """
+        changed = self.db[collection_name].find({'price_changed_at': {'$gte': self.opened_at}}, {'_id': 1})
+        return [item['_id'] for item in changed if item['_id'] in item_ids]
+
+    def _record_time(self, key: str, start: float) -> None:
+        """
+        Add the time since start to a crawl stat.
+        """
+        if self.stats is not None:
+            self.stats.inc_value(key, time.perf_counter() - start, start=0.0)
+
+    def _buffer_listing_page(self, item: ListingPageItem, spider) -> None:
+        """
+        Save the validators for a listing page. If the page has not changed,
+        its items were not scraped, so only refresh the last_updated time of
+        the site entries it listed last time, in a single update.
+        """
+        logging.info('Process listing page: %s (unchanged: %s)', item['url'], item['unchanged'])
+
+        if item['unchanged']:
+            entry_ids = item['entry_ids']
+            if entry_ids:
+                self.buffer[(self.COLLECTION_NAME, item['url'], None)] = pymongo.UpdateMany(
+                    filter={'entries._id': {'$in': entry_ids}},
+                    update={'$set': {'entries.$[entry].last_updated': datetime.now()}},
+                    array_filters=[{'entry._id': {'$in': entry_ids}}]
+                )
+        else:
+            entry_ids = [SiteEntry.compute_id(url) for url in item['item_urls']]
+
+        self.buffer[(VALIDATOR_COLLECTION_NAME, item['url'], None)] = pymongo.UpdateOne(
+            filter={'_id': item['url']},
+            update={'$set': {
+                'spider': spider.name,
+                'etag': item['etag'],
+                'last_modified': item['last_modified'],
+                'fingerprint': item['fingerprint'],
+                'entry_ids': entry_ids,
+                'page_total': item['page_total'],
+                'checked_at': datetime.now(),
+            }},
+            upsert=True
+        )
+
+    def _buffer_details(self, item: DetailItem) -> None:
+        """
+        Save the specifications from a product page on its equipment item,
+        under the page's store as its site entries name it, since stores rate
+        on different scales. The enrichment time is set even if the page
+        listed none, so the page is not requested again until it is due.
+        """
+        logging.info('Process details: %s (%d specs)', item['url'], len(item['specs']))
+
+        # Store names such as "megaspin.net" contain dots, so cannot be part of a field path
+        specs = {'$setField': {
+            'field': site_name(item['url']),
+            'input': {'$ifNull': ['$specs', {}]},
+            'value': {'$literal': item['specs']},
+        }}
+        self.buffer[(self.COLLECTION_NAME, item['item_id'], item['url'])] = pymongo.UpdateOne(
+            filter={'_id': item['item_id']},
+            update=[{'$set': {'specs': specs, 'specs_updated': datetime.now()}}]
+        )
+
+    def _build_update(self, name: str, site_entry: 'SiteEntry') -> list:
+        """
+        Build an update pipeline that upserts the equipment item, replaces or
+        appends its site entry, and keeps the all time lowest price, all in a
+        single operation. price_changed_at is set when the entry is new or
+        its price differs from the stored one.
+        """
+        entry = site_entry.asdict()
+        entries = {'$ifNull': ['$entries', []]}
+        # The stored price of the entry, as a list that is empty if the entry is new
+        stored_prices = {'$map': {
+            'input': {'$filter': {'input': entries, 'as': 'entry', 'cond': {'$eq': ['$$entry._id', site_entry._id]}}},
+            'as': 'entry',
+            'in': '$$entry.price'
+        }}
+        price_usd = entry['price_usd']
+
+        has_low_price = {'$ne': [{'$ifNull': ['$all_time_low_price', None]}, None]}
+        if price_usd is None:
+            # The price could not be parsed, so only use it when there is no lowest price yet
+            is_lower = {'$not': [has_low_price]}
+        else:
+            # Items saved before prices were normalized have a lowest price but no
+            # all_time_low_price_usd until migrate.py backfills it, and are left as they are
+            unknown_low = {'$and': [has_low_price, {'$eq': [{'$type': '$all_time_low_price_usd'}, 'missing']}]}
+            is_lower = {'$and': [
+                {'$not': [unknown_low]},
+                {'$lt': [price_usd, {'$ifNull': ['$all_time_low_price_usd', float('inf')]}]},
+            ]}
+
+        # Literals are wrapped with $literal so prices such as "$45.99" are not read as field paths
+        return [{'$set': {
+            'name': {'$ifNull': ['$name', {'$literal': name}]},
+            'first_seen': {'$ifNull': ['$first_seen', site_entry.timestamp]},
+            'canonical_keys': {'$setUnion': [{'$ifNull': ['$canonical_keys', []]}, [{'$literal': canonical_key(name)}]]},
+            'entries': {'$cond': [
+                {'$in': [site_entry._id, {'$ifNull': ['$entries._id', []]}]},
+                {'$map': {
+                    'input': entries,
+                    'as': 'entry',
+                    'in': {'$cond': [
+                        {'$eq': ['$$entry._id', site_entry._id]},
+                        {'$mergeObjects': ['$$entry', {'$literal': entry}]},
+                        '$$entry'
+                    ]}
+                }},
+                {'$concatArrays': [entries, [{'$literal': entry}]]}
+            ]},
+            'all_time_low_price': {'$cond': [is_lower, {'$literal': site_entry.price}, '$all_time_low_price']},
+            'all_time_low_price_usd': {'$cond': [is_lower, price_usd, '$all_time_low_price_usd']},
+            'price_changed_at': {'$cond': [
+                {'$in': [{'$literal': site_entry.price}, stored_prices]},
+                '$price_changed_at',
+                site_entry.timestamp
+            ]},
+        }}]
+
+    def compute_id(self, item):
+        """
+        Compute the ID of the product the item is, based on its name, so the
+        same product from different stores shares one equipment item.
+        """
+        if self.COLLECTION_NAME not in self.matchers:
+            matcher = ProductMatcher()
+            for db_item in self.db[self.COLLECTION_NAME].find({}, {'name': 1, 'canonical_keys': 1}):
+                matcher.add(db_item['_id'], db_item['name'], db_item.get('canonical_keys', []))
+            self.matchers[self.COLLECTION_NAME] = matcher
+        return self.matchers[self.COLLECTION_NAME].match(item['name'])
 
 
 class SiteEntry():
     """
     Represents an entry in the equipment item database.
     """
-    def __init__(self, url, price, timestamp=datetime.now()):
+    def __init__(self, url, price, timestamp=None, usd_rates=None):
         self._id = self.compute_id(url)
         self.url = url
         self.price = price
-        self.timestamp = timestamp
+        self.timestamp = timestamp or datetime.now()
+        self.usd_rates = usd_rates
 
     def asdict(self):
-        return { '_id': self._id, 'url': self.url, 'price': self.price, 'last_updated': self.timestamp }
+        return { '_id': self._id, 'url': self.url, 'site': site_name(self.url), 'price': self.price, **price_fields(self.price, self.usd_rates), 'last_updated': self.timestamp }
 
-    def compute_id(self, url):
+    @staticmethod
+    def compute_id(url):
         """
         Compute a unique ID for the site entry based on the URL.
         """
@@ -0,0 +1,94 @@
+"""
+Parsing and normalization of scraped price strings.
+
+Prices are parsed once, when they are scraped, into a numeric value, a
+currency and the equivalent value in USD, so they can be compared, sorted
+and range queried without parsing the strings again. USD values use the
+USD_RATES setting, and DEFAULT_USD_RATES for any currency it leaves out.
+"""
+import re
+from typing import NamedTuple
+
+NON_NUMERIC_PATTERN = re.compile(r'[^\d.,]')
+# A whole number with thousands separators, such as "1,299" or "1.234.567"
+GROUPED_NUMBER_PATTERN = re.compile(r'[1-9]\d{0,2}(?:,\d{3})+|[1-9]\d{0,2}(?:\.\d{3})+')
+CURRENCY_PATTERNS = [
+    ('EUR', re.compile(r'€|\bEUR\b', re.IGNORECASE)),
+    ('GBP', re.compile(r'£|\bGBP\b', re.IGNORECASE)),
+    ('USD', re.compile(r'\$|\bUSD\b', re.IGNORECASE)),
+]
+DEFAULT_CURRENCY = 'USD'
+# Approximate conversion rates to USD
+DEFAULT_USD_RATES = {
+    'USD': 1.0,
+    'EUR': 1.08,
+    'GBP': 1.27,
+}
+
+
+class Price(NamedTuple):
+    """
+    A parsed price.
+    """
+    value: float
+    currency: str
+    usd: float
+
+
+def parse_price(price: str, usd_rates: dict | None = None) -> Price | None:
+    """
+    Parse a price string such as "$45.99" or "45,99 €", converting it to USD
+    with the given rates. Returns None if the string does not contain a price.
+    """
+    try:
+        value = parse_value(price)
+    except ValueError:
+        return None
+    currency = detect_currency(price)
+    rates = {**DEFAULT_USD_RATES, **(usd_rates or {})}
+    return Price(value, currency, round(value * float(rates[currency]), 2))
+
+
+def parse_value(price: str) -> float:
+    """
+    Extract the numeric value from a price string. Either a comma or a
+    period can be the decimal separator, and the other separates thousands.
+    A single separator followed by three digits, as in "$1,299" or
+    "1.234 €", separates thousands.
+    Raises ValueError if there is no number, or it is malformed.
+    """
+    numeric_part = NON_NUMERIC_PATTERN.sub('', str(price))
+    if GROUPED_NUMBER_PATTERN.fullmatch(numeric_part):
+        return float(numeric_part.replace(',', '').replace('.', ''))
+
+    # The last separator is the decimal one, and any before it separate thousands
+    decimal_index = max(numeric_part.rfind(','), numeric_part.rfind('.'))
+    if decimal_index == -1:
+        return float(numeric_part)
+    integer_part, fraction = numeric_part[:decimal_index], numeric_part[decimal_index + 1:]
+    if not integer_part.isdigit():
+        if not GROUPED_NUMBER_PATTERN.fullmatch(integer_part) or numeric_part[decimal_index] in integer_part:
+            raise ValueError(f'Malformed price {price!r}')
+        integer_part = integer_part.replace(',', '').replace('.', '')
+    return float(f'{integer_part}.{fraction}')
+
+
+def detect_currency(price: str) -> str:
+    """
+    Detect the currency of a price string, defaulting to USD.
+    """
+    for currency, pattern in CURRENCY_PATTERNS:
+        if pattern.search(str(price)):
+            return currency
+    return DEFAULT_CURRENCY
+
+
+def price_fields(price: str, usd_rates: dict | None = None) -> dict:
+    """
+    Return the normalized fields stored alongside a price string.
+    The fields are None if the price could not be parsed.
+    """
+    parsed = parse_price(price, usd_rates)
+    if parsed is None:
+        return {'price_value': None, 'currency': None, 'price_usd': None}
+    return {'price_value': parsed.value, 'currency': parsed.currency, 'price_usd': parsed.usd}
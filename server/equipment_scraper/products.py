@@ -0,0 +1,188 @@
+"""
+Merging of equipment items that are the same product.
+
+Items get their product ID when they are scraped, from the products their
+crawler knew when it started. Crawlers running at the same time can each
+give a new product a different ID, so once every spider of a crawl job has
+closed, the worker matches the items first seen in the crawl against the
+items known before it, and merges items that are the same product.
+migrate.py --rekey matches every item again.
+
+Merged items are built with updates that only add to the item they are
+merged into: entries it lacks are pushed, and its lowest price lowered, so
+writes other crawls make to it meanwhile are kept. Merges are not
+transactional, but every step can be repeated: the merged items are written
+first, then price history and watches are moved to them, and only then are
+the old items deleted. If a merge is interrupted, the old items are still
+there, and the next merge redoes it.
+"""
+from collections import defaultdict
+from datetime import datetime
+import logging
+
+import pymongo
+
+from equipment_scraper.alerts import WATCHLIST_COLLECTION_NAME
+from equipment_scraper.generations import bump_generations
+from equipment_scraper.history import HISTORY_COLLECTION_NAME
+from equipment_scraper.matching import ProductMatcher, canonical_key
+
+MERGE_BATCH_SIZE = 200
+
+
+def merge_products(db, collection_name: str, since: datetime | None = None,
+                   batch_size: int = MERGE_BATCH_SIZE) -> dict[str, str]:
+    """
+    Re-assign item IDs using product matching, merging items that are the
+    same product. If since is given, only the items first seen since then
+    are matched, against the items known before; otherwise every item is
+    matched again. Price history and watches are moved to the new IDs.
+    Returns the new product ID of every item whose ID changed.
+    """
+    collection = db[collection_name]
+    order = [('first_seen', 1), ('_id', 1)]
+    if since is None:
+        changed = changed_groups(collection.find({}, {'name': 1, 'first_seen': 1}).sort(order))
+    else:
+        known = collection.find({'first_seen': {'$not': {'$gte': since}}}, {'name': 1, 'canonical_keys': 1})
+        new = collection.find({'first_seen': {'$gte': since}}, {'name': 1}).sort(order)
+        changed = new_groups(known, new)
+
+    # Merge the items whose ID changes, a batch of products at a time
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        item_ids = [item_id for _, product_item_ids in batch for item_id in product_item_ids]
+        items = {item['_id']: item for item in collection.find({'_id': {'$in': item_ids}}).sort(order)}
+
+        operations = []
+        history_operations = []
+        watch_operations = []
+        merged_ids = []
+        for product, product_item_ids in batch:
+            others = [items[item_id] for item_id in product_item_ids if item_id != product and item_id in items]
+            if not others:
+                continue
+            other_ids = [item['_id'] for item in others]
+            operations.extend(merge_operations(product, merge_items(product, others)))
+            history_operations.append(pymongo.UpdateMany(
+                filter={'collection': collection_name, 'item_id': {'$in': other_ids}},
+                update={'$set': {'item_id': product}}
+            ))
+            watch_operations.append(pymongo.UpdateMany(
+                filter={'equipment_type': collection_name, 'item_id': {'$in': other_ids}},
+                update={'$set': {'item_id': product}}
+            ))
+            merged_ids.extend(other_ids)
+        if not operations:
+            continue
+        # Ordered, so each merged item exists before its entries are pushed to it
+        collection.bulk_write(operations)
+        db[HISTORY_COLLECTION_NAME].bulk_write(history_operations, ordered=False)
+        db[WATCHLIST_COLLECTION_NAME].bulk_write(watch_operations, ordered=False)
+        # Last, so an interrupted merge still finds the old items when it is run again
+        collection.delete_many({'_id': {'$in': merged_ids}})
+
+    if changed:
+        bump_generations(db, [collection_name])
+    logging.info('Merged %d products in %s', len(changed), collection_name)
+    return {item_id: product for product, item_ids in changed for item_id in item_ids if item_id != product}
+
+
+def changed_groups(items) -> list[tuple[str, list[str]]]:
+    """
+    Match the names of the items, oldest first so a product keeps the name
+    it was first scraped with, and return the product ID and item IDs of
+    every product whose items do not already have that one ID.
+    """
+    matcher = ProductMatcher()
+    groups = defaultdict(list)
+    for item in items:
+        groups[matcher.match(item['name'])].append(item['_id'])
+    return [(product, item_ids) for product, item_ids in groups.items() if item_ids != [product]]
+
+
+def new_groups(known_items, new_items) -> list[tuple[str, list[str]]]:
+    """
+    Match the names of new items, oldest first, against the known items,
+    which keep their IDs, and return the product ID and item IDs of every
+    product whose items do not already have that one ID. The item IDs of a
+    known product start with its own.
+    """
+    matcher = ProductMatcher()
+    known_ids = set()
+    for item in known_items:
+        matcher.add(item['_id'], item['name'], item.get('canonical_keys', []))
+        known_ids.add(item['_id'])
+
+    groups = defaultdict(list)
+    for item in new_items:
+        groups[matcher.match(item['name'])].append(item['_id'])
+    return [(product, [product, *item_ids] if product in known_ids else item_ids)
+            for product, item_ids in groups.items() if item_ids != [product]]
+
+
+def merge_operations(product: str, merged: dict) -> list:
+    """
+    Build the updates that merge an item, built by merge_items from the
+    items merged into the product, into the product's item. The product's
+    item is created if it does not exist, and otherwise only gains the
+    entries and canonical keys it lacks, and a lower lowest price.
+    """
+    merged = dict(merged)
+    entries = merged.pop('entries')
+    low_price = merged.pop('all_time_low_price', None)
+    low_price_usd = merged.pop('all_time_low_price_usd', None)
+    update = {'$addToSet': {'canonical_keys': {'$each': merged.pop('canonical_keys')}}}
+    if merged.get('first_seen'):
+        update['$min'] = {'first_seen': merged.pop('first_seen')}
+    if merged.get('price_changed_at'):
+        update['$max'] = {'price_changed_at': merged.pop('price_changed_at')}
+    merged.pop('_id')
+    # Every other field, such as the name, only for a product without an item yet
+    update['$setOnInsert'] = merged
+
+    operations = [pymongo.UpdateOne(filter={'_id': product}, update=update, upsert=True)]
+    for entry in entries:
+        operations.append(pymongo.UpdateOne(
+            filter={'_id': product, 'entries._id': {'$ne': entry['_id']}},
+            update={'$push': {'entries': entry}}
+        ))
+    if low_price_usd is not None:
+        operations.append(pymongo.UpdateOne(
+            filter={'_id': product, '$or': [{'all_time_low_price_usd': None},
+                                            {'all_time_low_price_usd': {'$gt': low_price_usd}}]},
+            update={'$set': {'all_time_low_price': low_price, 'all_time_low_price_usd': low_price_usd}}
+        ))
+    return operations
+
+
+def merge_items(product: str, items: list[dict]) -> dict:
+    """
+    Merge items that are the same product into one item with the given ID.
+    The first item's name is kept, and each site entry is kept once, using
+    its most recently updated copy.
+    """
+    merged = {**items[0], '_id': product}
+
+    entries = {}
+    for item in items:
+        for entry in item.get('entries', []):
+            if entry['_id'] not in entries or entry['last_updated'] > entries[entry['_id']]['last_updated']:
+                entries[entry['_id']] = entry
+    merged['entries'] = list(entries.values())
+
+    priced = [item for item in items if item.get('all_time_low_price_usd') is not None]
+    if priced:
+        lowest = min(priced, key=lambda item: item['all_time_low_price_usd'])
+        merged['all_time_low_price'] = lowest['all_time_low_price']
+        merged['all_time_low_price_usd'] = lowest['all_time_low_price_usd']
+
+    first_seen = [item['first_seen'] for item in items if item.get('first_seen')]
+    if first_seen:
+        merged['first_seen'] = min(first_seen)
+    price_changed_at = [item['price_changed_at'] for item in items if item.get('price_changed_at')]
+    if price_changed_at:
+        merged['price_changed_at'] = max(price_changed_at)
+    merged['canonical_keys'] = sorted({key for item in items
+                                       for key in [canonical_key(item['name']), *item.get('canonical_keys', [])]})
+    return merged
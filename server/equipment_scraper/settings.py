@@ -12,7 +12,9 @@ BOT_NAME = "equipment_scraper"
 SPIDER_MODULES = ["equipment_scraper.spiders"]
 NEWSPIDER_MODULE = "equipment_scraper.spiders"
 
-ADDONS = {}
+ADDONS = {
+    "equipment_scraper.frontier.FrontierAddon": 0,
+}
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -53,15 +55,17 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
+DOWNLOADER_MIDDLEWARES = {
 #    "equipment_scraper.middlewares.EquipmentDownloaderMiddleware": 543,
-#}
+    "equipment_scraper.middlewares.ConditionalRequestMiddleware": 560,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "equipment_scraper.extensions.JobStatsExtension": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -71,14 +75,14 @@ ITEM_PIPELINES = {
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-#AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_ENABLED = True
 # The initial download delay
-#AUTOTHROTTLE_START_DELAY = 5
+AUTOTHROTTLE_START_DELAY = 1
 # The maximum download delay to be set in case of high latencies
-#AUTOTHROTTLE_MAX_DELAY = 60
+AUTOTHROTTLE_MAX_DELAY = 30
 # The average number of requests Scrapy should be sending in parallel to
 # each remote server
-#AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
+AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
@@ -94,4 +98,71 @@ ITEM_PIPELINES = {
 FEED_EXPORT_ENCODING = "utf-8"
 
 # Download delay settings
-DOWNLOAD_DELAY = 2
+# The default delay, and the lowest delay AutoThrottle will use
+DOWNLOAD_DELAY = 1
+CONCURRENT_REQUESTS_PER_DOMAIN = 2
+
+# Per store download profiles, so each host gets its own delay and concurrency.
+# worker.py runs spiders for the same store one after another, so these limits
+# hold per host even when every spider is crawled at once
+# See https://docs.scrapy.org/en/latest/topics/settings.html#download-slots
+DOWNLOAD_SLOTS = {
+    "www.megaspin.net": {"concurrency": 2, "delay": 2, "randomize_delay": True},
+    "www.tabletennis11.com": {"concurrency": 4, "delay": 1, "randomize_delay": True},
+}
+
+# MongoDB pipeline settings
+# Items are buffered and written with bulk_write once either limit is reached
+MONGO_BATCH_SIZE = 500
+# Maximum number of seconds to hold buffered items before flushing
+MONGO_FLUSH_INTERVAL = 5
+
+# Conversion rates to USD of the scraped prices, used to compare and sort
+# prices in different currencies. Prices are converted when they are scraped,
+# with the rates from equipment_scraper/prices.py for any currency left out
+USD_RATES = {"USD": 1.0, "EUR": 1.08, "GBP": 1.27}
+
+# Crawl job settings
+# CRAWL_JOB_ID and CRAWL_JOB_COLLECTION are set by worker.py for each job
+# Seconds between writes of crawl progress to the job document
+CRAWL_JOB_STATS_INTERVAL = 5
+
+# Maximum number of listing pages to scrape per spider.
+# Can be overridden per crawl with the max_pages spider argument
+MAX_LISTING_PAGES = 10
+
+# Send conditional requests using the ETag, Last-Modified and product card
+# fingerprint saved for each listing page, and skip pages that have not changed
+CONDITIONAL_RECRAWL_ENABLED = True
+
+# Evaluate the watchlist after each crawl, and send price alerts to these
+# sinks: log, file (ALERT_FILE), webhook (ALERT_WEBHOOK_URL), or the import
+# path of an AlertSink subclass
+ALERTS_ENABLED = True
+ALERT_SINKS = ["log"]
+ALERT_FILE = "alerts.ndjson"
+ALERT_WEBHOOK_URL = None
+
+# Set FRONTIER_ENABLED to keep scheduled requests in the shared frontier
+# collection in MongoDB instead of in memory, so several processes crawling
+# with the same FRONTIER_CRAWL_ID (the crawl job ID when run by the worker)
+# split the requests between them. Leases of a process that dies expire
+# after FRONTIER_LEASE_SECONDS and are retried
+FRONTIER_ENABLED = False
+FRONTIER_LEASE_SECONDS = 300
+FRONTIER_MAX_ATTEMPTS = 3
+
+# Product page enrichment, run by the <type>_details spiders. Items are
+# enriched again once their specifications are DETAIL_REFRESH_DAYS old, with
+# at most DETAIL_CONCURRENT_REQUESTS pages fetched at once
+DETAIL_REFRESH_DAYS = 30
+DETAIL_CONCURRENT_REQUESTS = 8
+
+# HTTP cache storage for the spiders that enable HTTPCACHE_ENABLED, which are
+# the detail spiders. Bodies are gzip compressed and stored once per distinct
+# content in .scrapy/HTTPCACHE_DIR, and expire after HTTPCACHE_EXPIRATION_SECS
+HTTPCACHE_STORAGE = "equipment_scraper.httpcache.ContentAddressedCacheStorage"
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_EXPIRATION_SECS = 7 * 24 * 60 * 60
+HTTPCACHE_COMPRESSION_LEVEL = 6
+HTTPCACHE_IGNORE_HTTP_CODES = [429, 500, 502, 503, 504]
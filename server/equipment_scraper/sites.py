@@ -0,0 +1,128 @@
+"""
+The stores equipment is scraped from.
+
+Each store is described by a SiteDefinition: the listing page of each
+equipment type, and the CSS selectors for its product cards and pagination.
+A spider is created for every store and equipment type from these
+definitions, so adding a store only means adding a definition here.
+"""
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+DEFAULT_CURRENCY = 'USD'
+
+
+class SiteDefinition(NamedTuple):
+    """
+    How to scrape a store's listing pages. Selectors are CSS, with ::text and
+    ::attr() as in Scrapy. All selectors except card are relative to a card.
+    The price is the stripped text of each price selector joined together,
+    and is read as being in currency if it does not name a currency itself.
+
+    Stores that show a pager set page_links, and the page number query
+    parameter, so every page is requested at once from the first. If the
+    pager only links to nearby pages, item_total and item_total_pattern find
+    the number of items, to work out the number of pages. Stores that only
+    link to the following page set next_page instead.
+
+    Stores whose product pages list specifications set spec_rows, with
+    spec_label and spec_value relative to a row, so the items can be
+    enriched with them.
+    """
+    name: str
+    domain: str
+    start_urls: dict[str, str]
+    card: str
+    product_name: str
+    product_url: str
+    product_price: tuple[str, ...]
+    currency: str = DEFAULT_CURRENCY
+    cookies: dict[str, str] | None = None
+    page_links: str | None = None
+    page_param: str | None = None
+    item_total: str | None = None
+    item_total_pattern: str | None = None
+    next_page: str | None = None
+    spec_rows: str | None = None
+    spec_label: str | None = None
+    spec_value: str | None = None
+
+
+SITES = {
+    'megaspin': SiteDefinition(
+        name='megaspin',
+        domain='www.megaspin.net',
+        start_urls={
+            'blades': 'https://www.megaspin.net/store/default.asp?cid=blades&type=All',
+            'rubbers': 'https://www.megaspin.net/store/default.asp?cid=rubbers&type=All',
+        },
+        card='.product-list > .product-card',
+        product_name='.product-name > a::text',
+        product_url='.product-name > a::attr(href)',
+        product_price=('.product-price > .main_price_usd::text', '.product-price > .main_price_usd_cents::text'),
+        spec_rows='.product-specs tr',
+        spec_label='td:first-child ::text',
+        spec_value='td:last-child ::text',
+    ),
+    'tt11': SiteDefinition(
+        name='tt11',
+        domain='www.tabletennis11.com',
+        start_urls={
+            'blades': 'https://www.tabletennis11.com/other_eng/blades',
+            'rubbers': 'https://www.tabletennis11.com/other_eng/rubbers',
+        },
+        card='div.item-wrapper',
+        product_name='.product-name > a::text',
+        product_url='.product-name > a::attr(href)',
+        product_price=('.price::text',),
+        cookies={'currency': 'USD'},
+        page_links='.pages li a::attr(href)',
+        page_param='p',
+        item_total='.amount ::text',
+        item_total_pattern=r'of\s+(\d+)\s+total',
+        spec_rows='#product-attribute-specs-table tr',
+        spec_label='th ::text',
+        spec_value='td ::text',
+    ),
+}
+
+
+def spider_name(equipment_type: str, site: SiteDefinition) -> str:
+    """
+    Return the name of the spider for a store and equipment type, for example "rubber_tt11".
+    """
+    return f'{equipment_type[:-1]}_{site.name}'
+
+
+def detail_spider_name(equipment_type: str) -> str:
+    """
+    Return the name of the spider enriching an equipment type from product pages, for example "rubber_details".
+    """
+    return f'{equipment_type[:-1]}_details'
+
+
+def spiders_by_type() -> dict[str, list[str]]:
+    """
+    Return the names of the spiders for each equipment type.
+    """
+    spiders = {}
+    for site in SITES.values():
+        for equipment_type in site.start_urls:
+            spiders.setdefault(equipment_type, []).append(spider_name(equipment_type, site))
+    return {equipment_type: sorted(names) for equipment_type, names in sorted(spiders.items())}
+
+
+def site_for_url(url: str) -> SiteDefinition | None:
+    """
+    Return the definition of the store a URL belongs to, or None if it is not defined.
+    """
+    return next((site for site in SITES.values() if site_name(site.domain) == site_name(url)), None)
+
+
+def site_name(url: str) -> str:
+    """
+    Return the store a URL or host name belongs to, as its host name
+    without a leading "www.", for example "megaspin.net".
+    """
+    host = urlparse(url).hostname if '//' in url else url
+    return (host or '').lower().strip().removeprefix('www.')
@@ -0,0 +1,52 @@
+"""
+Normalization of the specifications scraped from product detail pages.
+
+Stores label their specifications differently, so each label is matched to
+one of the SPEC_NAMES, and other specifications are ignored. Ratings and
+weights are read as numbers. Thicknesses are read as a number in mm when a
+single one is given, and kept as text when several are offered.
+"""
+import re
+
+SPEC_PATTERNS = {
+    'speed': re.compile(r'\bspeed\b', re.IGNORECASE),
+    'spin': re.compile(r'\bspin\b', re.IGNORECASE),
+    'control': re.compile(r'\bcontrol\b', re.IGNORECASE),
+    'weight': re.compile(r'\bweight\b', re.IGNORECASE),
+    'thickness': re.compile(r'\bthickness\b', re.IGNORECASE),
+}
+SPEC_NAMES = list(SPEC_PATTERNS)
+# A comma or period between digits is a decimal separator, so European lists
+# such as "1,7, 1,9" read as 1.7 and 1.9, as long as values are separated by
+# a comma and a space
+NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def parse_specs(rows: list[tuple[str, str]]) -> dict:
+    """
+    Build the specifications from (label, value) rows of a detail page.
+    The first row matching each specification is used.
+    """
+    specs = {}
+    for label, value in rows:
+        value = ' '.join(value.split())
+        if not value:
+            continue
+        for name, pattern in SPEC_PATTERNS.items():
+            if name not in specs and pattern.search(label):
+                parsed = parse_spec(name, value)
+                if parsed is not None:
+                    specs[name] = parsed
+                break
+    return specs
+
+
+def parse_spec(name: str, value: str) -> float | str | None:
+    """
+    Parse the value of a specification, such as "9.5" or "85 g".
+    Returns None if a rating or weight has no number.
+    """
+    numbers = [float(number.replace(',', '.')) for number in NUMBER_PATTERN.findall(value)]
+    if name == 'thickness':
+        return numbers[0] if len(numbers) == 1 else value
+    return numbers[0] if numbers else None
@@ -0,0 +1,96 @@
+import datetime
+import os
+
+import pymongo
+import scrapy
+
+from equipment_scraper.extraction import extractor
+from equipment_scraper.items import DetailItem
+from equipment_scraper.sites import SITES, detail_spider_name, site_for_url, spiders_by_type
+
+DEFAULT_REFRESH_DAYS = 30
+DEFAULT_CONCURRENT_REQUESTS = 8
+
+class DetailSpider(scrapy.Spider):
+    """
+    Spider for enriching the items of one equipment type with the
+    specifications on their product pages. A subclass is created below for
+    every equipment type.
+    The product page of each site entry is requested for items that have not
+    been enriched in the last refresh_days days (DETAIL_REFRESH_DAYS by
+    default), up to limit items. At most DETAIL_CONCURRENT_REQUESTS pages are
+    fetched at once, within the per store limits, and pages are kept in the
+    HTTP cache so repeated runs mostly read them from disk.
+    """
+    equipment_type = None
+    custom_settings = {
+        'HTTPCACHE_ENABLED': True,
+    }
+
+    def __init__(self, *args, refresh_days=None, limit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_days = int(refresh_days) if refresh_days else None
+        self.limit = int(limit) if limit else 0
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        settings.set('CONCURRENT_REQUESTS',
+                     settings.getint('DETAIL_CONCURRENT_REQUESTS', DEFAULT_CONCURRENT_REQUESTS), priority='spider')
+
+    async def start(self):
+        refresh_days = self.refresh_days or self.settings.getint('DETAIL_REFRESH_DAYS', DEFAULT_REFRESH_DAYS)
+        for item_id, url in self.detail_urls(refresh_days):
+            site = site_for_url(url)
+            yield scrapy.Request(url=url, callback=self.parse, cookies=site.cookies or {}, cb_kwargs={'item_id': item_id})
+
+    def detail_urls(self, refresh_days: int) -> list[tuple[str, str]]:
+        """
+        Find the product pages of the items due to be enriched, as (item ID, URL) pairs.
+        """
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=refresh_days)
+        with pymongo.MongoClient(os.getenv('MONGODB_URI')) as client:
+            items = client[os.getenv('MONGODB_DB_NAME')][self.equipment_type].find(
+                filter={'specs_updated': {'$not': {'$gte': cutoff}}},
+                projection={'entries.url': 1},
+                limit=self.limit
+            )
+            urls = []
+            for item in items:
+                for entry in item.get('entries', []):
+                    site = site_for_url(entry['url'])
+                    if site is not None and site.spec_rows:
+                        urls.append((item['_id'], entry['url']))
+        self.logger.info('Enriching %d product pages', len(urls))
+        return urls
+
+    def parse(self, response, item_id=None):
+        site = site_for_url(response.url)
+        if site is None:
+            self.logger.warning('Not enriching %s from %s, an unknown store', item_id, response.url)
+            return
+        yield DetailItem(item_id=item_id, url=response.url, specs=extractor(site.name).specs(response.selector.root))
+
+
+def detail_spiders() -> dict[str, type]:
+    """
+    Create a detail spider class for every equipment type, by spider name.
+    """
+    domains = [site.domain for site in SITES.values() if site.spec_rows]
+    spiders = {}
+    for equipment_type in spiders_by_type():
+        name = detail_spider_name(equipment_type)
+        class_name = f'{equipment_type[:-1].capitalize()}DetailSpider'
+        spiders[name] = type(class_name, (DetailSpider,), {
+            '__module__': __name__,
+            '__doc__': f'Spider for enriching the {equipment_type} with the specifications on their product pages.',
+            'name': name,
+            'equipment_type': equipment_type,
+            'allowed_domains': domains,
+        })
+    return spiders
+
+
+DETAIL_SPIDERS = detail_spiders()
+# Module level names, so Scrapy's spider loader finds the spiders
+globals().update({spider.__name__: spider for spider in DETAIL_SPIDERS.values()})
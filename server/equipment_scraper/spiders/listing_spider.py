@@ -0,0 +1,64 @@
+import hashlib
+
+import scrapy
+
+from equipment_scraper.items import ListingPageItem
+
+class ListingSpider(scrapy.Spider):
+    """
+    Base spider for store listing pages.
+    Pages are requested conditionally using the validators saved from the last
+    crawl by the ConditionalRequestMiddleware. A page that returns 304, or whose
+    product cards hash to the same fingerprint, is reported as unchanged instead
+    of being parsed, so only its entries' last_updated times are refreshed.
+    """
+    handle_httpstatus_list = [304]
+
+    def is_unchanged(self, response, cards) -> bool:
+        """
+        Check if the page is the same as when it was last scraped.
+        """
+        previous = response.meta.get('validators')
+        if not previous:
+            return False
+        return response.status == 304 or previous['fingerprint'] == self.fingerprint(cards)
+
+    def unchanged_page(self, response) -> ListingPageItem:
+        """
+        Report a page that has not changed, keeping the previous validators.
+        """
+        previous = response.meta['validators']
+        return ListingPageItem(
+            url=response.url,
+            etag=previous.get('etag'),
+            last_modified=previous.get('last_modified'),
+            fingerprint=previous['fingerprint'],
+            item_urls=None,
+            entry_ids=previous.get('entry_ids', []),
+            page_total=previous.get('page_total'),
+            unchanged=True,
+        )
+
+    def listing_page(self, response, cards, item_urls, page_total=None) -> ListingPageItem:
+        """
+        Report a page that was parsed, with its new validators.
+        """
+        return ListingPageItem(
+            url=response.url,
+            etag=response.headers.get('ETag', b'').decode() or None,
+            last_modified=response.headers.get('Last-Modified', b'').decode() or None,
+            fingerprint=self.fingerprint(cards),
+            item_urls=item_urls,
+            entry_ids=None,
+            page_total=page_total,
+            unchanged=False,
+        )
+
+    def fingerprint(self, cards: list[str]) -> str:
+        """
+        Hash the HTML of the product cards, ignoring the rest of the page.
+        """
+        digest = hashlib.sha256()
+        for card in cards:
+            digest.update(card.encode('utf-8'))
+        return digest.hexdigest()
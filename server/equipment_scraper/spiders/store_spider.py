@@ -0,0 +1,113 @@
+import math
+
+import scrapy
+
+from equipment_scraper.extraction import extractor
+from equipment_scraper.items import EquipmentItem
+from equipment_scraper.sites import SITES, spider_name
+from .listing_spider import ListingSpider
+
+DEFAULT_MAX_PAGES = 10
+
+class StoreSpider(ListingSpider):
+    """
+    Spider for scraping one equipment type from a store, as described by its
+    site definition in sites.py. A subclass is created below for every store
+    and equipment type.
+    If the store has a pager, the page count is read from the first listing
+    page and every remaining page is requested at once, so they can be fetched
+    concurrently. The number of pages is capped by the max_pages spider
+    argument or the MAX_LISTING_PAGES setting.
+    """
+    site = None
+    equipment_type = None
+
+    def __init__(self, *args, max_pages=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_pages = int(max_pages) if max_pages else None
+        self.extractor = extractor(self.site.name)
+
+    async def start(self):
+        if not self.max_pages:
+            self.max_pages = self.settings.getint('MAX_LISTING_PAGES', DEFAULT_MAX_PAGES)
+        yield self.page_request(1)
+
+    def page_request(self, page: int, url: str | None = None) -> scrapy.Request:
+        """
+        Build the request for the given listing page, at the given URL or
+        else at the page's URL in the store's pager.
+        """
+        if url is None:
+            url = self.start_urls[0]
+            if page > 1:
+                url = f'{url}{"&" if "?" in url else "?"}{self.site.page_param}={page}'
+        return scrapy.Request(url=url, callback=self.parse, cookies=self.site.cookies or {}, cb_kwargs={'page': page})
+
+    def parse(self, response, page=1):
+        root = response.selector.root
+        cards = self.extractor.cards(root)
+        card_html = [self.extractor.card_html(card) for card in cards]
+        if self.is_unchanged(response, card_html):
+            listing_page = self.unchanged_page(response)
+        else:
+            item_urls = []
+            for card in cards:
+                fields = self.extractor.extract(card, response.url)
+                if fields is None:
+                    self.logger.warning('Skipping a product card without a name, URL or price on %s', response.url)
+                    continue
+                item_urls.append(fields['url'])
+                yield EquipmentItem(**fields)
+            listing_page = self.listing_page(response, card_html, item_urls,
+                                             page_total=self.page_total(root, len(cards)))
+        yield listing_page
+
+        # Only the first page fans out, so each page is requested once
+        if page == 1 and self.site.page_links:
+            last_page = min(listing_page['page_total'] or 1, self.max_pages)
+            for next_page in range(2, last_page + 1):
+                yield self.page_request(next_page)
+        elif self.site.next_page and page < self.max_pages:
+            url = self.extractor.next_page_url(root, response.url)
+            if url:
+                yield self.page_request(page + 1, url)
+
+    def page_total(self, root, items_per_page: int) -> int | None:
+        """
+        Find the total number of listing pages, or None if the store has no
+        pager. The pager may only link to nearby pages, so the item total is
+        used as well when it is shown.
+        """
+        if not self.site.page_links:
+            return None
+        pages = self.extractor.page_numbers(root)
+        total = self.extractor.total_items(root)
+        if total and items_per_page:
+            pages.append(math.ceil(total / items_per_page))
+        return max(pages, default=1)
+
+
+def store_spiders() -> dict[str, type]:
+    """
+    Create a spider class for every store and equipment type, by spider name.
+    """
+    spiders = {}
+    for site in SITES.values():
+        for equipment_type, start_url in site.start_urls.items():
+            name = spider_name(equipment_type, site)
+            class_name = f'{equipment_type[:-1].capitalize()}Spider{site.name.capitalize()}'
+            spiders[name] = type(class_name, (StoreSpider,), {
+                '__module__': __name__,
+                '__doc__': f'Spider for scraping the {equipment_type} from {site.domain}.',
+                'name': name,
+                'site': site,
+                'equipment_type': equipment_type,
+                'allowed_domains': [site.domain],
+                'start_urls': [start_url],
+            })
+    return spiders
+
+
+SPIDERS = store_spiders()
+# Module level names, so Scrapy's spider loader finds the spiders
+globals().update({spider.__name__: spider for spider in SPIDERS.values()})
@@ -0,0 +1,120 @@
+"""
+A MongoDB backed queue of crawl jobs.
+
+The API enqueues jobs and reports their status, and worker.py claims and
+runs them. While a job runs, the JobStatsExtension in the Scrapy project
+writes each spider's progress to the job document.
+"""
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+import datetime
+
+from equipment_scraper.sites import detail_spider_name, spiders_by_type
+
+JOB_COLLECTION_NAME = 'jobs'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+SPIDERS_BY_TYPE = spiders_by_type()
+ALL_SPIDERS = [spider for spiders in SPIDERS_BY_TYPE.values() for spider in spiders]
+# Spiders enriching the items of each equipment type from their product pages
+DETAIL_SPIDERS_BY_TYPE = {equipment_type: [detail_spider_name(equipment_type)] for equipment_type in SPIDERS_BY_TYPE}
+ALL_DETAIL_SPIDERS = [spider for spiders in DETAIL_SPIDERS_BY_TYPE.values() for spider in spiders]
+
+
+def enqueue_job(db, equipment_type: str, spiders: list[str]) -> str:
+    """
+    Add a crawl job to the queue and return its ID.
+    """
+    result = db[JOB_COLLECTION_NAME].insert_one({
+        'equipment_type': equipment_type,
+        'spiders': spiders,
+        'state': QUEUED,
+        'created_at': datetime.datetime.now(),
+        'started_at': None,
+        'finished_at': None,
+        'heartbeat': None,
+        'worker': None,
+        'error': None,
+        'stats': {},
+    })
+    return str(result.inserted_id)
+
+
+def claim_job(db, worker: str) -> dict | None:
+    """
+    Atomically move the oldest queued job to the running state and return it.
+    Returns None if the queue is empty.
+    """
+    now = datetime.datetime.now()
+    return db[JOB_COLLECTION_NAME].find_one_and_update(
+        filter={'state': QUEUED},
+        update={'$set': {'state': RUNNING, 'started_at': now, 'heartbeat': now, 'worker': worker}},
+        sort=[('created_at', 1)],
+        return_document=True
+    )
+
+
+def finish_job(db, job_id, error: str | None = None) -> None:
+    """
+    Mark a running job as finished, or as failed if an error is given.
+    A job that is no longer running, such as one failed as stale, is left
+    as it is.
+    """
+    db[JOB_COLLECTION_NAME].update_one(
+        filter={'_id': ObjectId(job_id), 'state': RUNNING},
+        update={'$set': {
+            'state': FAILED if error else FINISHED,
+            'finished_at': datetime.datetime.now(),
+            'error': error,
+        }}
+    )
+
+
+def fail_stale_jobs(db, timeout: float) -> int:
+    """
+    Fail running jobs whose heartbeat is older than the timeout in seconds,
+    which happens when the worker running them dies.
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=timeout)
+    result = db[JOB_COLLECTION_NAME].update_many(
+        filter={'state': RUNNING, 'heartbeat': {'$lt': cutoff}},
+        update={'$set': {
+            'state': FAILED,
+            'finished_at': datetime.datetime.now(),
+            'error': 'Worker stopped responding',
+        }}
+    )
+    return result.modified_count
+
+
+def get_job(db, job_id: str) -> dict | None:
+    """
+    Return the job with the given ID, or None if the ID is invalid or unknown.
+    """
+    try:
+        return db[JOB_COLLECTION_NAME].find_one({'_id': ObjectId(job_id)})
+    except InvalidId:
+        return None
+
+
+def job_status(job: dict) -> dict:
+    """
+    Summarize a job document for the status API.
+    """
+    stats = job.get('stats', {})
+    end = job['finished_at'] or datetime.datetime.now()
+    elapsed = (end - job['started_at']).total_seconds() if job['started_at'] else 0.0
+    return {
+        'id': str(job['_id']),
+        'equipment_type': job['equipment_type'],
+        'state': job['state'],
+        'items_scraped': sum(spider.get('items_scraped', 0) for spider in stats.values()),
+        'pages_fetched': sum(spider.get('pages_fetched', 0) for spider in stats.values()),
+        'elapsed_seconds': round(elapsed, 1),
+        'spiders': stats,
+        'error': job['error'],
+    }
@@ -0,0 +1,181 @@
+"""
+Prometheus metrics for the API.
+
+Request latency is recorded per route, MongoDB commands are counted and timed
+by a pymongo command listener, and the response cache and crawl metrics are
+read when /metrics is scraped. Crawl metrics come from the Scrapy stats the
+JobStatsExtension writes to each crawl job.
+
+If SERVER_TIMING_ENABLED is set, responses also carry a Server-Timing header
+splitting the time spent in MongoDB, JSON serialization, and the whole request.
+"""
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+import jobs
+
+# Only the most recent jobs are read, which covers the latest run of every spider
+CRAWL_JOBS_SCANNED = 20
+
+REQUEST_LATENCY = Histogram(
+    'ttserver_request_duration_seconds', 'Time spent handling requests.',
+    ['method', 'route', 'status']
+)
+MONGO_COMMANDS = Counter(
+    'ttserver_mongodb_commands_total', 'MongoDB commands sent.',
+    ['command', 'outcome']
+)
+MONGO_LATENCY = Histogram(
+    'ttserver_mongodb_command_duration_seconds', 'Time taken by MongoDB commands.',
+    ['command'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, float('inf'))
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Counts and times MongoDB commands, and adds their time to the current request's Server-Timing.
+    """
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, 'success')
+
+    def failed(self, event):
+        self._record(event, 'failure')
+
+    def _record(self, event, outcome: str) -> None:
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMANDS.labels(event.command_name, outcome).inc()
+        MONGO_LATENCY.labels(event.command_name).observe(seconds)
+        if has_request_context() and 'mongo_seconds' in g:
+            g.mongo_seconds += seconds
+            g.mongo_commands += 1
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    Adds the time spent serializing JSON to the current request's Server-Timing.
+    """
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        result = super().dumps(obj, **kwargs)
+        if has_request_context() and 'serialize_seconds' in g:
+            g.serialize_seconds += time.perf_counter() - start
+        return result
+
+
+# Registered on import, so it is used by the client db.py creates
+monitoring.register(MongoCommandMetrics())
+
+
+class ResponseCacheCollector():
+    """
+    Reports the hits and misses of the response cache.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+
+    def describe(self):
+        # Without describe, registering the collector would call collect()
+        return []
+
+    def collect(self):
+        hits, misses = self.cache.hits, self.cache.misses
+        yield CounterMetricFamily('ttserver_response_cache_hits', 'Responses served from the cache.', value=hits)
+        yield CounterMetricFamily('ttserver_response_cache_misses', 'Responses not found in the cache.', value=misses)
+        yield GaugeMetricFamily('ttserver_response_cache_hit_ratio', 'Share of cache lookups that were hits.',
+                                value=hits / (hits + misses) if hits + misses else 0.0)
+
+
+class CrawlCollector():
+    """
+    Reports the latest crawl of each spider, from the stats saved to its crawl job.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def describe(self):
+        # Without describe, registering the collector would query MongoDB on import
+        return []
+
+    def collect(self):
+        families = {
+            'running': GaugeMetricFamily('ttcrawl_running', 'Whether the spider is crawling.', labels=['spider']),
+            'items': GaugeMetricFamily('ttcrawl_items_scraped', 'Items scraped by the latest crawl.', labels=['spider']),
+            'pages': GaugeMetricFamily('ttcrawl_pages_fetched', 'Pages fetched by the latest crawl.', labels=['spider']),
+            'items_rate': GaugeMetricFamily('ttcrawl_items_per_second', 'Items scraped per second by the latest crawl.',
+                                            labels=['spider']),
+            'pages_rate': GaugeMetricFamily('ttcrawl_pages_per_second', 'Pages fetched per second by the latest crawl.',
+                                            labels=['spider']),
+            'pipeline': GaugeMetricFamily('ttcrawl_pipeline_seconds_per_item',
+                                          'Mean MongoPipeline time per item in the latest crawl.', labels=['spider']),
+            'errors': GaugeMetricFamily('ttcrawl_http_errors', 'HTTP error responses in the latest crawl.',
+                                        labels=['spider', 'domain', 'status']),
+        }
+
+        seen = set()
+        latest = self.db[jobs.JOB_COLLECTION_NAME].find(
+            {'state': {'$ne': jobs.QUEUED}}, {'state': 1, 'stats': 1}
+        ).sort('created_at', -1).limit(CRAWL_JOBS_SCANNED)
+        for job in latest:
+            for spider, stats in job.get('stats', {}).items():
+                if spider in seen:
+                    continue
+                seen.add(spider)
+                items = stats.get('items_scraped', 0)
+                pages = stats.get('pages_fetched', 0)
+                elapsed = stats.get('elapsed_seconds') or 0
+                running = job['state'] == jobs.RUNNING and not stats.get('finish_reason')
+                families['running'].add_metric([spider], 1 if running else 0)
+                families['items'].add_metric([spider], items)
+                families['pages'].add_metric([spider], pages)
+                families['items_rate'].add_metric([spider], items / elapsed if elapsed else 0.0)
+                families['pages_rate'].add_metric([spider], pages / elapsed if elapsed else 0.0)
+                families['pipeline'].add_metric([spider], stats.get('pipeline_seconds', 0) / items if items else 0.0)
+                for error in stats.get('http_errors', []):
+                    families['errors'].add_metric([spider, error['domain'], str(error['status'])], error['count'])
+        yield from families.values()
+
+
+def init_app(app, db, cache) -> None:
+    """
+    Record metrics for every request to the app, and serve them from /metrics.
+    """
+    server_timing = os.getenv('SERVER_TIMING_ENABLED', '').lower() in ('1', 'true')
+    app.json = TimedJSONProvider(app)
+    REGISTRY.register(ResponseCacheCollector(cache))
+    REGISTRY.register(CrawlCollector(db))
+
+    @app.before_request
+    def start_timing():
+        g.request_start = time.perf_counter()
+        g.mongo_seconds = 0.0
+        g.mongo_commands = 0
+        g.serialize_seconds = 0.0
+
+    @app.after_request
+    def record_timing(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(elapsed)
+        if server_timing:
+            response.headers['Server-Timing'] = (
+                f'db;dur={g.mongo_seconds * 1000:.2f};desc="MongoDB ({g.mongo_commands} commands)", '
+                f'serialize;dur={g.serialize_seconds * 1000:.2f}, '
+                f'total;dur={elapsed * 1000:.2f}'
+            )
+        return response
+
+    @app.route('/metrics')
+    def get_metrics():
+        return Response(generate_latest(REGISTRY), content_type=CONTENT_TYPE_LATEST)
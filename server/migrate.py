@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Program: ttmigrate
+
+Description: Prepares the MongoDB database for the API and the crawler by
+             creating the indexes they rely on, and the numeric lowest price
+             of items saved before it existed. Run before starting the server
+             and the crawler. Optionally backfills or resets other data
+             written by older versions of the crawler.
+
+Usage: python migrate.py [--backfill] [--rekey] [--reset-specs]
+"""
+import argparse
+import logging
+
+import pymongo
+from scrapy.utils.project import get_project_settings
+
+from db import db
+from equipment_scraper.alerts import WATCHLIST_COLLECTION_NAME
+from equipment_scraper.frontier import FRONTIER_COLLECTION_NAME
+from equipment_scraper.history import HISTORY_COLLECTION_NAME
+from equipment_scraper.prices import parse_price, price_fields
+from equipment_scraper.products import merge_products
+from equipment_scraper.sites import SITES, site_name
+from equipment_scraper.specs import SPEC_NAMES
+
+EQUIPMENT_COLLECTION_NAMES = ['blades', 'rubbers']
+BACKFILL_BATCH_SIZE = 500
+FRONTIER_TTL = 7 * 24 * 3600
+
+
+def main():
+    """
+    Parse arguments and run the requested migration steps.
+    """
+    parser = argparse.ArgumentParser(description='Prepare the database for the server.')
+    parser.add_argument('--backfill', '--backfill-prices',
+                        dest='backfill',
+                        action='store_true',
+                        help='Add normalized price and site fields to site entries scraped before they existed')
+    parser.add_argument('--rekey',
+                        action='store_true',
+                        help='Re-assign product IDs and merge items that are the same product')
+    parser.add_argument('--reset-specs',
+                        action='store_true',
+                        help='Drop specifications saved before they were stored per store, so they are fetched again')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    ensure_indexes(db)
+    # Run every time, since the crawler only lowers all_time_low_price_usd once it is set
+    for collection_name in EQUIPMENT_COLLECTION_NAMES:
+        backfill_low_prices(db[collection_name])
+    if args.backfill:
+        for collection_name in EQUIPMENT_COLLECTION_NAMES:
+            backfill_entries(db[collection_name])
+    if args.rekey:
+        for collection_name in EQUIPMENT_COLLECTION_NAMES:
+            merge_products(db, collection_name)
+    if args.reset_specs:
+        for collection_name in EQUIPMENT_COLLECTION_NAMES:
+            drop_unscaled_specs(db[collection_name])
+
+
+def ensure_indexes(db) -> None:
+    """
+    Create the indexes used by the API and the crawler, if they do not exist.
+    """
+    for collection_name in EQUIPMENT_COLLECTION_NAMES:
+        collection = db[collection_name]
+        # Name searches
+        collection.create_index([('name', 'text')])
+        # Batch lookups of store names by their canonical key
+        collection.create_index('canonical_keys')
+        # Used by the crawler to refresh the site entries of unchanged listing pages
+        collection.create_index('entries._id')
+        # Sorting and filtering by price, site and staleness
+        collection.create_index('all_time_low_price_usd')
+        collection.create_index('entries.price_usd')
+        collection.create_index([('entries.site', 1), ('entries.price_usd', 1)])
+        collection.create_index('entries.last_updated')
+        # Matching the products first seen in a crawl
+        collection.create_index('first_seen')
+        # Finding the items whose price changed in a crawl, to evaluate their watches
+        collection.create_index('price_changed_at')
+        logging.info('Indexes ready for %s', collection_name)
+
+    # Price history lookups by item, over a range of months
+    db[HISTORY_COLLECTION_NAME].create_index([('item_id', 1), ('month', 1)])
+    logging.info('Indexes ready for %s', HISTORY_COLLECTION_NAME)
+
+    # Finding the watches on the items written by a crawl
+    db[WATCHLIST_COLLECTION_NAME].create_index([('item_id', 1), ('equipment_type', 1)])
+    logging.info('Indexes ready for %s', WATCHLIST_COLLECTION_NAME)
+
+    # Leasing the next request of a crawl, and dropping crawls after a week
+    db[FRONTIER_COLLECTION_NAME].create_index([('crawl', 1), ('spider', 1), ('state', 1),
+                                               ('priority', -1), ('created_at', 1)])
+    db[FRONTIER_COLLECTION_NAME].create_index('created_at', expireAfterSeconds=FRONTIER_TTL)
+    logging.info('Indexes ready for %s', FRONTIER_COLLECTION_NAME)
+
+
+def usd_rates() -> dict:
+    """
+    Return the USD_RATES setting the crawler converts prices with.
+    """
+    return get_project_settings().getdict('USD_RATES')
+
+
+def backfill_low_prices(collection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Add all_time_low_price_usd to every item that lacks it, parsed from its
+    all_time_low_price string. Items the crawler updated in the meantime are
+    left alone. Updates are sent in unordered bulk writes of batch_size.
+    Returns the number of items updated.
+    """
+    query = {'all_time_low_price_usd': {'$exists': False}}
+    rates = usd_rates()
+    operations = []
+    updated = 0
+    for item in collection.find(query, {'all_time_low_price': 1}).batch_size(batch_size):
+        low_price = parse_price(item.get('all_time_low_price'), rates)
+        operations.append(pymongo.UpdateOne(
+            filter={'_id': item['_id'], **query},
+            update={'$set': {'all_time_low_price_usd': low_price.usd if low_price else None}}
+        ))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+
+    logging.info('Backfilled the lowest price of %d items in %s', updated, collection.name)
+    return updated
+
+
+def drop_unscaled_specs(collection) -> int:
+    """
+    Remove the specifications saved before they were stored under the host
+    name of their store, either mixing the scales of different stores or
+    under the store's name in SITES, and clear the enrichment time of their
+    items so the detail spiders fetch them again. Returns the number of
+    items updated.
+    """
+    fields = [f'specs.{name}' for name in [*SPEC_NAMES, *SITES]]
+    result = collection.update_many(
+        filter={'$or': [{field: {'$exists': True}} for field in fields]},
+        update={'$unset': {**{field: '' for field in fields}, 'specs_updated': ''}}
+    )
+    logging.info('Dropped the unscaled specifications of %d items in %s', result.modified_count, collection.name)
+    return result.modified_count
+
+
+def backfill_entries(collection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Add price_value, currency, price_usd and site to every site entry that
+    lacks them, derived from the stored URLs and price strings. Each entry is
+    updated on its own, and only if its price is still the one read, so
+    entries a running crawler adds or updates in the meantime are kept.
+    Updates are sent in unordered bulk writes of batch_size. Returns the
+    number of entries updated.
+    """
+    missing = {'$or': [{'price_usd': {'$exists': False}}, {'site': {'$exists': False}}]}
+    query = {'entries': {'$elemMatch': missing}}
+    projection = {'entries': 1}
+    rates = usd_rates()
+
+    operations = []
+    updated = 0
+    for item in collection.find(query, projection).batch_size(batch_size):
+        for entry in item.get('entries', []):
+            if 'price_usd' in entry and 'site' in entry:
+                continue
+            fields = {'site': site_name(entry['url']), **price_fields(entry['price'], rates)}
+            operations.append(pymongo.UpdateOne(
+                filter={'_id': item['_id']},
+                update={'$set': {f'entries.$[entry].{name}': value for name, value in fields.items()}},
+                array_filters=[{'entry._id': entry['_id'], 'entry.price': entry['price']}]
+            ))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+
+    logging.info('Backfilled %d site entries in %s', updated, collection.name)
+    return updated
+
+
+if __name__ == '__main__':
+    main()
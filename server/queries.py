@@ -0,0 +1,277 @@
+"""
+Query builders for the read endpoints of the API.
+
+Request arguments are validated and turned into MongoDB queries here, and
+query results are turned into response bodies, without running any query.
+This lets the Flask app and the async app in asgi.py serve the same routes
+with the same JSON, each with its own MongoDB driver.
+"""
+import datetime
+
+from equipment_scraper.history import DEFAULT_HISTORY_DAYS
+from equipment_scraper.matching import TOKEN_PATTERN, ProductMatcher, canonical_key
+from equipment_scraper.sites import site_name
+
+BLADE_ENDPOINT = 'blades'
+RUBBER_ENDPOINT = 'rubbers'
+VALID_EQUIPMENT_TYPES = [BLADE_ENDPOINT, RUBBER_ENDPOINT]
+MONTH_LENGTH = 30
+RETRIEVE_LIMIT = 10
+MAX_RETRIEVE_LIMIT = 100
+MAX_HISTORY_DAYS = 10 * 365
+# Seconds clients may reuse a response before revalidating it
+CACHE_MAX_AGE = 60
+CACHEABLE_STATUS_CODES = [200, 404]
+# Most IDs and names, together, resolved by one lookup request
+MAX_LOOKUP_INPUTS = 500
+# Text search candidates read for each name without an exact match
+LOOKUP_TEXT_CANDIDATES = 5
+# Minimum token similarity for a text search candidate to match a name
+LOOKUP_MATCH_THRESHOLD = 0.5
+
+
+def build_search(args) -> tuple[list, str | None, int]:
+    """
+    Build the aggregation pipeline for GET /<equipment_type> from its
+    arguments, returning the pipeline, the searched name and the limit.
+    Raises ValueError with the error to return if an argument is invalid.
+    """
+    equipment_name = args.get('name', None)
+    after = args.get('after', None)
+    page_str = args.get('page', '1')
+    limit_str = args.get('limit', str(RETRIEVE_LIMIT))
+    try:
+        page = int(page_str)
+    except ValueError:
+        raise ValueError('Invalid page number')
+    try:
+        limit = int(limit_str)
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if page < 1:
+        raise ValueError('Invalid page number')
+    if limit < 1 or limit > MAX_RETRIEVE_LIMIT:
+        raise ValueError(f'Limit must be between 1 and {MAX_RETRIEVE_LIMIT}')
+    entry_filter = build_entry_filter(args)
+
+    # Build the query, so filtering, sorting and paging all happen in MongoDB
+    match = {}
+    if equipment_name:
+        match['$text'] = {'$search': equipment_name}
+    if entry_filter:
+        match['entries'] = {'$elemMatch': entry_filter}
+
+    pipeline = [{'$match': match}]
+    if equipment_name:
+        pipeline.append({'$addFields': {'score': {'$meta': 'textScore'}}})
+        if after:
+            try:
+                score, last_id = parse_text_cursor(after)
+            except ValueError:
+                raise ValueError('Invalid cursor')
+            pipeline.append({'$match': {'$or': [
+                {'score': {'$lt': score}},
+                {'score': score, '_id': {'$gt': last_id}}
+            ]}})
+        pipeline.append({'$sort': {'score': -1, '_id': 1}})
+    else:
+        if after:
+            match['_id'] = {'$gt': after}
+        pipeline.append({'$sort': {'_id': 1}})
+    if not after:
+        pipeline.append({'$skip': (page - 1) * limit})
+    pipeline.append({'$limit': limit})
+    pipeline.append(mark_old_entries_stage())
+    return pipeline, equipment_name, limit
+
+
+def search_result(result: list[dict], equipment_name: str | None, limit: int) -> dict | None:
+    """
+    Build the response body for the items a search returned, with the
+    cursor of the following page. Returns None if there are no items.
+    """
+    if not result:
+        return None
+    if equipment_name and result[0]['name'].lower() == equipment_name.lower():
+        result = [result[0]]
+
+    next_cursor = "null"
+    if len(result) == limit:
+        last = result[-1]
+        next_cursor = make_text_cursor(last['score'], last['_id']) if equipment_name else str(last['_id'])
+    return {
+        'items': result,
+        'next': next_cursor
+    }
+
+
+def parse_history_days(args) -> int:
+    """
+    Return the number of days of price history requested.
+    Raises ValueError with the error to return if it is invalid.
+    """
+    days_str = args.get('days', str(DEFAULT_HISTORY_DAYS))
+    try:
+        days = int(days_str)
+    except ValueError:
+        raise ValueError('Invalid number of days')
+    if days < 1 or days > MAX_HISTORY_DAYS:
+        raise ValueError(f'Days must be between 1 and {MAX_HISTORY_DAYS}')
+    return days
+
+
+def parse_lookup(body) -> tuple[list[str], list[str]]:
+    """
+    Return the IDs and names to look up from the JSON body of
+    POST /<equipment_type>/lookup, without duplicates.
+    Raises ValueError with the error to return if the body is invalid.
+    """
+    if not isinstance(body, dict):
+        raise ValueError('Expected a JSON object with ids and names')
+    lookups = []
+    for field in ['ids', 'names']:
+        values = body.get(field, [])
+        if not isinstance(values, list) or not all(isinstance(value, str) and value for value in values):
+            raise ValueError(f'{field} must be a list of strings')
+        lookups.append(list(dict.fromkeys(values)))
+    ids, names = lookups
+    if not ids and not names:
+        raise ValueError('No ids or names given')
+    if len(ids) + len(names) > MAX_LOOKUP_INPUTS:
+        raise ValueError(f'At most {MAX_LOOKUP_INPUTS} ids and names can be looked up at once')
+    return ids, names
+
+
+def lookup_ids_filter(ids: list[str]) -> dict:
+    """
+    Build the filter finding every item with one of the IDs.
+    """
+    return {'_id': {'$in': ids}}
+
+
+def lookup_names_filter(names: list[str]) -> dict:
+    """
+    Build the filter finding every item known by the canonical key of one
+    of the names, so store names like "Tenergy 05 (Butterfly)" match exactly.
+    """
+    return {'canonical_keys': {'$in': sorted({canonical_key(name) for name in names})}}
+
+
+def unmatched_names(names: list[str], items: list[dict]) -> list[str]:
+    """
+    Return the names whose canonical key none of the items are known by.
+    """
+    keys = {key for item in items for key in item.get('canonical_keys', [])}
+    return [name for name in names if canonical_key(name) not in keys]
+
+
+def lookup_text_pipeline(names: list[str]) -> list:
+    """
+    Build one text search for the names without an exact match, returning
+    the best scoring candidates for all of them together.
+    """
+    # Only the words are searched, so punctuation cannot quote or negate terms
+    terms = sorted({token for name in names for token in TOKEN_PATTERN.findall(name.casefold())})
+    return [
+        {'$match': {'$text': {'$search': ' '.join(terms)}}},
+        {'$sort': {'score': {'$meta': 'textScore'}, '_id': 1}},
+        {'$limit': LOOKUP_TEXT_CANDIDATES * len(names)},
+    ]
+
+
+def lookup_result(ids: list[str], names: list[str], items: list[dict]) -> dict:
+    """
+    Build the response body of a lookup from the items its queries returned,
+    mapping each ID and name to its item, or None if nothing matched.
+    Names without an exact match get the most similar item of the same brand.
+    """
+    by_id = {item['_id']: item for item in items}
+    matcher = ProductMatcher(LOOKUP_MATCH_THRESHOLD)
+    for item in items:
+        matcher.add(item['_id'], item['name'], item.get('canonical_keys', []))
+
+    return {
+        'ids': {item_id: mark_old_entries(by_id.get(item_id)) for item_id in ids},
+        'names': {name: mark_old_entries(by_id.get(matcher.find(name))) for name in names},
+    }
+
+
+def month_ago() -> datetime.datetime:
+    """
+    Return the time one month ago. Entries updated before then are old.
+    """
+    return datetime.datetime.now() - datetime.timedelta(days=MONTH_LENGTH)
+
+
+def mark_old_entries(item: dict | None) -> dict | None:
+    """
+    Return a copy of the item with is_old set on each site entry, as
+    mark_old_entries_stage() sets it on the items a search returns.
+    """
+    if item is None:
+        return None
+    cutoff = month_ago()
+    entries = [{**entry, 'is_old': entry.get('last_updated') is None or entry['last_updated'] < cutoff}
+               for entry in item.get('entries', [])]
+    return {**item, 'entries': entries}
+
+
+def mark_old_entries_stage() -> dict:
+    """
+    Build an aggregation stage that sets is_old on each site entry that
+    has not been updated in the last month.
+    """
+    return {'$addFields': {'entries': {'$map': {
+        'input': '$entries',
+        'as': 'entry',
+        'in': {'$mergeObjects': ['$$entry', {'is_old': {'$lt': ['$$entry.last_updated', month_ago()]}}]}
+    }}}}
+
+
+def build_entry_filter(args) -> dict:
+    """
+    Build the $elemMatch condition a site entry must meet from the min_price,
+    max_price, site and fresh query parameters. All conditions apply to the
+    same entry. Raises ValueError if a parameter is invalid.
+    """
+    entry_filter = {}
+    price_range = {}
+    for name, operator in [('min_price', '$gte'), ('max_price', '$lte')]:
+        value = args.get(name, None)
+        if value is None:
+            continue
+        try:
+            price_range[operator] = float(value)
+        except ValueError:
+            raise ValueError(f'Invalid {name}')
+    if price_range:
+        entry_filter['price_usd'] = price_range
+
+    site = args.get('site', None)
+    if site:
+        entry_filter['site'] = site_name(site)
+
+    fresh = args.get('fresh', 'false').lower()
+    if fresh not in ['true', 'false']:
+        raise ValueError('Fresh must be true or false')
+    if fresh == 'true':
+        entry_filter['last_updated'] = {'$gte': month_ago()}
+    return entry_filter
+
+
+def make_text_cursor(score: float, last_id: str) -> str:
+    """
+    Build the cursor for a text search from the last item's score and ID.
+    """
+    return f'{score!r}:{last_id}'
+
+
+def parse_text_cursor(cursor: str) -> tuple[float, str]:
+    """
+    Split a text search cursor into the score and ID it was built from.
+    Raises ValueError if the cursor is malformed.
+    """
+    score, separator, last_id = cursor.partition(':')
+    if not separator or not last_id:
+        raise ValueError(f'Invalid cursor {cursor}')
+    return float(score), last_id
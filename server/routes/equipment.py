@@ -1,39 +1,172 @@
-from flask import jsonify, request, Blueprint
+from flask import current_app, jsonify, make_response, request, stream_with_context, Blueprint, url_for
 from flask_cors import cross_origin
-from pymongo import MongoClient
-from bson.objectid import ObjectId
-import os
-import datetime
-
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
-from equipment_scraper.spiders.blade_megaspin import BladeSpiderMegaspin
-from equipment_scraper.spiders.rubber_megaspin import RubberSpiderMegaspin
-from equipment_scraper.spiders.blade_tt11 import BladeSpiderTT11
-from equipment_scraper.spiders.rubber_tt11 import RubberSpiderTT11
-
-BLADE_ENDPOINT = 'blades'
-RUBBER_ENDPOINT = 'rubbers'
-VALID_EQUIPMENT_TYPES = [BLADE_ENDPOINT, RUBBER_ENDPOINT]
-MONTH_LENGTH = 30
-RETRIEVE_LIMIT = 10
+import csv
+import functools
+import hashlib
+import io
+
+import jobs
+import queries
+from queries import CACHE_MAX_AGE, CACHEABLE_STATUS_CODES, VALID_EQUIPMENT_TYPES
+from autocomplete import Autocomplete
+from cache import ResponseCache
+from db import db
+from equipment_scraper.history import daily_history
+
+ALL_ENDPOINT = 'all'
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+# Number of documents fetched from MongoDB at a time when exporting
+EXPORT_BATCH_SIZE = 500
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+EXPORT_CSV_FIELDS = ['id', 'name', 'all_time_low_price', 'url', 'price', 'last_updated']
 
 dp = Blueprint('equipment', __name__)
+response_cache = ResponseCache(db)
+autocomplete = Autocomplete(db)
+
+
+def cached_response(view):
+    """
+    Serve a GET view from the response cache, keyed by the equipment type,
+    the view and its arguments. Responses carry an ETag and Cache-Control
+    header so clients can revalidate them and receive a 304.
+    """
+    @functools.wraps(view)
+    def wrapper(equipment_type, **kwargs):
+        key = (request.endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+        cached = response_cache.get(equipment_type, key)
+        if cached is None:
+            response = make_response(view(equipment_type, **kwargs))
+            body = response.get_data()
+            cached = (body, response.status_code, response.mimetype, hashlib.sha1(body).hexdigest())
+            # Invalid equipment types are not cached, so they cannot fill the cache
+            if response.status_code in CACHEABLE_STATUS_CODES:
+                response_cache.set(equipment_type, key, cached)
+
+        body, status, mimetype, etag = cached
+        response = current_app.response_class(body, status=status, mimetype=mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}'
+        return response.make_conditional(request)
+    return wrapper
+
 
-client = MongoClient(os.getenv('MONGODB_URI'))
-db = client[os.getenv('MONGODB_DB_NAME')]
+def is_valid_equipment_type(equipment_type: str) -> bool:
+    """
+    Check the equipment type is supported and its collection exists.
+    """
+    return equipment_type in VALID_EQUIPMENT_TYPES and response_cache.collection_exists(equipment_type)
 
-db[BLADE_ENDPOINT].create_index([('name', 'text')])
-db[RUBBER_ENDPOINT].create_index([('name', 'text')])
+
+@dp.route('/<equipment_type>/autocomplete', methods=['GET'])
+@cross_origin()
+def autocomplete_equipment(equipment_type):
+    """
+    Return the names best matching the partial name 'q', tolerating typos,
+    up to limit names. Served from an in-memory index of the collection.
+    """
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing query'}), 400
+    limit_str = request.args.get('limit', str(AUTOCOMPLETE_LIMIT))
+    try:
+        limit = int(limit_str)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    if limit < 1 or limit > MAX_AUTOCOMPLETE_LIMIT:
+        return jsonify({'error': f'Limit must be between 1 and {MAX_AUTOCOMPLETE_LIMIT}'}), 400
+
+    return jsonify({'items': autocomplete.search(equipment_type, query, limit)})
+
+
+@dp.route('/<equipment_type>/export', methods=['GET'])
+@cross_origin()
+def export_equipment(equipment_type):
+    """
+    Stream every item of the equipment type, as newline delimited JSON by
+    default or as CSV with one row per site entry. Documents are read from
+    a MongoDB cursor in batches, so memory use does not grow with the collection.
+    """
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+
+    cursor = db[equipment_type].find({}).sort('_id', 1).batch_size(EXPORT_BATCH_SIZE)
+    rows = export_csv(cursor) if export_format == 'csv' else export_ndjson(cursor)
+    return current_app.response_class(
+        stream_with_context(rows),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={equipment_type}.{export_format}'}
+    )
+
+
+@dp.route('/<equipment_type>/lookup', methods=['POST'])
+@cross_origin()
+def lookup_equipment(equipment_type):
+    """
+    Look up many equipment items at once. The body gives a list of ids and a
+    list of names, at most MAX_LOOKUP_INPUTS in total, and each is mapped to
+    its item, or null if none matches. IDs are found with one query, names
+    by their canonical key with another, and names without an exact match
+    with a single text search.
+    """
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+    try:
+        ids, names = queries.parse_lookup(request.get_json(silent=True))
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    collection = db[equipment_type]
+    items = list(collection.find(queries.lookup_ids_filter(ids))) if ids else []
+    if names:
+        items.extend(collection.find(queries.lookup_names_filter(names)))
+        unmatched = queries.unmatched_names(names, items)
+        if unmatched:
+            items.extend(collection.aggregate(queries.lookup_text_pipeline(unmatched)))
+    return jsonify(queries.lookup_result(ids, names, items))
+
+
+@dp.route('/<equipment_type>/<id>/history', methods=['GET'])
+@cross_origin()
+@cached_response
+def get_equipment_history(equipment_type, id):
+    """
+    Return the price history of each site entry of an equipment item over
+    the last 'days' days, as the lowest and highest price of each day.
+    """
+    if not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+
+    try:
+        days = queries.parse_history_days(request.args)
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    entries = daily_history(db, equipment_type, id, days)
+    if not entries:
+        return jsonify({'error': f'No price history found for {equipment_type[:-1]} with ID {id}'}), 404
+    return jsonify({'_id': id, 'days': days, 'entries': entries})
 
 
 @dp.route('/<equipment_type>/<id>', methods=['GET'])
 @cross_origin()
+@cached_response
 def get_equipment_item(equipment_type, id):
     """
     Return a specific equipment item by ID.
     """
-    if (equipment_type not in VALID_EQUIPMENT_TYPES) or (equipment_type not in db.list_collection_names()):
+    if not is_valid_equipment_type(equipment_type):
         return jsonify({'error': 'Invalid equipment type'}), 400
 
     item = db[equipment_type].find_one({'_id': id})
@@ -44,78 +177,90 @@ def get_equipment_item(equipment_type, id):
 
 @dp.route('/<equipment_type>', methods=['GET'])
 @cross_origin()
+@cached_response
 def get_equipment(equipment_type):
     """
-    Return all matching equipment items given the name, up to
-    RETRIEVE_LIMIT items.
+    Return all matching equipment items given the name, up to limit items
+    (RETRIEVE_LIMIT by default, at most MAX_RETRIEVE_LIMIT).
+    Items can be filtered to those with a site entry matching min_price and
+    max_price (in USD), site, and fresh (updated within the last month).
+    Pass the returned 'next' cursor as 'after' to get the following items.
+    The 'page' parameter is still supported, but deep pages are slower.
     """
-    if (equipment_type not in VALID_EQUIPMENT_TYPES) or (equipment_type not in db.list_collection_names()):
+    if not is_valid_equipment_type(equipment_type):
         return jsonify({'error': 'Invalid equipment type'}), 400
 
-    items = db[equipment_type]
-
-    # Validate the input has a 'name' key
-    equipment_name = request.args.get('name', None)
-    page_str = request.args.get('page', '1')
-    page = 1
     try:
-        page = int(page_str)
-    except ValueError:
-        return jsonify({'error': 'Invalid page number'}), 400
+        pipeline, equipment_name, limit = queries.build_search(request.args)
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
 
     # Search for the equipment items
-    result = []
-    if equipment_name:
-        result = list(items.find({'$text': {'$search': equipment_name}},
-                                 {'score': {'$meta': 'textScore'}})
-                           .sort([('score', {'$meta': 'textScore'}), ('_id', 1)])
-                           .skip((page - 1) * RETRIEVE_LIMIT)
-                           .limit(RETRIEVE_LIMIT))
-    else:
-        result = list(items.find({})
-                           .skip((page - 1) * RETRIEVE_LIMIT)
-                           .limit(RETRIEVE_LIMIT))
-
-
-    if not result or len(result) == 0:
+    result = queries.search_result(list(db[equipment_type].aggregate(pipeline)), equipment_name, limit)
+    if result is None:
         return jsonify({'error': f'No {equipment_type} found'}), 404
-    if equipment_name and result[0]['name'].lower() == equipment_name.lower():
-        result = [result[0]]
-    if len(result) == 1:
-        for entry in result[0]['entries']:
-            entry['is_old'] = is_month_old(entry['last_updated'])
-    return jsonify({
-        'items': result,
-        'next': str(result[-1]['_id']) if len(result) == RETRIEVE_LIMIT else "null"
-    })
+    return jsonify(result)
 
 
 @dp.route('/<equipment_type>', methods=['PUT'])
 @cross_origin()
 def update_equipment(equipment_type):
     """
-    Update the specified equipment item.
+    Queue a crawl job to update the specified equipment type, or every
+    equipment type at once if it is 'all'.
+    The crawl is run by worker.py; poll the returned job to follow its progress.
     """
-    if (equipment_type not in VALID_EQUIPMENT_TYPES) or (equipment_type not in db.list_collection_names()):
+    if equipment_type == ALL_ENDPOINT:
+        spiders = jobs.ALL_SPIDERS
+    elif not is_valid_equipment_type(equipment_type):
         return jsonify({'error': 'Invalid equipment type'}), 400
+    else:
+        spiders = jobs.SPIDERS_BY_TYPE[equipment_type]
 
-    process = CrawlerProcess(get_project_settings())
+    job_id = jobs.enqueue_job(db, equipment_type, spiders)
+    status_url = url_for('jobs.get_job_status', job_id=job_id)
+    return jsonify({'status': jobs.QUEUED, 'job_id': job_id, 'status_url': status_url}), 202, {'Location': status_url}
 
-    if equipment_type == BLADE_ENDPOINT:
-        process.crawl(BladeSpiderMegaspin)
-        process.crawl(BladeSpiderTT11)
-    elif equipment_type == RUBBER_ENDPOINT:
-        process.crawl(RubberSpiderMegaspin)
-        process.crawl(RubberSpiderTT11)
-    process.start(stop_after_crawl=True)
-    # TODO: Add a websocket so we can continuously update the status
-    process.stop()
-    return jsonify({'status': 'success'}), 200
+
+@dp.route('/<equipment_type>/details', methods=['PUT'])
+@cross_origin()
+def enrich_equipment(equipment_type):
+    """
+    Queue a crawl job to enrich the specified equipment type, or every
+    equipment type if it is 'all', with the specifications on the product
+    pages of items that are due. Poll the returned job as for an update.
+    """
+    if equipment_type == ALL_ENDPOINT:
+        spiders = jobs.ALL_DETAIL_SPIDERS
+    elif not is_valid_equipment_type(equipment_type):
+        return jsonify({'error': 'Invalid equipment type'}), 400
+    else:
+        spiders = jobs.DETAIL_SPIDERS_BY_TYPE[equipment_type]
+
+    job_id = jobs.enqueue_job(db, equipment_type, spiders)
+    status_url = url_for('jobs.get_job_status', job_id=job_id)
+    return jsonify({'status': jobs.QUEUED, 'job_id': job_id, 'status_url': status_url}), 202, {'Location': status_url}
+
+
+def export_ndjson(cursor):
+    """
+    Yield each document as a line of JSON.
+    """
+    for item in cursor:
+        yield current_app.json.dumps(item) + '\n'
 
 
-def is_month_old(timestamp: datetime) -> bool:
+def export_csv(cursor):
     """
-    Check if the given timestamp is older than one month.
+    Yield a CSV header, then one row for each site entry of each document.
     """
-    last_month = datetime.datetime.now() - datetime.timedelta(days=MONTH_LENGTH)
-    return timestamp < last_month
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_FIELDS)
+    for item in cursor:
+        for entry in item.get('entries', []):
+            writer.writerow([item['_id'], item['name'], item.get('all_time_low_price'),
+                             entry['url'], entry['price'], entry['last_updated'].isoformat()])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
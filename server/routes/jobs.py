@@ -0,0 +1,19 @@
+from flask import jsonify, Blueprint
+from flask_cors import cross_origin
+
+import jobs
+from db import db
+
+dp = Blueprint('jobs', __name__)
+
+
+@dp.route('/jobs/<job_id>', methods=['GET'])
+@cross_origin()
+def get_job_status(job_id):
+    """
+    Return the state and progress of a crawl job.
+    """
+    job = jobs.get_job(db, job_id)
+    if not job:
+        return jsonify({'error': f'No job found with ID {job_id}'}), 404
+    return jsonify(jobs.job_status(job))
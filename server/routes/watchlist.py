@@ -0,0 +1,72 @@
+from flask import jsonify, request, Blueprint
+from flask_cors import cross_origin
+
+from db import db
+from equipment_scraper import alerts
+from routes.equipment import VALID_EQUIPMENT_TYPES
+
+dp = Blueprint('watchlist', __name__)
+
+
+@dp.route('/watchlist', methods=['GET'])
+@cross_origin()
+def get_watchlist():
+    """
+    Return every watch, or only those for equipment_type if it is given.
+    """
+    equipment_type = request.args.get('equipment_type', None)
+    if equipment_type and equipment_type not in VALID_EQUIPMENT_TYPES:
+        return jsonify({'error': 'Invalid equipment type'}), 400
+    return jsonify({'items': [alerts.watch_status(watch) for watch in alerts.get_watches(db, equipment_type)]})
+
+
+@dp.route('/watchlist', methods=['POST'])
+@cross_origin()
+def add_watch():
+    """
+    Watch an equipment item for a price drop. The body gives the equipment_type
+    and item_id, and a target_price in USD, a percent_drop from the current
+    lowest price (or the first one a crawl finds, for an item without one),
+    or both. An alert is raised after the crawl that first sees the price at
+    or below either one, including the next crawl if it already is.
+    """
+    body = request.get_json(silent=True) or {}
+    equipment_type = body.get('equipment_type')
+    item_id = body.get('item_id')
+    target_price = body.get('target_price')
+    percent_drop = body.get('percent_drop')
+
+    if equipment_type not in VALID_EQUIPMENT_TYPES:
+        return jsonify({'error': 'Invalid equipment type'}), 400
+    if not isinstance(item_id, str) or not item_id:
+        return jsonify({'error': 'Missing item_id'}), 400
+    if target_price is None and percent_drop is None:
+        return jsonify({'error': 'A target_price or percent_drop is required'}), 400
+    # bool is a subclass of int, so true would otherwise be a price of 1
+    if target_price is not None and (not is_number(target_price) or target_price <= 0):
+        return jsonify({'error': 'Invalid target_price'}), 400
+    if percent_drop is not None and (not is_number(percent_drop) or not 0 < percent_drop < 100):
+        return jsonify({'error': 'percent_drop must be between 0 and 100'}), 400
+
+    watch = alerts.add_watch(db, equipment_type, item_id, target_price, percent_drop)
+    if not watch:
+        return jsonify({'error': f'No {equipment_type[:-1]} found with ID {item_id}'}), 404
+    return jsonify(alerts.watch_status(watch)), 201
+
+
+def is_number(value) -> bool:
+    """
+    Check a JSON value is a number, and not a boolean.
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+@dp.route('/watchlist/<watch_id>', methods=['DELETE'])
+@cross_origin()
+def delete_watch(watch_id):
+    """
+    Stop watching an item.
+    """
+    if not alerts.delete_watch(db, watch_id):
+        return jsonify({'error': f'No watch found with ID {watch_id}'}), 404
+    return '', 204
@@ -1 +1 @@
-flask --app app.py run --debug
+python migrate.py && flask --app app.py run --debug
@@ -0,0 +1,23 @@
+import mongomock
+import pytest
+from mongomock.collection import BulkOperationBuilder
+
+
+def without_sort(method):
+    """
+    Wrap a mongomock bulk method to drop the sort argument, which PyMongo
+    passes for every update and replacement but mongomock does not accept.
+    """
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """
+    An in-memory database that supports bulk writes.
+    """
+    monkeypatch.setattr(BulkOperationBuilder, 'add_update', without_sort(BulkOperationBuilder.add_update))
+    monkeypatch.setattr(BulkOperationBuilder, 'add_replace', without_sort(BulkOperationBuilder.add_replace))
+    return mongomock.MongoClient().db
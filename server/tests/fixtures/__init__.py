@@ -0,0 +1,41 @@
+"""
+Synthetic listing and product pages for each store, used by the tests and
+benchmarks to run the spiders without network access.
+
+The pages are written by hand to follow the markup the selectors in sites.py
+expect, not captured from the stores, so they do not catch changes to the
+live markup. When a store changes its markup, update its selectors and these
+pages together, or replace a page with a trimmed copy of the live one.
+"""
+import os
+
+from scrapy.http import HtmlResponse, Request
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MEGASPIN_RUBBERS = 'megaspin_rubbers.html'
+MEGASPIN_RUBBERS_URL = 'https://www.megaspin.net/store/default.asp?cid=rubbers&type=All'
+TT11_RUBBERS = 'tt11_rubbers.html'
+TT11_RUBBERS_LAST_PAGE = 'tt11_rubbers_last_page.html'
+TT11_RUBBERS_URL = 'https://www.tabletennis11.com/other_eng/rubbers'
+MEGASPIN_DETAIL = 'megaspin_detail.html'
+MEGASPIN_DETAIL_URL = 'https://www.megaspin.net/store/default.asp?pid=butterfly-viscaria'
+TT11_DETAIL = 'tt11_detail.html'
+TT11_DETAIL_URL = 'https://www.tabletennis11.com/other_eng/butterfly-tenergy-05'
+
+
+def read_fixture(name: str) -> bytes:
+    """
+    Return the body of a fixture page.
+    """
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as file:
+        return file.read()
+
+
+def fixture_response(name: str, url: str, body: bytes | None = None, status: int = 200,
+                     headers: dict | None = None, meta: dict | None = None) -> HtmlResponse:
+    """
+    Build a response for a fixture page, as if it had been fetched from the URL.
+    """
+    return HtmlResponse(url=url, body=body if body is not None else read_fixture(name), encoding='utf-8',
+                        status=status, headers=headers, request=Request(url, meta=meta or {}))
@@ -0,0 +1,110 @@
+from equipment_scraper.alerts import (WATCHLIST_COLLECTION_NAME, AlertEvaluator, AlertSink, add_watch, threshold,
+                                      unseen_watch_items)
+
+
+class ListSink(AlertSink):
+    """
+    Keeps the alerts it is sent.
+    """
+    def __init__(self):
+        self.alerts = []
+
+    def send(self, alerts: list[dict]) -> None:
+        self.alerts.extend(alerts)
+
+
+class StaleWatchlist():
+    """
+    A database whose watchlist reads return the watches as they were before
+    another crawl updated them.
+    """
+    def __init__(self, db, watches):
+        self.db = db
+        self.watches = watches
+
+    def __getitem__(self, name):
+        if name != WATCHLIST_COLLECTION_NAME:
+            return self.db[name]
+        collection = self.db[name]
+        watches = self.watches
+
+        class Collection():
+            def find(self, *args, **kwargs):
+                return iter(watches)
+
+            def __getattr__(self, attribute):
+                return getattr(collection, attribute)
+        return Collection()
+
+
+def set_price(db, price_usd: float) -> None:
+    """
+    Set the price of the watched item's only site entry, as a crawl would.
+    """
+    entry = {'_id': 'e1', 'url': 'https://www.megaspin.net/tenergy-05', 'price': f'${price_usd}', 'price_usd': price_usd}
+    db.rubbers.update_one({'_id': 'a'}, {'$set': {'name': 'Butterfly Tenergy 05', 'entries': [entry]}}, upsert=True)
+
+
+def crawl(db, price_usd: float) -> list[float]:
+    """
+    Set the price and evaluate the item's watches, returning the alerted prices.
+    """
+    set_price(db, price_usd)
+    return [alert['price_usd'] for alert in AlertEvaluator(db, [ListSink()]).evaluate('rubbers', ['a'])]
+
+
+def test_threshold():
+    assert threshold({'target_price_usd': 50.0}) == 50.0
+    assert threshold({'percent_drop': 10, 'baseline_price_usd': 100.0}) == 90.0
+    # Whichever is reached first
+    assert threshold({'target_price_usd': 50.0, 'percent_drop': 10, 'baseline_price_usd': 100.0}) == 90.0
+    assert threshold({'percent_drop': 10, 'baseline_price_usd': None}) is None
+
+
+def test_alerts_once_then_rearms(mongo_db):
+    set_price(mongo_db, 60.0)
+    add_watch(mongo_db, 'rubbers', 'a', target_price_usd=50.0)
+
+    assert crawl(mongo_db, 60.0) == []
+    assert crawl(mongo_db, 45.0) == [45.0]
+    # Unchanged or higher but still below the target, no new alert
+    assert crawl(mongo_db, 45.0) == []
+    assert crawl(mongo_db, 48.0) == []
+    # A further drop alerts again
+    assert crawl(mongo_db, 40.0) == [40.0]
+    # Rising above the target re-arms the watch
+    assert crawl(mongo_db, 55.0) == []
+    assert crawl(mongo_db, 48.0) == [48.0]
+
+
+def test_target_met_when_added_alerts_after_next_crawl(mongo_db):
+    set_price(mongo_db, 40.0)
+    watch = add_watch(mongo_db, 'rubbers', 'a', target_price_usd=50.0)
+
+    assert unseen_watch_items(mongo_db, 'rubbers', ['a', 'b']) == {'a'}
+    assert crawl(mongo_db, 40.0) == [40.0]
+    assert unseen_watch_items(mongo_db, 'rubbers', ['a']) == set()
+    assert mongo_db[WATCHLIST_COLLECTION_NAME].find_one({'_id': watch['_id']})['last_price_usd'] == 40.0
+
+
+def test_percent_drop_counts_from_first_price(mongo_db):
+    mongo_db.rubbers.insert_one({'_id': 'a', 'name': 'Butterfly Tenergy 05', 'entries': []})
+    watch = add_watch(mongo_db, 'rubbers', 'a', percent_drop=10)
+    assert watch['baseline_price_usd'] is None
+
+    assert crawl(mongo_db, 100.0) == []
+    assert mongo_db[WATCHLIST_COLLECTION_NAME].find_one({'_id': watch['_id']})['baseline_price_usd'] == 100.0
+    assert crawl(mongo_db, 95.0) == []
+    assert crawl(mongo_db, 89.0) == [89.0]
+
+
+def test_watch_updated_by_another_crawl_does_not_alert_twice(mongo_db):
+    set_price(mongo_db, 60.0)
+    add_watch(mongo_db, 'rubbers', 'a', target_price_usd=50.0)
+    assert crawl(mongo_db, 60.0) == []
+    stale = list(mongo_db[WATCHLIST_COLLECTION_NAME].find())
+
+    assert crawl(mongo_db, 45.0) == [45.0]
+    # A crawl that read the watch before the first one updated it
+    alerts = AlertEvaluator(StaleWatchlist(mongo_db, stale), [ListSink()]).evaluate('rubbers', ['a'])
+    assert alerts == []
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Nothing listens on port 1, so any MongoDB query fails after the timeout
+UNREACHABLE_MONGODB_URI = 'mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=5000'
+
+
+def test_app_imports_without_mongodb():
+    env = {**os.environ, 'MONGODB_URI': UNREACHABLE_MONGODB_URI, 'MONGODB_DB_NAME': 'test'}
+    result = subprocess.run([sys.executable, '-c', 'import app'], cwd=SERVER_DIR, env=env,
+                            capture_output=True, text=True, timeout=30)
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime
+import os
+
+import pytest
+
+# The Flask app only connects to MongoDB when queried, but needs a database name to import
+os.environ.setdefault('MONGODB_DB_NAME', 'test')
+
+import app as flask_app  # noqa: E402
+import asgi  # noqa: E402
+from cache import ResponseCache  # noqa: E402
+from equipment_scraper.generations import GENERATION_COLLECTION_NAME  # noqa: E402
+from equipment_scraper.history import HISTORY_COLLECTION_NAME  # noqa: E402
+from routes import equipment  # noqa: E402
+
+ITEM = {
+    '_id': 'butterfly tenergy 05',
+    'name': 'Butterfly Tenergy 05',
+    'all_time_low_price': '$45.99',
+    'all_time_low_price_usd': 45.99,
+    'first_seen': datetime(2026, 1, 1),
+    'entries': [{'_id': 'e1', 'url': 'https://www.megaspin.net/store/tenergy-05', 'site': 'megaspin',
+                 'price': '$45.99', 'price_usd': 45.99, 'last_updated': datetime(2026, 10, 1)}],
+}
+HISTORY_DAY = {
+    '_id': {'entry_id': 'e1', 'date': '2026-10-01'},
+    'url': 'https://www.megaspin.net/store/tenergy-05',
+    'min_usd': 45.99,
+    'max_usd': 49.99,
+    'last_price': '$45.99',
+}
+DOCUMENTS = {
+    'rubbers': [ITEM],
+    HISTORY_COLLECTION_NAME: [HISTORY_DAY],
+    GENERATION_COLLECTION_NAME: [{'_id': 'rubbers', 'generation': 1}],
+}
+
+
+class FakeCollection():
+    """
+    A collection returning the same documents for any query or pipeline,
+    except find_one, which matches the _id.
+    """
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, filter=None, *args, **kwargs):
+        return iter(self.documents)
+
+    def find_one(self, filter):
+        return next((document for document in self.documents if document['_id'] == filter['_id']), None)
+
+    def aggregate(self, pipeline):
+        return iter(self.documents)
+
+
+class FakeDatabase():
+    """
+    A database of fake collections, as the Flask app uses it.
+    """
+    collection_class = FakeCollection
+
+    def __getitem__(self, name):
+        return self.collection_class(DOCUMENTS.get(name, []))
+
+    def list_collection_names(self):
+        return list(DOCUMENTS)
+
+
+class AsyncFakeCursor():
+    """
+    A cursor of the asyncio client over fixed documents.
+    """
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    async def to_list(self, length=None):
+        return list(self.documents)
+
+
+class AsyncFakeCollection(FakeCollection):
+    """
+    A fake collection with the methods of the asyncio client.
+    """
+    def find(self, filter=None, *args, **kwargs):
+        return AsyncFakeCursor(self.documents)
+
+    async def find_one(self, filter):
+        return super().find_one(filter)
+
+    async def aggregate(self, pipeline):
+        return AsyncFakeCursor(self.documents)
+
+
+class AsyncFakeDatabase(FakeDatabase):
+    """
+    A database of fake collections, as the ASGI app uses it.
+    """
+    collection_class = AsyncFakeCollection
+
+    async def list_collection_names(self):
+        return super().list_collection_names()
+
+
+@pytest.fixture
+def apps(monkeypatch):
+    monkeypatch.setattr(equipment, 'db', FakeDatabase())
+    monkeypatch.setattr(equipment, 'response_cache', ResponseCache(FakeDatabase()))
+    monkeypatch.setattr(asgi, 'db', AsyncFakeDatabase())
+    monkeypatch.setattr(asgi, 'response_cache', ResponseCache(None))
+    return flask_app.app.test_client(), asgi.app.test_client()
+
+
+def get_asgi(client, path: str, headers: dict | None = None):
+    """
+    Send a GET request to the ASGI app, returning the response and its JSON.
+    """
+    async def get():
+        response = await client.get(path, headers=headers)
+        return response, await response.get_json()
+    return asyncio.run(get())
+
+
+def test_health(apps):
+    _, client = apps
+    response, body = get_asgi(client, '/health')
+
+    assert response.status_code == 200
+    assert body == {'status': 'healthy'}
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/rubbers', 200),
+    ('/rubbers?name=Tenergy%2005', 200),
+    (f'/rubbers/{ITEM["_id"]}', 200),
+    (f'/rubbers/{ITEM["_id"]}/history', 200),
+    ('/rubbers/butterfly viscaria', 404),
+    ('/paddles', 400),
+    ('/paddles/butterfly viscaria', 400),
+    ('/rubbers?limit=0', 400),
+    (f'/rubbers/{ITEM["_id"]}/history?days=x', 400),
+])
+def test_responses_match_flask(apps, path, status):
+    flask_client, client = apps
+    response, body = get_asgi(client, path)
+    flask_response = flask_client.get(path)
+
+    assert response.status_code == flask_response.status_code == status
+    assert body == flask_response.get_json()
+    assert response.headers['X-Content-Type-Options'] == 'nosniff'
+
+
+def test_not_modified(apps):
+    _, client = apps
+    response, _ = get_asgi(client, f'/rubbers/{ITEM["_id"]}')
+    etag = response.headers['ETag']
+
+    response, _ = get_asgi(client, f'/rubbers/{ITEM["_id"]}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
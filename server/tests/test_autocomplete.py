@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import mongomock
+
+from autocomplete import Autocomplete, NameIndex
+from equipment_scraper.generations import bump_generations
+
+
+def test_search_ranks_prefix_and_typos():
+    index = NameIndex()
+    index.add('a', 'Butterfly Tenergy 05')
+    index.add('b', 'Butterfly Tenergy 64')
+    index.add('c', 'DHS Hurricane 3')
+
+    assert [match['_id'] for match in index.search('tenergy 0')][:1] == ['a']
+    assert [match['_id'] for match in index.search('butterfy')] == ['a', 'b']
+
+
+def test_update_replaces_index():
+    db = mongomock.MongoClient().db
+    db.rubbers.insert_one({'_id': 'a', 'name': 'Butterfly Tenergy 05', 'first_seen': datetime(2026, 1, 1)})
+    autocomplete = Autocomplete(db, refresh_interval=0)
+    assert [match['_id'] for match in autocomplete.search('rubbers', 'dignics')] == []
+    index = autocomplete._indexes['rubbers']['index']
+
+    db.rubbers.insert_one({'_id': 'b', 'name': 'Butterfly Dignics 09C', 'first_seen': datetime(2026, 2, 1)})
+    bump_generations(db, ['rubbers'])
+
+    assert [match['_id'] for match in autocomplete.search('rubbers', 'dignics')] == ['b']
+    # The index searched before the update is left unchanged for searches still using it
+    assert autocomplete._indexes['rubbers']['index'] is not index
+    assert index.search('dignics') == []
+    assert len(index) == 1
+
+
+def test_update_drops_deleted_and_adds_rekeyed_items():
+    db = mongomock.MongoClient().db
+    db.rubbers.insert_one({'_id': 'a', 'name': 'Butterfly Tenergy 05', 'first_seen': datetime(2026, 1, 1)})
+    db.rubbers.insert_one({'_id': 'b', 'name': 'Butterfly Tenergy 05 FX', 'first_seen': datetime(2026, 2, 1)})
+    autocomplete = Autocomplete(db, refresh_interval=0)
+    assert sorted(match['_id'] for match in autocomplete.search('rubbers', 'tenergy')) == ['a', 'b']
+
+    # A re-key replaces both items with one under a new ID, first seen when the oldest was
+    db.rubbers.delete_many({})
+    db.rubbers.insert_one({'_id': 'c', 'name': 'Butterfly Tenergy 05', 'first_seen': datetime(2026, 1, 1)})
+    bump_generations(db, ['rubbers'])
+
+    assert [match['_id'] for match in autocomplete.search('rubbers', 'tenergy')] == ['c']
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+import scrapy
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from equipment_scraper import frontier
+from equipment_scraper.frontier import DONE, LEASED, PENDING, FrontierAddon, FrontierMiddleware, MongoFrontierScheduler
+
+URL = 'https://www.megaspin.net/store/default.asp?pid=rubbers'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(frontier.pymongo, 'MongoClient', lambda *args, **kwargs: client)
+    monkeypatch.setenv('MONGODB_DB_NAME', 'test')
+    return client
+
+
+def open_scheduler(max_attempts=2) -> MongoFrontierScheduler:
+    """
+    Open a frontier scheduler for a spider, as one crawling process does.
+    """
+    crawler = get_crawler(scrapy.Spider, {'FRONTIER_CRAWL_ID': 'crawl', 'FRONTIER_MAX_ATTEMPTS': max_attempts,
+                                          'FRONTIER_POLL_INTERVAL': 0})
+    crawler.spider = crawler._create_spider('rubber_megaspin')
+    scheduler = MongoFrontierScheduler.from_crawler(crawler)
+    scheduler.open(crawler.spider)
+    return scheduler
+
+
+def expire_leases(scheduler: MongoFrontierScheduler) -> None:
+    """
+    Move every lease's expiry into the past, as if the process holding it died.
+    """
+    scheduler.collection.update_many({'state': LEASED}, {'$set': {'lease_expires': datetime.now() - timedelta(seconds=1)}})
+
+
+def test_requests_are_stored_once_per_crawl(client):
+    first, second = open_scheduler(), open_scheduler()
+
+    assert first.enqueue_request(scrapy.Request(URL))
+    assert not second.enqueue_request(scrapy.Request(URL))
+    assert len(first) == 1
+
+
+def test_leased_request_is_not_handed_out_again(client):
+    first, second = open_scheduler(), open_scheduler()
+    first.enqueue_request(scrapy.Request(URL))
+
+    request = first.next_request()
+    assert request.url == URL
+    assert second.next_request() is None
+    # Still pending for the other process, until the lease is done or expires
+    assert second.has_pending_requests()
+
+
+def test_expired_lease_is_handed_to_another_process(client):
+    first, second = open_scheduler(), open_scheduler()
+    first.enqueue_request(scrapy.Request(URL))
+    first.next_request()
+    expire_leases(first)
+
+    request = second.next_request()
+    document = second.collection.find_one({'_id': request.meta['frontier_id']})
+    assert document['lease_owner'] == second.owner
+    assert document['attempts'] == 2
+    # The first process no longer holds the lease, so cannot mark it done
+    first.mark_done(request.meta['frontier_id'])
+    assert second.collection.find_one({'_id': request.meta['frontier_id']})['state'] == LEASED
+
+
+def test_request_is_dropped_after_max_attempts(client):
+    first, second = open_scheduler(max_attempts=2), open_scheduler(max_attempts=2)
+    first.enqueue_request(scrapy.Request(URL))
+    for scheduler in [first, second]:
+        assert scheduler.next_request() is not None
+        expire_leases(scheduler)
+
+    assert first.next_request() is None
+    assert not first.has_pending_requests()
+
+
+def test_retry_resets_own_request_to_pending(client):
+    first, second = open_scheduler(), open_scheduler()
+    first.enqueue_request(scrapy.Request(URL))
+    request = first.next_request()
+
+    retry = request.replace(dont_filter=True)
+    assert not second.enqueue_request(retry)
+    assert first.enqueue_request(retry)
+    assert first.collection.find_one({'_id': request.meta['frontier_id']})['state'] == PENDING
+
+
+def test_request_is_done_after_callback_output(client):
+    scheduler = open_scheduler()
+    scheduler.enqueue_request(scrapy.Request(URL))
+    request = scheduler.next_request()
+    frontier_id = request.meta['frontier_id']
+    middleware = FrontierMiddleware.from_crawler(scheduler.crawler)
+    response = HtmlResponse(URL, body=b'<html></html>', request=request)
+
+    output = middleware.process_spider_output(response, iter([{'name': 'Tenergy 05'}]), scheduler.spider)
+    assert next(output) == {'name': 'Tenergy 05'}
+    # Not done until the whole output has been consumed
+    assert scheduler.collection.find_one({'_id': frontier_id})['state'] == LEASED
+    assert list(output) == []
+    assert scheduler.collection.find_one({'_id': frontier_id})['state'] == DONE
+
+
+def test_failed_download_is_done(client):
+    scheduler = open_scheduler()
+    scheduler.enqueue_request(scrapy.Request(URL))
+    request = scheduler.next_request()
+
+    FrontierMiddleware.from_crawler(scheduler.crawler).process_exception(request, TimeoutError(), scheduler.spider)
+    assert scheduler.collection.find_one({'_id': request.meta['frontier_id']})['state'] == DONE
+
+
+def test_redirect_replaces_request(client):
+    scheduler = open_scheduler()
+    scheduler.enqueue_request(scrapy.Request(URL))
+    request = scheduler.next_request()
+
+    assert scheduler.enqueue_request(request.replace(url=f'{URL}&page=1'))
+    assert scheduler.collection.find_one({'_id': request.meta['frontier_id']})['state'] == DONE
+    assert len(scheduler) == 1
+
+
+def test_addon_only_enables_frontier_when_set():
+    settings = Settings()
+    FrontierAddon().update_settings(settings)
+    assert settings['SCHEDULER'] == 'scrapy.core.scheduler.Scheduler'
+
+    settings.set('FRONTIER_ENABLED', True, priority='cmdline')
+    FrontierAddon().update_settings(settings)
+    assert settings['SCHEDULER'] == frontier.SCHEDULER_PATH
+    assert settings.getdict('SPIDER_MIDDLEWARES')[FrontierMiddleware] == frontier.MIDDLEWARE_ORDER
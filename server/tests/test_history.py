@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+from equipment_scraper.history import (HISTORY_COLLECTION_NAME, bucket_id, daily_history, group_daily_history,
+                                       history_update, month_start)
+
+URL = 'https://www.megaspin.net/store/tenergy-05'
+
+
+def site_entry(price: str, price_usd: float, last_updated: datetime) -> dict:
+    return {'_id': 'e1', 'url': URL, 'price': price, 'price_usd': price_usd, 'last_updated': last_updated}
+
+
+def test_history_update_buckets_by_month():
+    end_of_month = history_update('rubbers', 'a', site_entry('$45.99', 45.99, datetime(2026, 9, 30, 23, 59)))
+    start_of_month = history_update('rubbers', 'a', site_entry('$45.99', 45.99, datetime(2026, 10, 1, 0, 1)))
+
+    assert bucket_id('e1', datetime(2026, 9, 30, 23, 59)) == 'e1:2026-09'
+    assert end_of_month._filter == {'_id': 'e1:2026-09'}
+    # The same price starts the next month's bucket, so each bucket has the price at its start
+    assert start_of_month._filter == {'_id': 'e1:2026-10'}
+    assert start_of_month._doc[0]['$set']['month'] == datetime(2026, 10, 1)
+    assert start_of_month._upsert
+
+
+def test_history_update_skips_unchanged_price():
+    timestamp = datetime(2026, 10, 2, 12)
+    fields = history_update('rubbers', 'a', site_entry('$45.99', 45.99, timestamp))._doc[0]['$set']
+
+    condition, unchanged, appended = fields['points']['$cond']
+    # The price is compared with the bucket's last price as a literal, not a "$45" field path
+    assert condition == {'$eq': [{'$arrayElemAt': [{'$ifNull': ['$points.price', []]}, -1]}, {'$literal': '$45.99'}]}
+    assert unchanged == '$points'
+    assert appended == {'$concatArrays': [{'$ifNull': ['$points', []]},
+                                          [{'$literal': {'t': timestamp, 'price': '$45.99', 'price_usd': 45.99}}]]}
+    assert fields['url'] == {'$literal': URL}
+    assert fields['min_usd'] == {'$min': ['$min_usd', 45.99]}
+    assert fields['max_usd'] == {'$max': ['$max_usd', 45.99]}
+
+
+def test_group_daily_history():
+    days = [
+        {'_id': {'entry_id': 'e1', 'date': '2026-10-01'}, 'url': URL, 'min_usd': 45.0, 'max_usd': 50.0,
+         'last_price': '$45.00'},
+        {'_id': {'entry_id': 'e1', 'date': '2026-10-02'}, 'url': URL, 'min_usd': 44.0, 'max_usd': 44.0,
+         'last_price': '$44.00'},
+        {'_id': {'entry_id': 'e2', 'date': '2026-10-01'}, 'url': 'https://www.tabletennis11.com/tenergy-05',
+         'min_usd': 48.6, 'max_usd': 48.6, 'last_price': '45,00 €'},
+    ]
+
+    assert group_daily_history(days) == [
+        {'_id': 'e1', 'url': URL, 'points': [
+            {'date': '2026-10-01', 'min_usd': 45.0, 'max_usd': 50.0, 'price': '$45.00'},
+            {'date': '2026-10-02', 'min_usd': 44.0, 'max_usd': 44.0, 'price': '$44.00'},
+        ]},
+        {'_id': 'e2', 'url': 'https://www.tabletennis11.com/tenergy-05', 'points': [
+            {'date': '2026-10-01', 'min_usd': 48.6, 'max_usd': 48.6, 'price': '45,00 €'},
+        ]},
+    ]
+    assert group_daily_history([]) == []
+
+
+def test_daily_history(mongo_db):
+    today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    yesterday = today - timedelta(days=1)
+    old = today - timedelta(days=40)
+    mongo_db[HISTORY_COLLECTION_NAME].insert_many([
+        {'_id': bucket_id('e1', old), 'collection': 'rubbers', 'item_id': 'a', 'entry_id': 'e1', 'url': URL,
+         'month': month_start(old), 'points': [{'t': old, 'price': '$60.00', 'price_usd': 60.0}]},
+        {'_id': bucket_id('e1', today), 'collection': 'rubbers', 'item_id': 'a', 'entry_id': 'e1', 'url': URL,
+         'month': month_start(today), 'points': [
+             {'t': yesterday, 'price': '$50.00', 'price_usd': 50.0},
+             {'t': today, 'price': '$45.00', 'price_usd': 45.0},
+             {'t': today + timedelta(hours=1), 'price': '$47.00', 'price_usd': 47.0},
+         ]},
+        {'_id': 'other', 'collection': 'blades', 'item_id': 'a', 'entry_id': 'e9', 'url': URL,
+         'month': month_start(today), 'points': [{'t': today, 'price': '$1.00', 'price_usd': 1.0}]},
+    ])
+
+    entries = daily_history(mongo_db, 'rubbers', 'a', days=30)
+    assert entries == [{'_id': 'e1', 'url': URL, 'points': [
+        {'date': f'{yesterday:%Y-%m-%d}', 'min_usd': 50.0, 'max_usd': 50.0, 'price': '$50.00'},
+        {'date': f'{today:%Y-%m-%d}', 'min_usd': 45.0, 'max_usd': 47.0, 'price': '$47.00'},
+    ]}]
+    assert [point['price'] for point in daily_history(mongo_db, 'rubbers', 'a', days=60)[0]['points']][0] == '$60.00'
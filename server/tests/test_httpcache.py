@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+import scrapy
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from equipment_scraper.httpcache import ContentAddressedCacheStorage
+
+PAGE = b'<html><body><table id="product-attribute-specs-table"></table></body></html>'
+
+
+def open_storage(cache_dir, expiration_secs=60) -> tuple[ContentAddressedCacheStorage, scrapy.Spider]:
+    """
+    Open a cache storage in the directory, for a spider.
+    """
+    settings = {'HTTPCACHE_DIR': str(cache_dir), 'HTTPCACHE_EXPIRATION_SECS': expiration_secs}
+    spider = scrapy.Spider.from_crawler(get_crawler(settings_dict=settings), name='rubber_details')
+    storage = ContentAddressedCacheStorage(Settings(settings))
+    storage.open_spider(spider)
+    return storage, spider
+
+
+def store(storage, spider, url: str, body: bytes = PAGE) -> scrapy.Request:
+    """
+    Store a response with the body for the URL, and return its request.
+    """
+    request = scrapy.Request(url)
+    response = HtmlResponse(url=url, body=body, headers={'Content-Type': 'text/html', 'ETag': '"abc"'})
+    storage.store_response(spider, request, response)
+    return request
+
+
+def files(directory) -> list[str]:
+    return [name for _, _, names in os.walk(directory) for name in names]
+
+
+def test_round_trip(tmp_path):
+    storage, spider = open_storage(tmp_path)
+    request = store(storage, spider, 'https://www.tabletennis11.com/other_eng/butterfly-tenergy-05')
+
+    response = storage.retrieve_response(spider, scrapy.Request(request.url))
+    assert isinstance(response, HtmlResponse)
+    assert response.body == PAGE
+    assert response.status == 200
+    assert response.headers['ETag'] == b'"abc"'
+    assert storage.retrieve_response(spider, scrapy.Request('https://www.tabletennis11.com/other')) is None
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    storage, spider = open_storage(tmp_path)
+    store(storage, spider, 'https://www.tabletennis11.com/other_eng/a')
+    store(storage, spider, 'https://www.tabletennis11.com/other_eng/b')
+    store(storage, spider, 'https://www.tabletennis11.com/other_eng/c', body=b'<html>other</html>')
+
+    assert len(files(tmp_path / 'index')) == 3
+    assert len(files(tmp_path / 'objects')) == 2
+
+
+def test_expired_entries_are_missing_and_pruned(tmp_path):
+    storage, spider = open_storage(tmp_path, expiration_secs=60)
+    request = store(storage, spider, 'https://www.tabletennis11.com/other_eng/a')
+    kept = store(storage, spider, 'https://www.tabletennis11.com/other_eng/b', body=b'<html>kept</html>')
+
+    # Age the first entry and every object past the expiry time
+    old = time.time() - 120
+    entry_path = storage._entry_path(request)
+    with open(entry_path) as file:
+        entry = json.load(file)
+    with open(entry_path, 'w') as file:
+        json.dump({**entry, 'stored_at': old}, file)
+    for name in files(tmp_path / 'objects'):
+        path = storage._object_path(name)
+        os.utime(path, (old, old))
+
+    assert storage.retrieve_response(spider, request) is None
+    assert storage.prune() == (1, 1)
+    assert storage.retrieve_response(spider, kept).body == b'<html>kept</html>'
@@ -0,0 +1,25 @@
+import mongomock
+
+import jobs
+
+
+def test_finish_job():
+    db = mongomock.MongoClient().db
+    job_id = jobs.enqueue_job(db, 'rubbers', ['rubber_tt11'])
+    jobs.claim_job(db, 'worker')
+
+    jobs.finish_job(db, job_id)
+    assert jobs.get_job(db, job_id)['state'] == jobs.FINISHED
+
+
+def test_finish_job_keeps_stale_failure():
+    db = mongomock.MongoClient().db
+    job_id = jobs.enqueue_job(db, 'rubbers', ['rubber_tt11'])
+    jobs.claim_job(db, 'worker')
+    # The worker was presumed dead, but then finishes the crawl
+    assert jobs.fail_stale_jobs(db, timeout=-1) == 1
+
+    jobs.finish_job(db, job_id)
+    job = jobs.get_job(db, job_id)
+    assert job['state'] == jobs.FAILED
+    assert job['error'] == 'Worker stopped responding'
@@ -0,0 +1,138 @@
+import pymongo
+import pytest
+import scrapy
+from pymongo.errors import BulkWriteError
+from scrapy.utils.test import get_crawler
+
+from equipment_scraper import pipelines
+from equipment_scraper.items import DetailItem
+from equipment_scraper.middlewares import VALIDATOR_COLLECTION_NAME
+from equipment_scraper.pipelines import DUPLICATE_KEY_ERROR, MongoPipeline
+
+DOCUMENT_VALIDATION_ERROR = 121
+
+
+def bulk_write_error(*write_errors: tuple[int, int]) -> BulkWriteError:
+    """
+    Build the error of a bulk write whose operations at the given indexes failed with the given codes.
+    """
+    return BulkWriteError({'writeErrors': [{'index': index, 'code': code, 'errmsg': 'failed'}
+                                           for index, code in write_errors],
+                           'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0, 'nMatched': 0,
+                           'nModified': 0, 'nRemoved': 0, 'upserted': []})
+
+
+class FailingDatabase():
+    """
+    A database whose bulk writes to a collection raise the errors queued for
+    it, and otherwise go to mongomock. Every bulk write is recorded.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.failures = {}
+        self.writes = []
+
+    def __getitem__(self, name):
+        collection = self.db[name]
+        database = self
+
+        class Collection():
+            def bulk_write(self, operations, ordered=True):
+                database.writes.append((name, len(operations)))
+                if database.failures.get(name):
+                    raise database.failures[name].pop(0)
+                return collection.bulk_write(operations, ordered=ordered)
+
+            def __getattr__(self, attribute):
+                return getattr(collection, attribute)
+        return Collection()
+
+
+class FakeClient():
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        return self.db
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pipeline(mongo_db, monkeypatch):
+    db = FailingDatabase(mongo_db)
+    monkeypatch.setattr(pipelines.pymongo, 'MongoClient', lambda *args, **kwargs: FakeClient(db))
+    crawler = get_crawler(scrapy.Spider)
+    pipeline = MongoPipeline('mongodb://localhost', 'test', batch_size=100, flush_interval=60, stats=crawler.stats)
+    spider = crawler._create_spider('rubber_megaspin')
+    pipeline.open_spider(spider)
+    return pipeline
+
+
+def buffer_writes(pipeline: MongoPipeline) -> None:
+    """
+    Buffer an item write and a page validator, as a listing page does.
+    """
+    for item_id in ['a', 'b']:
+        pipeline.buffer[('rubbers', item_id, 'e1')] = pymongo.UpdateOne({'_id': item_id}, {'$set': {'name': item_id}},
+                                                                        upsert=True)
+    pipeline.buffer[(VALIDATOR_COLLECTION_NAME, 'page', None)] = pymongo.UpdateOne(
+        {'_id': 'page'}, {'$set': {'etag': '"1"'}}, upsert=True)
+
+
+def test_validators_are_written_last(pipeline):
+    buffer_writes(pipeline)
+    pipeline.flush()
+
+    assert pipeline.db.writes == [('rubbers', 2), (VALIDATOR_COLLECTION_NAME, 1)]
+    assert pipeline.db['rubbers'].count_documents({}) == 2
+    assert pipeline.db[VALIDATOR_COLLECTION_NAME].count_documents({}) == 1
+
+
+def test_validators_are_skipped_after_failed_write(pipeline):
+    buffer_writes(pipeline)
+    error = bulk_write_error((0, DOCUMENT_VALIDATION_ERROR))
+    pipeline.db.failures['rubbers'] = [error]
+
+    # Not raised against the item that happened to fill the buffer
+    pipeline.flush()
+    assert pipeline.db.writes == [('rubbers', 2)]
+    assert pipeline.db[VALIDATOR_COLLECTION_NAME].count_documents({}) == 0
+    assert pipeline.stats.get_value('mongo_pipeline/write_errors') == 1
+
+    with pytest.raises(BulkWriteError) as raised:
+        pipeline.close_spider(None)
+    assert raised.value is error
+
+
+def test_duplicate_key_errors_are_retried(pipeline):
+    buffer_writes(pipeline)
+    pipeline.db.failures['rubbers'] = [bulk_write_error((1, DUPLICATE_KEY_ERROR))]
+
+    pipeline.flush()
+    # Only the upsert that failed is retried, and the validator is still written
+    assert pipeline.db.writes == [('rubbers', 2), ('rubbers', 1), (VALIDATOR_COLLECTION_NAME, 1)]
+    assert pipeline.db['rubbers'].distinct('_id') == ['b']
+    pipeline.close_spider(None)
+
+
+def test_failed_retry_is_raised_on_close(pipeline):
+    buffer_writes(pipeline)
+    pipeline.db.failures['rubbers'] = [bulk_write_error((1, DUPLICATE_KEY_ERROR)),
+                                       bulk_write_error((0, DUPLICATE_KEY_ERROR))]
+
+    pipeline.flush()
+    assert pipeline.db.writes == [('rubbers', 2), ('rubbers', 1)]
+    with pytest.raises(BulkWriteError):
+        pipeline.close_spider(None)
+
+
+def test_details_are_stored_under_site_name(pipeline):
+    item = DetailItem(item_id='a', url='https://www.megaspin.net/store/default.asp?pid=b-viscaria', specs={'speed': 9.7})
+    pipeline.process_item(item, scrapy.Spider('rubber_details'))
+
+    update = pipeline.buffer[('rubbers', 'a', item['url'])]._doc[0]['$set']
+    # Keyed as the site entries name the store, which has a dot so cannot be a field path
+    assert update['specs'] == {'$setField': {'field': 'megaspin.net', 'input': {'$ifNull': ['$specs', {}]},
+                                             'value': {'$literal': {'speed': 9.7}}}}
@@ -0,0 +1,34 @@
+import pytest
+
+from equipment_scraper.prices import Price, parse_price, parse_value
+
+
+@pytest.mark.parametrize('price, value', [
+    ('$45.99', 45.99),
+    ('45,99 €', 45.99),
+    ('£12', 12.0),
+    ('0,50 €', 0.5),
+    ('$1,299', 1299.0),
+    ('1,234 €', 1234.0),
+    ('1.234 €', 1234.0),
+    ('$1,299.00', 1299.0),
+    ('1.234,56 €', 1234.56),
+    ('1.234.567 €', 1234567.0),
+    ('0.125', 0.125),
+])
+def test_parse_value(price, value):
+    assert parse_value(price) == value
+
+
+@pytest.mark.parametrize('price', ['', 'Sold out', '$45.99 - $50.00', '1,234,56 €'])
+def test_parse_value_errors(price):
+    with pytest.raises(ValueError):
+        parse_value(price)
+
+
+def test_parse_price_rates():
+    assert parse_price('1.234,50 €') == Price(1234.5, 'EUR', 1333.26)
+    assert parse_price('10,00 €', {'EUR': 1.5}) == Price(10.0, 'EUR', 15.0)
+    # Currencies left out of the rates use the default ones
+    assert parse_price('£10', {'EUR': 1.5}) == Price(10.0, 'GBP', 12.7)
+    assert parse_price('Sold out') is None
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from equipment_scraper.alerts import WATCHLIST_COLLECTION_NAME
+from equipment_scraper.generations import get_generations
+from equipment_scraper.history import HISTORY_COLLECTION_NAME
+from equipment_scraper.matching import canonical_key, product_id
+from equipment_scraper.products import changed_groups, merge_items, merge_products, new_groups
+
+CRAWL_START = datetime(2026, 10, 1)
+
+
+def item(name: str, first_seen: datetime, **fields) -> dict:
+    """
+    Build an item with the ID the crawler gives a product seen for the first time.
+    """
+    return {'_id': product_id(canonical_key(name)), 'name': name, 'first_seen': first_seen, **fields}
+
+
+def entry(entry_id: str, price: str, price_usd: float, last_updated: datetime) -> dict:
+    return {'_id': entry_id, 'url': f'https://www.megaspin.net/{entry_id}', 'price': price, 'price_usd': price_usd,
+            'last_updated': last_updated}
+
+
+def test_concurrent_spellings_are_merged():
+    # Two crawlers each added the same new product under their store's spelling
+    megaspin = item('Tibhar Evolution MX-P 50', datetime(2026, 10, 1, 12))
+    tt11 = item('Tibhar Evolution MX-P 50 Max', datetime(2026, 10, 1, 13))
+    old = item('Butterfly Tenergy 05', datetime(2026, 1, 1))
+
+    assert new_groups([old], [megaspin, tt11]) == [(megaspin['_id'], [megaspin['_id'], tt11['_id']])]
+    assert changed_groups([old, megaspin, tt11]) == [(megaspin['_id'], [megaspin['_id'], tt11['_id']])]
+
+
+def test_new_spelling_is_merged_into_known_product():
+    known = item('Tibhar Evolution MX-P 50', datetime(2026, 1, 1))
+    new = item('Tibhar Evolution MX-P 50 Max', datetime(2026, 10, 1, 12))
+
+    assert new_groups([known], [new]) == [(known['_id'], [known['_id'], new['_id']])]
+    # Known items are not matched against each other
+    assert new_groups([known, new], []) == []
+
+
+def test_merge_items():
+    entry = {'_id': 'e', 'price': '$50.00', 'last_updated': datetime(2026, 10, 1)}
+    newer_entry = {**entry, 'price': '$45.00', 'last_updated': datetime(2026, 10, 2)}
+    first = {'_id': 'a', 'name': 'Tibhar Evolution MX-P', 'first_seen': datetime(2026, 1, 1), 'entries': [entry],
+             'all_time_low_price': '$50.00', 'all_time_low_price_usd': 50.0}
+    second = {'_id': 'b', 'name': 'Evolution MX-P (Tibhar)', 'first_seen': datetime(2026, 2, 1), 'entries': [newer_entry],
+              'all_time_low_price': '$45.00', 'all_time_low_price_usd': 45.0}
+
+    merged = merge_items('a', [first, second])
+    assert merged['name'] == 'Tibhar Evolution MX-P'
+    assert merged['entries'] == [newer_entry]
+    assert merged['all_time_low_price_usd'] == 45.0
+    assert merged['first_seen'] == datetime(2026, 1, 1)
+    assert merged['canonical_keys'] == [canonical_key('Tibhar Evolution MX-P')]
+
+
+def test_merge_products(mongo_db):
+    known_entry = entry('e1', '$50.00', 50.0, datetime(2026, 10, 1, 14))
+    known = item('Tibhar Evolution MX-P 50', datetime(2026, 1, 1), entries=[known_entry],
+                 all_time_low_price='$50.00', all_time_low_price_usd=50.0, price_changed_at=datetime(2026, 10, 1, 14))
+    new = item('Tibhar Evolution MX-P 50 Max', datetime(2026, 10, 1, 12),
+               entries=[entry('e2', '$45.00', 45.0, datetime(2026, 10, 1, 12)),
+                        entry('e1', '$55.00', 55.0, datetime(2026, 10, 1, 12))],
+               all_time_low_price='$45.00', all_time_low_price_usd=45.0, price_changed_at=datetime(2026, 10, 1, 12))
+    other = item('Butterfly Tenergy 05', datetime(2026, 10, 1, 12))
+    mongo_db.rubbers.insert_many([known, new, other])
+    mongo_db[HISTORY_COLLECTION_NAME].insert_one({'collection': 'rubbers', 'item_id': new['_id']})
+    mongo_db[WATCHLIST_COLLECTION_NAME].insert_one({'equipment_type': 'rubbers', 'item_id': new['_id']})
+
+    assert merge_products(mongo_db, 'rubbers', since=CRAWL_START) == {new['_id']: known['_id']}
+
+    assert sorted(mongo_db.rubbers.distinct('_id')) == sorted([known['_id'], other['_id']])
+    merged = mongo_db.rubbers.find_one({'_id': known['_id']})
+    assert merged['name'] == known['name']
+    # The known item's own entry is kept, being updated by crawls as it is merged into
+    assert merged['entries'] == [known_entry, new['entries'][0]]
+    assert merged['all_time_low_price_usd'] == 45.0
+    assert merged['first_seen'] == known['first_seen']
+    assert merged['price_changed_at'] == known['price_changed_at']
+    assert merged['canonical_keys'] == [canonical_key(new['name'])]
+    assert mongo_db[HISTORY_COLLECTION_NAME].find_one()['item_id'] == known['_id']
+    assert mongo_db[WATCHLIST_COLLECTION_NAME].find_one()['item_id'] == known['_id']
+    assert get_generations(mongo_db) == {'rubbers': 1}
+
+    # Running it again finds nothing left to merge
+    assert merge_products(mongo_db, 'rubbers', since=CRAWL_START) == {}
+
+
+def test_merge_products_into_new_product(mongo_db):
+    first = {'_id': 'raw 1', 'name': 'Tibhar Evolution MX-P 50', 'first_seen': datetime(2026, 1, 1),
+             'entries': [entry('e1', '$50.00', 50.0, datetime(2026, 10, 1))]}
+    second = {'_id': 'raw 2', 'name': 'Tibhar Evolution MX-P 50 Max', 'first_seen': datetime(2026, 2, 1),
+              'entries': [entry('e2', '$45.00', 45.0, datetime(2026, 10, 1))]}
+    mongo_db.rubbers.insert_many([first, second])
+
+    product = product_id(canonical_key(first['name']))
+    assert merge_products(mongo_db, 'rubbers') == {'raw 1': product, 'raw 2': product}
+    merged = mongo_db.rubbers.find_one()
+    assert merged['_id'] == product
+    assert merged['name'] == first['name']
+    assert [merged_entry['_id'] for merged_entry in merged['entries']] == ['e1', 'e2']
+    assert merged['first_seen'] == first['first_seen']
@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+
+import queries
+from equipment_scraper.matching import canonical_key
+
+
+def test_build_search_pages_by_id():
+    pipeline, name, limit = queries.build_search({'limit': '20', 'after': 'item 1'})
+
+    assert name is None
+    assert limit == 20
+    assert pipeline[0] == {'$match': {'_id': {'$gt': 'item 1'}}}
+    assert pipeline[1:3] == [{'$sort': {'_id': 1}}, {'$limit': 20}]
+
+
+def test_build_search_text_cursor():
+    cursor = queries.make_text_cursor(1.5, 'butterfly tenergy 05')
+    pipeline, name, _ = queries.build_search({'name': 'tenergy', 'after': cursor, 'site': 'https://www.megaspin.net'})
+
+    assert name == 'tenergy'
+    assert pipeline[0] == {'$match': {'$text': {'$search': 'tenergy'},
+                                      'entries': {'$elemMatch': {'site': 'megaspin.net'}}}}
+    assert pipeline[2] == {'$match': {'$or': [{'score': {'$lt': 1.5}},
+                                              {'score': 1.5, '_id': {'$gt': 'butterfly tenergy 05'}}]}}
+
+
+@pytest.mark.parametrize('args, error', [
+    ({'page': 'x'}, 'Invalid page number'),
+    ({'limit': '0'}, 'Limit must be between 1 and 100'),
+    ({'min_price': 'a'}, 'Invalid min_price'),
+    ({'name': 'tenergy', 'after': 'x'}, 'Invalid cursor'),
+])
+def test_build_search_errors(args, error):
+    with pytest.raises(ValueError, match=error):
+        queries.build_search(args)
+
+
+def test_search_result():
+    items = [{'_id': 'a', 'name': 'Tenergy 05', 'score': 2.0}, {'_id': 'b', 'name': 'Tenergy 05 FX', 'score': 1.0}]
+
+    assert queries.search_result([], None, 10) is None
+    assert queries.search_result(items, None, 2) == {'items': items, 'next': 'b'}
+    # An exact name match is returned alone
+    assert queries.search_result(items, 'tenergy 05', 2) == {'items': items[:1], 'next': 'null'}
+    assert queries.search_result(items, 'tenergy', 2)['next'] == queries.make_text_cursor(1.0, 'b')
+
+
+def test_parse_history_days():
+    assert queries.parse_history_days({'days': '7'}) == 7
+    with pytest.raises(ValueError, match='Days must be between'):
+        queries.parse_history_days({'days': '0'})
+
+
+@pytest.mark.parametrize('body, error', [
+    (None, 'Expected a JSON object'),
+    ({'ids': 'a'}, 'ids must be a list of strings'),
+    ({'names': ['']}, 'names must be a list of strings'),
+    ({}, 'No ids or names given'),
+    ({'ids': [str(i) for i in range(queries.MAX_LOOKUP_INPUTS + 1)]}, 'At most'),
+])
+def test_parse_lookup_errors(body, error):
+    with pytest.raises(ValueError, match=error):
+        queries.parse_lookup(body)
+
+
+def test_lookup_result():
+    fresh = {'_id': 'e1', 'last_updated': datetime.datetime.now()}
+    old = {'_id': 'e2', 'last_updated': queries.month_ago() - datetime.timedelta(days=1)}
+    tenergy = {'_id': 'a', 'name': 'Butterfly Tenergy 05', 'canonical_keys': [canonical_key('Butterfly Tenergy 05')],
+               'entries': [fresh, old]}
+    hurricane = {'_id': 'b', 'name': 'DHS Hurricane 3 Neo', 'canonical_keys': [canonical_key('DHS Hurricane 3 Neo')],
+                 'entries': []}
+    ids, names = queries.parse_lookup({'ids': ['b', 'x', 'b'],
+                                       'names': ['Tenergy 05 (Butterfly)', 'Hurricane III Neo Rubber',
+                                                 'Hurricane 8', 'Tenergy 05']})
+
+    assert ids == ['b', 'x']
+    assert queries.lookup_names_filter(['Tenergy 05 (Butterfly)', 'Butterfly Tenergy 05']) == \
+        {'canonical_keys': {'$in': ['butterfly|5 tenergy']}}
+    # Only names without an exact match are text searched, as their words
+    assert queries.unmatched_names(names, [tenergy]) == names[1:]
+    assert queries.lookup_text_pipeline(['Hurricane-8 "Neo"'])[0] == {'$match': {'$text': {'$search': '8 hurricane neo'}}}
+
+    result = queries.lookup_result(ids, names, [hurricane, tenergy])
+    # Entries are marked old, as in the items GET /<equipment type> returns
+    tenergy = {**tenergy, 'entries': [{**fresh, 'is_old': False}, {**old, 'is_old': True}]}
+    assert result['ids'] == {'b': hurricane, 'x': None}
+    assert result['names'] == {
+        'Tenergy 05 (Butterfly)': tenergy,
+        'Hurricane III Neo Rubber': hurricane,
+        'Hurricane 8': None,
+        'Tenergy 05': tenergy,
+    }
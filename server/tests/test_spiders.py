@@ -0,0 +1,219 @@
+import scrapy
+
+from equipment_scraper.extraction import extractor
+from equipment_scraper.items import DetailItem, EquipmentItem, ListingPageItem
+from equipment_scraper.sites import SITES, site_for_url, spiders_by_type
+from equipment_scraper.specs import NUMBER_PATTERN, parse_spec
+from equipment_scraper.spiders.detail_spider import DETAIL_SPIDERS
+from equipment_scraper.spiders.store_spider import SPIDERS
+from tests.fixtures import (MEGASPIN_DETAIL, MEGASPIN_DETAIL_URL, MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL,
+                            TT11_DETAIL, TT11_DETAIL_URL, TT11_RUBBERS, TT11_RUBBERS_LAST_PAGE, TT11_RUBBERS_URL,
+                            fixture_response)
+
+
+def split_results(results):
+    """
+    Split the output of a parse callback into items, listing pages and requests.
+    """
+    results = list(results)
+    items = [result for result in results if isinstance(result, EquipmentItem)]
+    pages = [result for result in results if isinstance(result, ListingPageItem)]
+    requests = [result for result in results if isinstance(result, scrapy.Request)]
+    assert len(items) + len(pages) + len(requests) == len(results)
+    return items, pages, requests
+
+
+RubberSpiderMegaspin = SPIDERS['rubber_megaspin']
+RubberSpiderTT11 = SPIDERS['rubber_tt11']
+
+
+def selector_extract(site, response) -> list[dict]:
+    """
+    Extract the product cards of a page with a Selector for every card and
+    field, as the spiders used to.
+    """
+    items = []
+    for card in response.css(site.card):
+        price = ''.join(card.css(css).get().strip() for css in site.product_price)
+        items.append({
+            'url': response.urljoin(card.css(site.product_url).get()),
+            'name': card.css(site.product_name).get().strip(),
+            'price': price,
+        })
+    return items
+
+
+def test_megaspin_parse_items():
+    spider = RubberSpiderMegaspin()
+    items, pages, requests = split_results(spider.parse(fixture_response(MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL)))
+
+    assert len(items) == 6
+    assert dict(items[0]) == {
+        'url': 'https://www.megaspin.net/store/default.asp?pid=butterfly-tenergy-05',
+        'name': 'Butterfly Tenergy 05',
+        'price': '$72.99',
+    }
+    assert [item['name'] for item in items[1:]] == [
+        'Butterfly Dignics 09C', 'Tibhar Evolution MX-P', 'Xiom Vega Pro', 'DHS Hurricane 3 Neo', 'Yasaka Rakza 7',
+    ]
+    assert [item['price'] for item in items[1:]] == ['$84.99', '$54.95', '$44.95', '$39.90', '$47.95']
+    assert requests == []
+
+
+def test_megaspin_listing_page():
+    spider = RubberSpiderMegaspin()
+    response = fixture_response(MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL, headers={'ETag': '"abc"'})
+    items, pages, _ = split_results(spider.parse(response))
+
+    assert len(pages) == 1
+    page = pages[0]
+    assert page['url'] == MEGASPIN_RUBBERS_URL
+    assert page['etag'] == '"abc"'
+    assert page['last_modified'] is None
+    assert page['item_urls'] == [item['url'] for item in items]
+    assert page['unchanged'] is False
+    assert page['fingerprint'] == spider.fingerprint(response.css('.product-list > .product-card').getall())
+    # The megaspin listing has no pager
+    assert page['page_total'] is None
+
+
+def test_megaspin_unchanged_page():
+    spider = RubberSpiderMegaspin()
+    fingerprint = next(page for page in spider.parse(fixture_response(MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL))
+                       if isinstance(page, ListingPageItem))['fingerprint']
+    validators = {'fingerprint': fingerprint, 'etag': '"abc"', 'entry_ids': ['1', '2']}
+
+    # The same cards, with the rest of the page changed
+    body = fixture_response(MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL).body.replace(b'Prices in US dollars', b'Sale')
+    response = fixture_response(MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL, body=body, meta={'validators': validators})
+    items, pages, _ = split_results(spider.parse(response))
+
+    assert items == []
+    assert pages[0]['unchanged'] is True
+    assert pages[0]['entry_ids'] == ['1', '2']
+    assert pages[0]['etag'] == '"abc"'
+
+
+def test_tt11_parse_items():
+    spider = RubberSpiderTT11(max_pages=10)
+    items, pages, _ = split_results(spider.parse(fixture_response(TT11_RUBBERS, TT11_RUBBERS_URL)))
+
+    assert len(items) == 5
+    assert dict(items[0]) == {
+        'url': 'https://www.tabletennis11.com/other_eng/butterfly-tenergy-05',
+        'name': 'Butterfly Tenergy 05',
+        'price': '$69.90',
+    }
+    assert [item['price'] for item in items] == ['$69.90', '$82.90', '$49.90', '$52.90', '$46.90']
+    assert pages[0]['item_urls'] == [item['url'] for item in items]
+
+
+def test_tt11_page_total_uses_item_total():
+    spider = RubberSpiderTT11(max_pages=10)
+    _, pages, _ = split_results(spider.parse(fixture_response(TT11_RUBBERS, TT11_RUBBERS_URL)))
+
+    # The pager only links to page 3, but 23 items at 5 a page is 5 pages
+    assert pages[0]['page_total'] == 5
+
+
+def test_tt11_first_page_requests_remaining_pages():
+    spider = RubberSpiderTT11(max_pages=10)
+    _, _, requests = split_results(spider.parse(fixture_response(TT11_RUBBERS, TT11_RUBBERS_URL)))
+
+    assert [request.url for request in requests] == [f'{TT11_RUBBERS_URL}?p={page}' for page in range(2, 6)]
+    assert [request.cb_kwargs['page'] for request in requests] == [2, 3, 4, 5]
+
+
+def test_tt11_max_pages():
+    spider = RubberSpiderTT11(max_pages=3)
+    _, _, requests = split_results(spider.parse(fixture_response(TT11_RUBBERS, TT11_RUBBERS_URL)))
+
+    assert [request.cb_kwargs['page'] for request in requests] == [2, 3]
+
+
+def test_tt11_later_pages_do_not_request_more():
+    spider = RubberSpiderTT11(max_pages=10)
+    url = f'{TT11_RUBBERS_URL}?p=5'
+    items, pages, requests = split_results(spider.parse(fixture_response(TT11_RUBBERS_LAST_PAGE, url), page=5))
+
+    assert len(items) == 3
+    assert pages[0]['url'] == url
+    assert requests == []
+
+
+def test_tt11_not_modified_page():
+    spider = RubberSpiderTT11(max_pages=10)
+    validators = {'fingerprint': 'old', 'etag': '"abc"', 'entry_ids': ['1'], 'page_total': 4}
+    response = fixture_response(TT11_RUBBERS, TT11_RUBBERS_URL, body=b'', status=304, meta={'validators': validators})
+    items, pages, requests = split_results(spider.parse(response))
+
+    assert items == []
+    assert pages[0]['unchanged'] is True
+    # The page total saved last time is still used to request the other pages
+    assert [request.cb_kwargs['page'] for request in requests] == [2, 3, 4]
+
+
+def test_compiled_extraction_matches_selectors():
+    for site_name, fixture, url in [('megaspin', MEGASPIN_RUBBERS, MEGASPIN_RUBBERS_URL),
+                                    ('tt11', TT11_RUBBERS, TT11_RUBBERS_URL)]:
+        response = fixture_response(fixture, url)
+        site_extractor = extractor(site_name)
+        cards = site_extractor.cards(response.selector.root)
+
+        assert [site_extractor.extract(card, url) for card in cards] == selector_extract(SITES[site_name], response)
+        assert [site_extractor.card_html(card) for card in cards] == response.css(SITES[site_name].card).getall()
+
+
+def test_spiders_by_type():
+    assert spiders_by_type() == {
+        'blades': ['blade_megaspin', 'blade_tt11'],
+        'rubbers': ['rubber_megaspin', 'rubber_tt11'],
+    }
+    assert SPIDERS['blade_tt11'].start_urls == ['https://www.tabletennis11.com/other_eng/blades']
+    assert SPIDERS['blade_tt11'].allowed_domains == ['www.tabletennis11.com']
+
+
+def test_tt11_detail_specs():
+    spider = DETAIL_SPIDERS['rubber_details']()
+    items = list(spider.parse(fixture_response(TT11_DETAIL, TT11_DETAIL_URL), item_id='butterfly tenergy 05'))
+
+    assert len(items) == 1
+    assert isinstance(items[0], DetailItem)
+    assert items[0]['item_id'] == 'butterfly tenergy 05'
+    # Control is empty and sponge hardness is not a specification that is kept
+    assert items[0]['specs'] == {'speed': 13.0, 'spin': 11.5, 'thickness': '1.7, 1.9, 2.1'}
+
+
+def test_megaspin_detail_specs():
+    spider = DETAIL_SPIDERS['blade_details']()
+    item = next(spider.parse(fixture_response(MEGASPIN_DETAIL, MEGASPIN_DETAIL_URL), item_id='butterfly viscaria'))
+
+    assert item['specs'] == {'speed': 9.7, 'control': 8.4, 'weight': 86.0, 'thickness': 5.8}
+
+
+def test_detail_page_of_unknown_store_is_dropped():
+    spider = DETAIL_SPIDERS['rubber_details']()
+    # Redirected away from the store
+    response = fixture_response(MEGASPIN_DETAIL, 'https://example.com/tenergy-05')
+
+    assert list(spider.parse(response, item_id='butterfly tenergy 05')) == []
+
+
+def test_parse_spec():
+    assert parse_spec('weight', '88 g +/- 3') == 88.0
+    assert parse_spec('spin', 'n/a') is None
+    assert parse_spec('thickness', 'Max') == 'Max'
+    assert parse_spec('thickness', '2,1 mm') == 2.1
+
+
+def test_parse_spec_european_list():
+    # A comma followed by a digit is a decimal comma, and one followed by a space separates values
+    assert NUMBER_PATTERN.findall('1,7, 1,9, 2,1') == ['1,7', '1,9', '2,1']
+    assert parse_spec('thickness', '1,7, 1,9') == '1,7, 1,9'
+    assert parse_spec('speed', '9,5, 9,7') == 9.5
+
+
+def test_site_for_url():
+    assert site_for_url(TT11_DETAIL_URL) is SITES['tt11']
+    assert site_for_url('megaspin.net') is SITES['megaspin']
+    assert site_for_url('https://example.com/rubber') is None
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Program: ttworker
+
+Description: Runs the crawl jobs queued by the API. Each job is run in its own
+             child process, since a Twisted reactor cannot be restarted once it
+             has stopped. With --frontier, the requests of each job are kept
+             in a frontier shared through MongoDB. With --join, helps crawl a
+             job another worker is running with --frontier, by taking
+             requests from the job's frontier.
+
+Usage: python worker.py [-p <processes>] [-i <poll interval>] [--frontier]
+       python worker.py --join <job id>
+"""
+import argparse
+import datetime
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+import jobs
+from db import db
+
+DEFAULT_PROCESSES = 1
+DEFAULT_POLL_INTERVAL = 2.0
+# Running jobs without a heartbeat for this many seconds are marked as failed
+STALE_JOB_TIMEOUT = 300
+
+
+def main():
+    """
+    Parse arguments and run the worker loop.
+    """
+    parser = argparse.ArgumentParser(description='Run queued crawl jobs.')
+    parser.add_argument('-p', '--processes',
+                        type=int,
+                        default=DEFAULT_PROCESSES,
+                        help='Maximum number of crawl jobs to run at once')
+    parser.add_argument('-i', '--poll-interval',
+                        type=float,
+                        default=DEFAULT_POLL_INTERVAL,
+                        help='Seconds to wait between checks for new jobs')
+    parser.add_argument('--frontier',
+                        action='store_true',
+                        help='Share the requests of each job through MongoDB, so other workers can join it')
+    parser.add_argument('--join',
+                        metavar='JOB_ID',
+                        help='Help crawl a running job, then exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.join:
+        join(args.join)
+    else:
+        run(args.processes, args.poll_interval, args.frontier)
+
+
+def join(job_id: str) -> None:
+    """
+    Crawl a running job alongside the worker that claimed it, which must run
+    with --frontier. Only the claiming worker reports the job's progress and
+    finishes it.
+    """
+    job = jobs.get_job(db, job_id)
+    if not job:
+        raise SystemExit(f'No job found with ID {job_id}')
+    if job['state'] != jobs.RUNNING:
+        raise SystemExit(f'Job {job_id} is {job["state"]}, only running jobs can be joined')
+    logging.info('Joining job %s: %s', job_id, ', '.join(job['spiders']))
+    run_crawl(job_id, job['spiders'], report=False, frontier=True)
+
+
+def run(processes: int, poll_interval: float, frontier: bool = False) -> None:
+    """
+    Claim queued jobs and run up to the given number of them concurrently,
+    through the shared frontier if frontier is set.
+    """
+    # Use spawn so children do not inherit the parent's MongoClient
+    context = multiprocessing.get_context('spawn')
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    running = {}
+
+    while True:
+        # Reap finished children
+        for job_id, process in list(running.items()):
+            if not process.is_alive():
+                process.join()
+                error = None if process.exitcode == 0 else f'Crawl exited with code {process.exitcode}'
+                jobs.finish_job(db, job_id, error)
+                logging.info('Job %s done: %s', job_id, error or 'success')
+                del running[job_id]
+
+        stale = jobs.fail_stale_jobs(db, STALE_JOB_TIMEOUT)
+        if stale:
+            logging.warning('Marked %d stale jobs as failed', stale)
+
+        # Fill any free slots
+        claimed = False
+        while len(running) < processes:
+            job = jobs.claim_job(db, worker)
+            if not job:
+                break
+            job_id = str(job['_id'])
+            process = context.Process(target=run_crawl, args=(job_id, job['spiders'], True, frontier))
+            process.start()
+            running[job_id] = process
+            claimed = True
+            logging.info('Started job %s: %s', job_id, ', '.join(job['spiders']))
+
+        if not claimed:
+            time.sleep(poll_interval)
+
+
+def run_crawl(job_id: str, spiders: list[str], report: bool = True, frontier: bool = False) -> None:
+    """
+    Run the given spiders in a single reactor, reporting progress to the job
+    if report is set. Spiders for different stores run in parallel, while
+    spiders for the same store run one after another so the per-domain limits
+    in settings.py hold. If frontier is set, requests are shared through the
+    job's frontier with any other process crawling the job. Once every
+    spider has closed, the products first seen in the crawl are merged.
+    """
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    settings.set('FRONTIER_CRAWL_ID', job_id)
+    if frontier:
+        settings.set('FRONTIER_ENABLED', True)
+    if report:
+        settings.set('CRAWL_JOB_ID', job_id)
+        settings.set('CRAWL_JOB_COLLECTION', jobs.JOB_COLLECTION_NAME)
+
+    started_at = datetime.datetime.now()
+    process = CrawlerProcess(settings)
+    for domain_spiders in group_by_domain(process.spider_loader, spiders).values():
+        crawl_sequentially(process, domain_spiders)
+    process.start(stop_after_crawl=True)
+    merge_crawled_products(spiders, started_at)
+
+
+def merge_crawled_products(spiders: list[str], since: datetime.datetime) -> None:
+    """
+    Merge the products first seen since the crawl started in the collections
+    the spiders write to. Run after the crawl rather than as each spider
+    closes, so no spider of the crawl still writes to the merged items with
+    the product IDs it matched before the merge.
+    """
+    from equipment_scraper.products import merge_products
+
+    for equipment_type, type_spiders in jobs.SPIDERS_BY_TYPE.items():
+        if set(spiders) & set(type_spiders):
+            merge_products(db, equipment_type, since=since)
+
+
+def group_by_domain(spider_loader, spiders: list[str]) -> dict[str, list[str]]:
+    """
+    Group spider names by the first domain each spider is allowed to crawl.
+    """
+    groups = {}
+    for spider in spiders:
+        domains = getattr(spider_loader.load(spider), 'allowed_domains', None) or [spider]
+        groups.setdefault(domains[0], []).append(spider)
+    return groups
+
+
+def crawl_sequentially(process, spiders: list[str]) -> None:
+    """
+    Schedule the spiders to run one after another in the given process.
+    The next crawl is added before the process checks for active crawls,
+    so it keeps running until the whole chain is done.
+    """
+    if not spiders:
+        return
+    deferred = process.crawl(spiders[0])
+    deferred.addBoth(lambda _: crawl_sequentially(process, spiders[1:]))
+
+
+if __name__ == '__main__':
+    main()